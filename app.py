@@ -3,33 +3,91 @@ from flask import Flask, render_template, request, jsonify, send_file
 import os
 from werkzeug.utils import secure_filename
 from datetime import datetime
-import cv2
 import base64
-import numpy as np
-import matplotlib
-matplotlib.use('Agg')  # GUI 없는 환경용
-import matplotlib.pyplot as plt
-from matplotlib import font_manager as fm
+import hmac
+import json
+import threading
+
 
 # 모델 import
 from models.clip_matcher import (
-    initialize_animal_embeddings,
-    find_similar_faces,
-    get_personality_by_text,
-    generate_comment
+    load_similarity_index,
+    embed_images_batched,
+    preprocess_images,
+    get_image_preprocessor,
+    get_personalities,
+    generate_comment,
+    get_inference_stats,
+    get_personality_embeddings,
+    get_embedding_version,
+    warm_up as warm_up_clip
 )
+from models.embedding_store import hash_bytes
+from models.face_crop import prepare_face_images
+from models.gallery import GALLERY_MANIFEST, GalleryWatcher, load_gallery_manifest
+from models.inference_pool import InferenceBusy, InferencePool, InferenceTimeout
+from models.result_cache import ResultCache, dhash
+from models.session_store import create_session_store, SessionNotFound
+from models.report_renderer import ReportRenderer
+from models.emotion_tracker import EmotionTracker, EmotionTrackerRegistry
 from models.face_analyzer import (
-    analyze_face_emotion,
-    generate_feedback,
-    analyze_best_moment,
-    get_emotion_timeline
+    EMOTION_BATCH_ENABLED,
+    EMOTION_BATCH_MAX_SIZE,
+    EMOTION_BATCH_WINDOW_MS,
+    decode_image,
+    analyze_frame_emotion,
+    analyze_frame_emotion_batched,
+    get_emotion_stats,
+    SessionAggregator,
+    warm_up as warm_up_emotion
 )
+from models.warmup import WarmupRegistry
 
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = 'static/uploads'
 app.config['RESULT_FOLDER'] = 'static/uploads/results'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB
 
+# 연습 세션 감정 기록 저장소 ('memory' 또는 'sqlite')
+app.config['SESSION_STORE_BACKEND'] = 'memory'
+app.config['SESSION_STORE_PATH'] = 'cache/sessions.db'
+app.config['SESSION_TTL'] = 60 * 60  # 마지막 사용 후 1시간
+app.config['SESSION_MAX_SESSIONS'] = 1000
+app.config['SESSION_MAX_RECORDS'] = 10000
+
+# 닮은꼴 분석 결과 캐시 (같은 사진 재업로드 시 모델을 다시 돌리지 않음)
+app.config['RESULT_CACHE_SIZE'] = 512
+app.config['RESULT_CACHE_TTL'] = 60 * 60
+# 비슷한 사진(재압축/리사이즈)도 같은 결과로 볼 dhash 해밍 거리 (None이면 정확히 같은 파일만)
+app.config['RESULT_CACHE_PHASH_DISTANCE'] = None
+
+# 닮은꼴 분석 전에 업로드 사진에서 얼굴만 잘라서 CLIP에 넣기 (얼굴을 못 찾으면 전체 이미지)
+app.config['FACE_CROP'] = True
+
+# 여러 얼굴 모드(multi_face=1)에서 한 사진당 분석할 최대 얼굴 수
+app.config['MAX_FACES_PER_IMAGE'] = 8
+
+# 실시간 감정 분석: 세션별로 얼굴 박스 재사용, 변화 없는 프레임 추론 생략, 결과 스무딩
+app.config['EMOTION_TRACKING'] = True
+app.config['EMOTION_TRACKER_TTL'] = 10 * 60  # 마지막 프레임 후 10분
+
+# 동물 갤러리 매니페스트 변경 감시 간격 (초, 0이면 끔) - 바뀌면 새/바뀐 이미지만 임베딩해서 인덱스 교체
+app.config['GALLERY_MANIFEST'] = GALLERY_MANIFEST
+app.config['GALLERY_WATCH_INTERVAL'] = float(os.environ.get('IMAGO_GALLERY_WATCH', '10'))
+
+# /admin/* 엔드포인트 토큰 (설정하지 않으면 관리자 엔드포인트 사용 불가)
+app.config['ADMIN_TOKEN'] = os.environ.get('IMAGO_ADMIN_TOKEN')
+
+# 모델 추론을 별도 워커 프로세스 풀에서 실행 (워커 수, 0이면 요청 스레드에서 직접 실행)
+#   CLIP/감정 모델은 워커에만 로드되고, 입력 이미지는 공유 메모리로 넘깁니다.
+app.config['INFERENCE_WORKERS'] = int(os.environ.get('IMAGO_INFERENCE_WORKERS', '0'))
+app.config['INFERENCE_THREADS'] = None  # 워커당 연산 스레드 수 (None이면 코어 수 / 워커 수)
+app.config['INFERENCE_MAX_PENDING'] = None  # 동시에 받을 최대 추론 수 (None이면 워커 수 x 4, 넘으면 503)
+app.config['INFERENCE_TIMEOUT'] = 30  # 초 (넘으면 504)
+
+# 서버 시작 시 모델을 백그라운드에서 미리 로드 (IMAGO_WARMUP=0 이면 끔)
+app.config['WARMUP_ON_START'] = os.environ.get('IMAGO_WARMUP', '1') != '0'
+
 # 폴더 생성
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['RESULT_FOLDER'], exist_ok=True)
@@ -37,21 +95,322 @@ os.makedirs('static/animals', exist_ok=True)
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
 
-# 동물 임베딩 캐시 (전역 변수)
-animal_embeddings_cache = None
+# 리포트 그래프 형식: 'file'(PNG 파일 저장), 'png'(data URL), 'svg', 'json'(그래프 데이터만)
+REPORT_CHART_FORMATS = {'file', 'png', 'svg', 'json'}
+
+# 웹캠 프레임을 JSON(base64) 대신 그대로 보낼 때 허용하는 Content-Type
+BINARY_IMAGE_TYPES = {'image/jpeg', 'image/png', 'application/octet-stream'}
+
+# 웹소켓 프레임 스트림은 flask-sock이 설치된 경우에만 사용 (선택)
+try:
+    from flask_sock import Sock
+except ImportError:
+    Sock = None
+
+# 동물 갤러리 검색 인덱스 (전역 변수, 행렬은 워커끼리 공유하는 메모리 맵)
+similarity_index_cache = None
+_gallery_lock = threading.Lock()
+_gallery_reload_lock = threading.Lock()
+
+# 추론 워커 프로세스 풀 (INFERENCE_WORKERS가 0이면 None, 워밍업 또는 첫 요청 때 시작)
+inference_pool = None
+if app.config['INFERENCE_WORKERS'] > 0:
+    inference_pool = InferencePool(
+        workers=app.config['INFERENCE_WORKERS'],
+        threads=app.config['INFERENCE_THREADS'],
+        max_pending=app.config['INFERENCE_MAX_PENDING'],
+        timeout=app.config['INFERENCE_TIMEOUT'],
+        emotion_batch_size=EMOTION_BATCH_MAX_SIZE,
+        emotion_batch_window_ms=EMOTION_BATCH_WINDOW_MS
+    )
+
+# 연습 세션 저장소
+session_store = create_session_store(
+    app.config['SESSION_STORE_BACKEND'],
+    path=app.config['SESSION_STORE_PATH'],
+    max_sessions=app.config['SESSION_MAX_SESSIONS'],
+    ttl=app.config['SESSION_TTL'],
+    max_records=app.config['SESSION_MAX_RECORDS'],
+    aggregator_factory=SessionAggregator
+)
+
+# 리포트 그래프 렌더러 (스레드별 템플릿 재사용)
+report_renderer = ReportRenderer()
+
+# 닮은꼴 분석 결과 캐시
+result_cache = ResultCache(
+    max_entries=app.config['RESULT_CACHE_SIZE'],
+    ttl=app.config['RESULT_CACHE_TTL'],
+    phash_distance=app.config['RESULT_CACHE_PHASH_DISTANCE']
+)
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
-def get_animal_embeddings():
-    """연예인 임베딩 캐시 (최초 1회만 계산)"""
-    global animal_embeddings_cache
-    if animal_embeddings_cache is None:
-        print("연예인 데이터베이스 초기화 중...")
-        animal_embeddings_cache = initialize_animal_embeddings()
-        print(f"총 {len(animal_embeddings_cache)}명의 데이터 로드 완료!")
-    return animal_embeddings_cache
+def read_frame_bytes():
+    """
+    요청에서 웹캠 프레임 이미지 바이트 꺼내기
+
+    multipart 파일('image'), 바이너리 본문(image/jpeg 등),
+    기존 JSON 형식({'image': data URL}) 모두 지원합니다.
+
+    Raises:
+        ValueError: 이미지가 없을 때
+    """
+    if 'image' in request.files:
+        return request.files['image'].read()
+    if request.mimetype in BINARY_IMAGE_TYPES:
+        image_bytes = request.get_data(cache=False)
+        if not image_bytes:
+            raise ValueError('이미지가 없습니다')
+        return image_bytes
+    data = request.get_json(silent=True) or {}
+    image_data = data.get('image')
+    if not image_data:
+        raise ValueError('이미지가 없습니다')
+    # data URL이면 'data:image/jpeg;base64,' 부분 제거
+    if ',' in image_data:
+        image_data = image_data.split(',', 1)[1]
+    return base64.b64decode(image_data)
+
+
+def analyze_webcam_frame(img, box=None):
+    """
+    웹캠 프레임 감정 분석 (추론 풀 / 배치 큐 사용 여부에 따라)
+
+    box를 주면 추론 풀/배치 큐 경로에서는 얼굴 검출을 건너뛰고 그 박스를 씁니다.
+    추론 풀의 InferenceBusy / InferenceTimeout은 그대로 올려 보냅니다 (응답 503/504).
+    """
+    if inference_pool is not None:
+        # 워커 프로세스에서 분석 (프레임은 공유 메모리로 전달)
+        if EMOTION_BATCH_ENABLED:
+            # 다른 세션의 프레임과 묶어서 배치로 보냄
+            return inference_pool.analyze_emotion_batched(img, box)
+        return inference_pool.analyze_emotion(img, box)
+    if EMOTION_BATCH_ENABLED:
+        # 다른 세션의 프레임과 묶어서 배치로 감정 분석
+        return analyze_frame_emotion_batched(img, box)
+    # DeepFace 감정 분석
+    return analyze_frame_emotion(img)
+
+
+# 세션별 실시간 감정 추적기
+emotion_trackers = EmotionTrackerRegistry(
+    analyze_webcam_frame,
+    max_sessions=app.config['SESSION_MAX_SESSIONS'],
+    ttl=app.config['EMOTION_TRACKER_TTL']
+)
+
+
+def analyze_tracked_frame(img, tracker):
+    """
+    추적기가 있으면 추적기로, 없으면 프레임 단독으로 감정 분석
+
+    Returns:
+        emotion_result: 감정 분석 결과
+        tracking: 추적 정보 (추적기가 없으면 None)
+    """
+    if tracker is None:
+        return analyze_webcam_frame(img), None
+    return tracker.process(img)
+
+
+def inference_unavailable(error):
+    """추론 풀이 바쁘거나(503) 시간 초과(504)일 때 응답"""
+    if isinstance(error, InferenceBusy):
+        return jsonify({'error': str(error)}), 503, {'Retry-After': '1'}
+    return jsonify({'error': str(error)}), 504
+
+
+def get_session_id():
+    """요청에서 연습 세션 id 꺼내기 (쿼리, 헤더, 폼, JSON 순서)"""
+    session_id = (
+        request.args.get('session_id')
+        or request.headers.get('X-Session-Id')
+        or request.form.get('session_id')
+    )
+    if not session_id and request.is_json:
+        session_id = (request.get_json(silent=True) or {}).get('session_id')
+    return session_id
+
+
+def record_emotion(session_id, emotion_result, timestamp=None):
+    """
+    세션에 감정 분석 결과 기록
+
+    Returns:
+        count: 세션의 기록 수
+    """
+    record = {
+        'emotions': emotion_result['emotions'],
+        'dominant_emotion': emotion_result['dominant_emotion'],
+        'confidence_score': emotion_result['confidence_score']
+    }
+    if timestamp is not None:
+        record['timestamp'] = timestamp
+    return session_store.append(session_id, record)
+
+
+def request_flag(name):
+    """쿼리/폼의 on/off 옵션 ('1', 'true', 'yes', 'on')"""
+    value = request.args.get(name, request.form.get(name, ''))
+    return str(value).lower() in ('1', 'true', 'yes', 'on')
+
+
+def requested_max_faces():
+    """여러 얼굴 모드의 최대 얼굴 수 (요청값, 설정값을 넘지 않음)"""
+    limit = app.config['MAX_FACES_PER_IMAGE']
+    try:
+        requested = int(request.args.get('max_faces', request.form.get('max_faces', limit)))
+    except (TypeError, ValueError):
+        requested = limit
+    return max(1, min(requested, limit))
+
+
+def make_result_title(similar_faces):
+    """
+    닮은꼴 결과로 재치있는 결과 타이틀 만들기
+    """
+    # ✨ 여기가 바로 새로운 로직의 핵심입니다! ✨
+    # 1. 상위 결과들의 카테고리를 분석합니다.
+    categories = {face['category'] for face in similar_faces} # set으로 중복 제거
+
+    # 2. 카테고리 조합에 따라 재치있는 결과 타이틀을 생성합니다.
+    if 'dogs' in categories and 'cats' in categories:
+        return "오묘한 매력의 ✨강냥이상✨이시네요!"
+    elif 'dogs' in categories:
+        return "다채로운 매력의 🐶 강아지상🐶 입니다!"
+    elif 'cats' in categories:
+        return "시크함과 귀여움이 공존하는 🐱고양이상🐱이네요!"
+    return "세상에, 동물나라에서 온 귀염둥이상이에요! 🥰"
+
+
+def image_phash(image_bytes):
+    """결과 캐시용 dhash (이미지가 아니면 None)"""
+    try:
+        return dhash(image_bytes)
+    except Exception:
+        return None
+
+
+def embed_user_images(user_images):
+    """
+    사용자 얼굴 이미지들의 CLIP 임베딩 + 성격 분석
+
+    추론 풀을 쓰면 전처리만 요청 스레드에서 하고, 임베딩과 성격 분석은 워커 프로세스에서 합니다.
+
+    Returns:
+        user_embeddings: (N, D) 정규화된 임베딩 행렬
+        personalities: 얼굴별 성격 분석 결과
+    """
+    if inference_pool is not None:
+        return inference_pool.embed_faces(preprocess_images(user_images))
+    user_embeddings = embed_images_batched(user_images)
+    return user_embeddings, get_personalities(user_embeddings)
+
+
+def open_similarity_index(database=None):
+    """
+    갤러리 검색 인덱스 열기
+
+    추론 풀을 쓰면 스냅샷은 워커가 만들고 (CLIP 필요), 웹 프로세스는 메모리 맵으로 열기만 합니다.
+    """
+    if inference_pool is not None:
+        inference_pool.build_gallery_index(database)
+    return load_similarity_index(database)
+
+
+def get_similarity_index():
+    """동물 임베딩 검색 인덱스 캐시 (최초 1회만 열기, 스냅샷이 없으면 생성)"""
+    global similarity_index_cache
+    if similarity_index_cache is None:
+        with _gallery_lock:
+            if similarity_index_cache is None:
+                print("동물 갤러리 인덱스 준비 중...")
+                similarity_index_cache = open_similarity_index()
+                print(f"총 {len(similarity_index_cache)}마리의 데이터 로드 완료!")
+    return similarity_index_cache
+
+
+def reload_gallery():
+    """
+    갤러리 매니페스트를 다시 읽어서 인덱스 교체
+
+    새로 추가되었거나 바뀐 이미지만 임베딩하고 (나머지는 임베딩 캐시),
+    새 인덱스가 완성된 뒤 한 번에 바꿔 끼우므로 처리 중인 요청은 예전 인덱스로 끝까지 진행됩니다.
+    다른 워커가 먼저 같은 갤러리의 스냅샷을 만들었으면 임베딩 없이 그 스냅샷을 엽니다.
+    매니페스트가 잘못되었으면 예외를 내고 기존 인덱스를 유지합니다.
+
+    Returns:
+        summary: 추가/삭제/변경된 동물 이름과 새 인덱스 정보
+    """
+    global similarity_index_cache
+    with _gallery_reload_lock:
+        database = load_gallery_manifest(app.config['GALLERY_MANIFEST'])
+        index = open_similarity_index(database)
+        with _gallery_lock:
+            previous_index, similarity_index_cache = similarity_index_cache, index
+    previous = previous_index.animal_digests() if previous_index is not None else {}
+    current = index.animal_digests()
+    changed = [name for name in current if name in previous and current[name] != previous[name]]
+    summary = {
+        'animals': len(index),
+        'version': index.version,
+        'added': [name for name in current if name not in previous],
+        'removed': [name for name in previous if name not in current],
+        'changed': changed
+    }
+    print(f"갤러리 다시 불러옴: {summary['animals']}마리 (추가 {len(summary['added'])}, "
+          f"삭제 {len(summary['removed'])}, 변경 {len(changed)})")
+    return summary
+
+
+gallery_watcher = GalleryWatcher(
+    app.config['GALLERY_MANIFEST'], reload_gallery, interval=app.config['GALLERY_WATCH_INTERVAL']
+)
+
+
+def warm_up_gallery():
+    """동물 갤러리 인덱스와 성격 키워드 임베딩 미리 준비 (추론 풀을 쓰면 성격 분석은 워커에서)"""
+    get_similarity_index()
+    if inference_pool is None:
+        get_personality_embeddings()
+    else:
+        get_image_preprocessor()
+
+
+# 모델 워밍업: CLIP, 감정 모델, 동물 갤러리를 각각 백그라운드 스레드에서 로드
+#   추론 풀을 쓰면 모델은 풀 워커가 시작하면서 로드하고, 갤러리는 그다음에 준비
+warmup = WarmupRegistry()
+if inference_pool is not None:
+    warmup.register('inference_pool', inference_pool.start)
+    warmup.register('gallery', warm_up_gallery, after=['inference_pool'])
+else:
+    warmup.register('clip', warm_up_clip)
+    warmup.register('gallery', warm_up_gallery)
+    warmup.register('emotion', warm_up_emotion)
+
+
+def _is_reloader_parent():
+    """debug 리로더의 감시용 부모 프로세스인지 (실제 서버는 자식 프로세스)"""
+    return __name__ == '__main__' and os.environ.get('WERKZEUG_RUN_MAIN') != 'true'
+
+
+def _is_pool_worker():
+    """추론 풀 워커 프로세스인지 (python app.py로 실행하면 spawn이 app.py를 __mp_main__으로 다시 import함)"""
+    return __name__ == '__mp_main__'
+
+
+if not _is_reloader_parent() and not _is_pool_worker():
+    if app.config['WARMUP_ON_START']:
+        warmup.start()
+    else:
+        # 미리 로드하지 않으면 첫 요청 때 로드하므로 /readyz는 바로 준비 완료
+        warmup.skip()
+
+if app.config['GALLERY_WATCH_INTERVAL'] > 0 and not _is_reloader_parent() and not _is_pool_worker():
+    gallery_watcher.start()
 
 
 @app.route('/')
@@ -72,10 +431,70 @@ def mode2():
     return render_template('mode_002.html')
 
 
+@app.route('/healthz')
+def healthz():
+    """프로세스 생존 확인 (모델 준비 여부와 무관)"""
+    return jsonify({'status': 'ok'})
+
+
+@app.route('/readyz')
+def readyz():
+    """모델별 준비 상태와 로드 시간 (모두 준비되기 전에는 503)"""
+    ready = warmup.is_ready()
+    return jsonify({
+        'ready': ready,
+        'components': warmup.status()
+    }), 200 if ready else 503
+
+
+@app.route('/metrics')
+def metrics():
+    """추론 큐 통계 (배치 크기, 대기 시간)"""
+    stats = get_inference_stats()
+    stats['emotion_batcher'] = get_emotion_stats()
+    stats['result_cache'] = result_cache.stats()
+    stats['emotion_tracking'] = emotion_trackers.stats()
+    stats['inference_pool'] = inference_pool.stats() if inference_pool is not None else None
+    return jsonify(stats)
+
+
+def is_admin_request():
+    """요청 헤더의 관리자 토큰 확인 (X-Admin-Token 또는 Authorization: Bearer)"""
+    expected = app.config['ADMIN_TOKEN']
+    if not expected:
+        return False
+    token = request.headers.get('X-Admin-Token', '')
+    auth = request.headers.get('Authorization', '')
+    if not token and auth.startswith('Bearer '):
+        token = auth[len('Bearer '):]
+    return hmac.compare_digest(token.encode('utf-8'), expected.encode('utf-8'))
+
+
+@app.route('/admin/reload-gallery', methods=['POST'])
+def admin_reload_gallery():
+    """
+    갤러리 매니페스트 다시 불러오기 (관리자용)
+
+    이 요청을 받은 워커 프로세스의 인덱스만 바뀝니다
+    (다른 워커는 GALLERY_WATCH_INTERVAL 감시로 따라옴).
+    """
+    if not is_admin_request():
+        return jsonify({'error': '권한이 없습니다'}), 403
+    try:
+        return jsonify(dict(reload_gallery(), success=True))
+    except (OSError, ValueError) as e:
+        return jsonify({'error': f'갤러리 매니페스트 오류: {str(e)}'}), 400
+    except Exception as e:
+        return jsonify({'error': f'갤러리 갱신 중 오류: {str(e)}'}), 500
+
+
 @app.route('/analyze-similarity', methods=['POST'])
 def analyze_similarity():
     """
     모드 1: 사용자 얼굴과 닮은 동물 찾기
+
+    multi_face=1 (쿼리 또는 폼)이면 사진 속 얼굴마다 결과를 faces에 담아 반환합니다.
+    max_faces로 얼굴 수를 줄일 수 있습니다 (MAX_FACES_PER_IMAGE 이하).
     """
     if 'image' not in request.files:
         return jsonify({'error': '이미지가 없습니다'}), 400
@@ -85,56 +504,74 @@ def analyze_similarity():
         return jsonify({'error': '파일이 선택되지 않았습니다'}), 400
     
     if file and allowed_file(file.filename):
-        # 파일 저장
-        filename = secure_filename(file.filename)
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"{timestamp}_{filename}"
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
+        image_bytes = file.read()
+        content_hash = hash_bytes(image_bytes)
+        phash = image_phash(image_bytes) if result_cache.phash_distance is not None else None
         
         try:
-            # 동물 임베딩 가져오기
-            animal_embeddings = get_animal_embeddings()
+            # 동물 임베딩 인덱스 가져오기
+            similarity_index = get_similarity_index()
             
-            if not animal_embeddings:
+            if len(similarity_index) == 0:
                 return jsonify({
                     'error': '동물 데이터베이스가 비어있습니다. static/animals/ 폴더에 이미지를 추가해주세요.'
                 }), 500
             
-            # 상위 3개 닮은꼴 찾기
-            similar_faces = find_similar_faces(filepath, animal_embeddings, top_k=3)
+            # 여러 얼굴 모드: 사진 속 얼굴마다 닮은꼴 찾기 (최대 MAX_FACES_PER_IMAGE개)
+            multi_face = request_flag('multi_face')
+            max_faces = requested_max_faces() if multi_face else 1
+            
+            # 같은 사진(같은 모델/갤러리)은 캐시된 결과를 그대로 반환
+            cache_version = f"{get_embedding_version()}:{similarity_index.version}"
+            if multi_face:
+                cache_version += f':multi{max_faces}'
+            elif app.config['FACE_CROP']:
+                cache_version += ':face'
+            cached = result_cache.get(cache_version, content_hash, phash)
+            if cached is not None:
+                return jsonify(dict(cached, cached=True))
+            
+            # 파일 저장
+            filename = secure_filename(file.filename)
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            filename = f"{timestamp}_{filename}"
+            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+            with open(filepath, 'wb') as f:
+                f.write(image_bytes)
             
-            # ✨ 여기가 바로 새로운 로직의 핵심입니다! ✨
-            # 1. 상위 결과들의 카테고리를 분석합니다.
-            categories = {face['category'] for face in similar_faces} # set으로 중복 제거
-
-            # 2. 카테고리 조합에 따라 재치있는 결과 타이틀을 생성합니다.
-            result_title = ""
-            if 'dogs' in categories and 'cats' in categories:
-                result_title = "오묘한 매력의 ✨강냥이상✨이시네요!"
-            elif 'dogs' in categories:
-                result_title = "다채로운 매력의 🐶 강아지상🐶 입니다!"
-            elif 'cats' in categories:
-                result_title = "시크함과 귀여움이 공존하는 🐱고양이상🐱이네요!"
-            else:
-                result_title = "세상에, 동물나라에서 온 귀염둥이상이에요! 🥰"
-
-
-            # 성격 분석 (텍스트 기반)
-            personality = get_personality_by_text(filepath)
+            # 얼굴 영역만 잘라내기 (검출 결과는 업로드 파일 옆에 저장, 얼굴이 없으면 전체 이미지)
+            user_images, face_boxes = [filepath], [None]
+            if multi_face or app.config['FACE_CROP']:
+                user_images, faces = prepare_face_images(filepath, max_faces)
+                face_boxes = [face['box'] for face in faces] or [None]
             
-            # 각 결과에 코멘트 추가
-            for face in similar_faces:
-                face['comment'] = generate_comment(face['similarity'])
+            # 얼굴들을 한 번의 배치 추론으로 임베딩하고 성격 분석 (텍스트 기반)
+            user_embeddings, personalities = embed_user_images(user_images)
             
-            return jsonify({
-                'success': True,
-                'user_image': f"/static/uploads/{filename}",
-                'similar_faces': similar_faces,
-                'personality': personality,
-                'result_title': result_title
-            })
+            # 얼굴별 상위 3개 닮은꼴 (행렬 곱 한 번)
+            similar_faces_list = similarity_index.query_batch(user_embeddings, k=3)
             
+            face_results = []
+            for face_box, similar_faces, personality in zip(face_boxes, similar_faces_list, personalities):
+                # 각 결과에 코멘트 추가
+                for face in similar_faces:
+                    face['comment'] = generate_comment(face['similarity'])
+                face_results.append({
+                    'face_box': face_box,
+                    'similar_faces': similar_faces,
+                    'personality': personality,
+                    'result_title': make_result_title(similar_faces)
+                })
+            
+            # 단일 얼굴 응답 형식은 그대로 두고 (가장 큰 얼굴), 여러 얼굴 모드면 faces를 추가
+            result = dict(face_results[0], success=True, user_image=f"/static/uploads/{filename}")
+            if multi_face:
+                result['faces'] = face_results
+            result_cache.put(cache_version, content_hash, result, phash)
+            return jsonify(dict(result, cached=False))
+            
+        except (InferenceBusy, InferenceTimeout) as e:
+            return inference_unavailable(e)
         except Exception as e:
             import traceback
             print(traceback.format_exc())
@@ -143,96 +580,134 @@ def analyze_similarity():
     return jsonify({'error': '유효하지 않은 파일 형식'}), 400
 
 
+@app.route('/start-practice-session', methods=['POST'])
+def start_practice_session():
+    """
+    모드 2: 연습 세션 시작 (감정 기록은 서버에 저장)
+    """
+    return jsonify({
+        'success': True,
+        'session_id': session_store.create()
+    })
+
+
 @app.route('/analyze-emotion-realtime', methods=['POST'])
 def analyze_emotion_realtime():
     """
     모드 2: 실시간 감정 분석 (웹캠)
+
+    session_id가 있으면 분석 결과를 서버의 세션 기록에 추가하고,
+    세션별 추적(EMOTION_TRACKING)으로 변화 없는 프레임은 추론을 건너뛰고 결과를 스무딩합니다.
     """
     try:
-        data = request.json
-        image_data = data['image'].split(',')[1]
+        session_id = get_session_id()
+        if session_id and not session_store.exists(session_id):
+            return jsonify({'error': '세션이 없거나 만료되었습니다'}), 404
         
-        # Base64 디코드
-        image_bytes = base64.b64decode(image_data)
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        # 임시 저장
-        temp_path = os.path.join(app.config['UPLOAD_FOLDER'], 'temp_webcam.jpg')
-        cv2.imwrite(temp_path, img)
+        # 디스크에 쓰지 않고 메모리에서 바로 디코드해서 분석
+        try:
+            img = decode_image(read_frame_bytes())
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # DeepFace 감정 분석
-        emotion_result = analyze_face_emotion(temp_path)
+        tracker = None
+        if session_id and app.config['EMOTION_TRACKING']:
+            tracker = emotion_trackers.get(session_id)
+        emotion_result, tracking = analyze_tracked_frame(img, tracker)
         
-        return jsonify({
+        response = {
             'success': True,
             'emotion': emotion_result
-        })
+        }
+        if tracking is not None:
+            response['tracking'] = tracking
+        if session_id:
+            response['frame_count'] = record_emotion(
+                session_id, emotion_result, request.args.get('timestamp', type=int)
+            )
+        return jsonify(response)
         
+    except (InferenceBusy, InferenceTimeout) as e:
+        return inference_unavailable(e)
     except Exception as e:
         import traceback
         print(traceback.format_exc())
         return jsonify({'error': f'분석 중 오류: {str(e)}'}), 500
 
 
+@app.route('/practice-session/<session_id>/live-feedback')
+def practice_live_feedback(session_id):
+    """
+    모드 2: 연습 도중 중간 피드백 (누적 집계 기준)
+    """
+    try:
+        aggregator = session_store.get_aggregator(session_id)
+    except SessionNotFound:
+        return jsonify({'error': '세션이 없거나 만료되었습니다'}), 404
+    return jsonify({
+        'success': True,
+        'live_feedback': aggregator.live_feedback()
+    })
+
+
 @app.route('/generate-practice-report', methods=['POST'])
 def generate_practice_report():
     """
     모드 2: 발표 연습 최종 리포트 생성
     """
     try:
-        data = request.json
-        emotion_history = data.get('emotion_history', [])
+        data = request.get_json(silent=True) or {}
+        session_id = data.get('session_id')
         
-        if not emotion_history:
+        if session_id:
+            # 서버 세션에 누적된 집계 사용 (기록을 다시 훑지 않음)
+            try:
+                aggregator = session_store.get_aggregator(session_id)
+            except SessionNotFound:
+                return jsonify({'error': '세션이 없거나 만료되었습니다'}), 404
+        else:
+            # 예전 방식: 클라이언트가 전체 기록을 보냄
+            aggregator = SessionAggregator.from_history(data.get('emotion_history', []))
+        
+        if not aggregator:
             return jsonify({'error': '데이터가 없습니다'}), 400
         
         # 피드백 생성
-        feedback = generate_feedback(emotion_history)
+        feedback = aggregator.feedback()
         
         # 베스트 순간 찾기
-        best_moments = analyze_best_moment(emotion_history)
+        best_moments = aggregator.best_moments()
         
         # 타임라인 데이터
-        timeline = get_emotion_timeline(emotion_history)
+        timeline = aggregator.timeline()
         
         # 그래프 생성
-        plt.figure(figsize=(12, 6))
-        plt.rcParams['axes.unicode_minus'] = False
-        
-        # 감정별 시간 추이
-        plt.plot(timeline['timestamps'], timeline['happy'], 
-                marker='o', label='Happy 😊', linewidth=2, color='#4CAF50')
-        plt.plot(timeline['timestamps'], timeline['neutral'], 
-                marker='s', label='Neutral 😐', linewidth=2, color='#2196F3')
-        plt.plot(timeline['timestamps'], timeline['fear'], 
-                marker='^', label='Fear 😰', linewidth=2, color='#FF9800')
-        plt.plot(timeline['timestamps'], timeline['confidence'], 
-                marker='D', label='Confidence 💪', linewidth=2, 
-                color='#9C27B0', linestyle='--')
+        chart_format = data.get('chart_format', 'file')
+        if chart_format not in REPORT_CHART_FORMATS:
+            return jsonify({'error': f'지원하지 않는 그래프 형식: {chart_format}'}), 400
         
-        plt.xlabel('Time (frames)', fontsize=12)
-        plt.ylabel('Score (%)', fontsize=12)
-        plt.title('Emotion Timeline During Practice', fontsize=14, fontweight='bold')
-        plt.legend(loc='best', fontsize=10)
-        plt.grid(True, alpha=0.3)
-        plt.tight_layout()
-        
-        # 저장
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        report_path = os.path.join(
-            app.config['RESULT_FOLDER'], 
-            f"report_{timestamp}.png"
-        )
-        plt.savefig(report_path, dpi=150, bbox_inches='tight')
-        plt.close()
-        
-        return jsonify({
+        response = {
             'success': True,
-            'report_image': f"/static/uploads/results/report_{timestamp}.png",
             'feedback': feedback,
             'best_moments': best_moments
-        })
+        }
+        if chart_format == 'file':
+            # 저장
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            report_path = os.path.join(
+                app.config['RESULT_FOLDER'], 
+                f"report_{timestamp}.png"
+            )
+            report_renderer.render_file(timeline, report_path)
+            response['report_image'] = f"/static/uploads/results/report_{timestamp}.png"
+        elif chart_format == 'png':
+            response['report_image'] = report_renderer.render_png_data_url(timeline)
+        elif chart_format == 'svg':
+            response['report_svg'] = report_renderer.render_svg(timeline)
+        else:
+            response['chart_data'] = report_renderer.chart_data(timeline)
+        
+        return jsonify(response)
         
     except Exception as e:
         import traceback
@@ -246,19 +721,21 @@ def save_best_frame():
     베스트 순간 이미지 저장
     """
     try:
-        data = request.json
-        image_data = data['image'].split(',')[1]
-        
-        # Base64 디코드
-        image_bytes = base64.b64decode(image_data)
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        try:
+            image_bytes = read_frame_bytes()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # 저장
+        # 저장 (JPEG는 다시 인코딩하지 않고 그대로 저장)
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         filename = f"best_frame_{timestamp}.jpg"
         filepath = os.path.join(app.config['RESULT_FOLDER'], filename)
-        cv2.imwrite(filepath, img)
+        if image_bytes[:3] == b'\xff\xd8\xff':
+            with open(filepath, 'wb') as f:
+                f.write(image_bytes)
+        else:
+            import cv2
+            cv2.imwrite(filepath, decode_image(image_bytes))
         
         return jsonify({
             'success': True,
@@ -269,10 +746,48 @@ def save_best_frame():
         return jsonify({'error': f'저장 중 오류: {str(e)}'}), 500
 
 
+if Sock is not None:
+    sock = Sock(app)
+
+    @sock.route('/ws/emotion')
+    def emotion_stream(ws):
+        """
+        모드 2: 웹소켓 프레임 스트림 (세션당 연결 하나)
+
+        바이너리 메시지 하나가 JPEG/PNG 프레임 하나이고,
+        분석 결과를 /analyze-emotion-realtime과 같은 JSON으로 돌려줍니다.
+        연결 URL에 ?session_id=... 가 있으면 세션 기록에 추가합니다.
+        EMOTION_TRACKING이 켜져 있으면 연결마다 추적기를 하나 씁니다.
+        """
+        session_id = request.args.get('session_id')
+        if session_id and not session_store.exists(session_id):
+            ws.send(json.dumps({'error': '세션이 없거나 만료되었습니다'}))
+            return
+        tracker = EmotionTracker(analyze_webcam_frame) if app.config['EMOTION_TRACKING'] else None
+        while True:
+            message = ws.receive()
+            if message is None:
+                break
+            try:
+                if isinstance(message, str):
+                    # 텍스트로 오면 기존 data URL 형식으로 처리
+                    message = base64.b64decode(message.split(',', 1)[-1])
+                emotion_result, tracking = analyze_tracked_frame(decode_image(message), tracker)
+                response = {'success': True, 'emotion': emotion_result}
+                if tracking is not None:
+                    response['tracking'] = tracking
+                if session_id:
+                    response['frame_count'] = record_emotion(session_id, emotion_result)
+                ws.send(json.dumps(response))
+            except Exception as e:
+                ws.send(json.dumps({'error': f'분석 중 오류: {str(e)}'}))
+
+
 if __name__ == '__main__':
     print("=" * 50)
     print("🎭 Face Match Studio 서버 시작!")
     print("=" * 50)
     print("📍 URL: http://localhost:5000")
     print("=" * 50)
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    # IMAGO_DEBUG=0이면 리로더 없이 실행 (운영 배포는 wsgi.py 참고)
+    app.run(debug=os.environ.get('IMAGO_DEBUG', '1') != '0', host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,508 @@
+# ann_index.py
+# 큰 갤러리(수만~수십만 장)용 근사 최근접 이웃(ANN) 인덱스
+#   ivf     : 순수 numpy IVF - k-means로 나눈 목록 중 질의와 가까운 nprobe개 목록만 탐색
+#   faiss   : faiss IndexIVFFlat (faiss가 설치되어 있을 때)
+#   hnswlib : hnswlib HNSW 그래프 (hnswlib가 설치되어 있을 때)
+# 인덱스는 오프라인으로 만들어 임베딩 캐시 폴더 아래(ann/)에 저장하고, 서버에서는 메모리 맵으로 엽니다.
+# AnnSimilarityIndex는 SimilarityIndex와 같은 query / query_batch API를 제공합니다.
+#
+#   python -m models.ann_index build --backend ivf          # 현재 갤러리로 인덱스 생성/저장
+#   python -m models.ann_index benchmark --size 100000      # 정확 검색 대비 recall@k, 지연 시간
+import argparse
+import json
+import math
+import os
+import shutil
+import time
+import uuid
+
+import numpy as np
+
+from models.similarity_index import normalize_rows, top_k_indices
+
+ANN_BACKENDS = ('ivf', 'faiss', 'hnswlib')
+ANN_META_NAME = 'ann.json'
+
+# 저장 포맷 버전 (포맷이 바뀌면 올려서 기존 인덱스를 무시)
+ANN_FORMAT_VERSION = 1
+
+
+def default_nlist(count):
+    """IVF 목록 수 (갤러리 크기의 제곱근 정도)"""
+    return max(1, min(count, int(round(math.sqrt(count)))))
+
+
+def default_nprobe(nlist):
+    """
+    질의마다 탐색할 목록 수
+
+    고정값이라 탐색하는 벡터 수가 대략 nprobe * sqrt(N)으로만 늘어납니다.
+    """
+    return max(1, min(nlist, 8))
+
+
+def _assign(vectors, centroids, chunk_size=8192):
+    """각 벡터와 코사인 유사도가 가장 큰 중심 번호 (메모리를 아끼려고 나눠서 계산)"""
+    labels = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), chunk_size):
+        labels[start:start + chunk_size] = (vectors[start:start + chunk_size] @ centroids.T).argmax(axis=1)
+    return labels
+
+
+def spherical_kmeans(vectors, nlist, iterations=10, max_train_points=64, seed=0):
+    """
+    정규화된 벡터의 구면 k-means (중심도 정규화)
+
+    Args:
+        vectors: (N, D) 정규화된 float32
+        nlist: 중심 수
+        iterations: 반복 횟수
+        max_train_points: 중심 하나당 학습에 쓸 최대 표본 수 (큰 갤러리는 표본으로 학습)
+        seed: 난수 시드
+
+    Returns:
+        centroids: (nlist, D) 정규화된 중심
+    """
+    rng = np.random.default_rng(seed)
+    train = vectors
+    if len(vectors) > nlist * max_train_points:
+        train = vectors[rng.choice(len(vectors), nlist * max_train_points, replace=False)]
+    centroids = train[rng.choice(len(train), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        labels = _assign(train, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, train)
+        counts = np.bincount(labels, minlength=nlist)
+        # 빈 목록은 임의의 학습 벡터로 다시 시작
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            sums[empty] = train[rng.choice(len(train), len(empty), replace=False)]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+class IvfIndex:
+    """
+    순수 numpy IVF(inverted file) 인덱스 (내적 = 코사인 유사도)
+
+    벡터를 목록 순서로 정렬해서 저장하고 (offsets[l]:offsets[l+1]이 목록 l),
+    질의는 중심과의 유사도 상위 nprobe개 목록의 벡터만 점수를 매깁니다.
+    갤러리가 커져도 탐색하는 벡터 수는 대략 N * nprobe / nlist로 늘어납니다.
+    """
+
+    name = 'ivf'
+
+    def __init__(self, centroids, vectors, ids, offsets, nprobe=None):
+        self.centroids = centroids
+        self.vectors = vectors
+        self.ids = ids
+        self.offsets = offsets
+        self.nprobe = nprobe or default_nprobe(len(centroids))
+
+    @classmethod
+    def empty(cls, dim=0):
+        """벡터가 없는 인덱스 (빈 갤러리)"""
+        return cls(np.zeros((0, dim), dtype=np.float32), np.zeros((0, dim), dtype=np.float32),
+                   np.zeros(0, dtype=np.int64), np.zeros(1, dtype=np.int64), nprobe=1)
+
+    @classmethod
+    def build(cls, vectors, nlist=None, nprobe=None, iterations=10, seed=0):
+        vectors = normalize_rows(vectors)
+        if len(vectors) == 0:
+            # 학습할 벡터가 없음
+            return cls.empty(vectors.shape[1] if vectors.ndim == 2 else 0)
+        nlist = min(nlist or default_nlist(len(vectors)), len(vectors))
+        centroids = spherical_kmeans(vectors, nlist, iterations=iterations, seed=seed)
+        labels = _assign(vectors, centroids)
+        order = np.argsort(labels, kind='stable')
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(labels, minlength=nlist), out=offsets[1:])
+        return cls(centroids, np.ascontiguousarray(vectors[order]), order.astype(np.int64), offsets, nprobe)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def params(self):
+        return {'nlist': len(self.centroids), 'nprobe': self.nprobe}
+
+    def _probe_lists(self, centroid_scores, probes, k):
+        """탐색할 목록 번호 (후보가 k개보다 적으면 목록을 더 엶)"""
+        sizes = self.offsets[probes + 1] - self.offsets[probes]
+        if sizes.sum() >= k or len(probes) == len(self.centroids):
+            return probes
+        lists = np.argsort(-centroid_scores, kind='stable')
+        sizes = self.offsets[lists + 1] - self.offsets[lists]
+        return lists[:int(np.searchsorted(np.cumsum(sizes), k)) + 1]
+
+    def _scan(self, query, lists):
+        """목록들의 (위치, 유사도) - 목록은 연속 구간이라 복사 없이 구간별 행렬-벡터 곱"""
+        positions, scores = [], []
+        for l in lists:
+            start, end = self.offsets[l], self.offsets[l + 1]
+            if end > start:
+                positions.append(np.arange(start, end))
+                scores.append(self.vectors[start:end] @ query)
+        if not positions:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        return np.concatenate(positions), np.concatenate(scores)
+
+    def search(self, queries, k):
+        """
+        Args:
+            queries: (B, D) 정규화된 질의
+            k: 상위 k개
+
+        Returns:
+            scores: (B, k) 유사도 (결과가 모자라면 -inf)
+            ids: (B, k) 원래 행 번호 (결과가 모자라면 -1)
+        """
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        centroid_scores = queries @ self.centroids.T
+        probes = top_k_indices(centroid_scores, self.nprobe)
+        for i, query in enumerate(queries):
+            candidates, candidate_scores = self._scan(query, self._probe_lists(centroid_scores[i], probes[i], k))
+            top = top_k_indices(candidate_scores, k)
+            scores[i, :len(top)] = candidate_scores[top]
+            ids[i, :len(top)] = self.ids[candidates[top]]
+        return scores, ids
+
+    def save(self, directory):
+        for name in ('centroids', 'vectors', 'ids', 'offsets'):
+            np.save(os.path.join(directory, f'{name}.npy'), getattr(self, name))
+
+    @classmethod
+    def load(cls, directory, params, mmap=True):
+        mode = 'r' if mmap else None
+        arrays = {
+            name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode=mode)
+            for name in ('centroids', 'vectors', 'ids', 'offsets')
+        }
+        # 중심/오프셋은 작고 매 질의마다 전부 읽으므로 메모리에 올림
+        return cls(np.asarray(arrays['centroids']), arrays['vectors'], arrays['ids'],
+                   np.asarray(arrays['offsets']), params.get('nprobe'))
+
+
+class FaissIvfIndex:
+    """faiss IndexIVFFlat (내적), 저장 파일은 메모리 맵으로 읽음"""
+
+    name = 'faiss'
+    FILE_NAME = 'index.faiss'
+
+    def __init__(self, index, nprobe=None):
+        self.index = index
+        self.index.nprobe = nprobe or default_nprobe(index.nlist)
+
+    @classmethod
+    def build(cls, vectors, nlist=None, nprobe=None, **_):
+        import faiss
+        vectors = normalize_rows(vectors)
+        nlist = nlist or default_nlist(len(vectors))
+        quantizer = faiss.IndexFlatIP(vectors.shape[1])
+        index = faiss.IndexIVFFlat(quantizer, vectors.shape[1], nlist, faiss.METRIC_INNER_PRODUCT)
+        index.train(vectors)
+        index.add(vectors)
+        return cls(index, nprobe)
+
+    def __len__(self):
+        return self.index.ntotal
+
+    def params(self):
+        return {'nlist': self.index.nlist, 'nprobe': self.index.nprobe}
+
+    def search(self, queries, k):
+        scores, ids = self.index.search(np.ascontiguousarray(queries, dtype=np.float32), k)
+        scores[ids < 0] = -np.inf
+        return scores, ids.astype(np.int64)
+
+    def save(self, directory):
+        import faiss
+        faiss.write_index(self.index, os.path.join(directory, self.FILE_NAME))
+
+    @classmethod
+    def load(cls, directory, params, mmap=True):
+        import faiss
+        flags = faiss.IO_FLAG_MMAP if mmap else 0
+        return cls(faiss.read_index(os.path.join(directory, cls.FILE_NAME), flags), params.get('nprobe'))
+
+
+class HnswIndex:
+    """hnswlib HNSW 그래프 (내적), 저장 파일을 통째로 읽음 (메모리 맵 미지원)"""
+
+    name = 'hnswlib'
+    FILE_NAME = 'index.hnsw'
+
+    def __init__(self, index, ef=None):
+        self.index = index
+        self.ef = ef or 64
+        self.index.set_ef(self.ef)
+
+    @classmethod
+    def build(cls, vectors, m=16, ef_construction=200, ef=None, **_):
+        import hnswlib
+        vectors = normalize_rows(vectors)
+        index = hnswlib.Index(space='ip', dim=vectors.shape[1])
+        index.init_index(max_elements=len(vectors), M=m, ef_construction=ef_construction)
+        index.add_items(vectors, np.arange(len(vectors)))
+        return cls(index, ef)
+
+    def __len__(self):
+        return self.index.get_current_count()
+
+    def params(self):
+        return {'dim': self.index.dim, 'ef': self.ef}
+
+    def search(self, queries, k):
+        self.index.set_ef(max(self.ef, k))
+        k_found = min(k, len(self))
+        labels, distances = self.index.knn_query(np.ascontiguousarray(queries, dtype=np.float32), k=k_found)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        scores[:, :k_found] = 1.0 - distances  # 'ip' 거리 = 1 - 내적
+        ids[:, :k_found] = labels
+        return scores, ids
+
+    def save(self, directory):
+        self.index.save_index(os.path.join(directory, self.FILE_NAME))
+
+    @classmethod
+    def load(cls, directory, params, mmap=True):
+        import hnswlib
+        index = hnswlib.Index(space='ip', dim=params['dim'])
+        index.load_index(os.path.join(directory, cls.FILE_NAME))
+        return cls(index, params.get('ef'))
+
+
+ANN_INDEX_CLASSES = {'ivf': IvfIndex, 'faiss': FaissIvfIndex, 'hnswlib': HnswIndex}
+
+
+def build_ann(backend, vectors, **params):
+    """
+    ANN 인덱스 생성
+
+    Raises:
+        ValueError: 알 수 없는 백엔드
+        ImportError: faiss/hnswlib가 설치되어 있지 않을 때
+    """
+    if backend not in ANN_INDEX_CLASSES:
+        raise ValueError(f"알 수 없는 ANN 백엔드: {backend} (가능: {', '.join(ANN_BACKENDS)})")
+    return ANN_INDEX_CLASSES[backend].build(vectors, **params)
+
+
+def save_ann(ann, directory, source_version):
+    """
+    ANN 인덱스를 폴더에 저장 (임시 폴더에 쓴 뒤 이름 바꾸기)
+
+    Args:
+        source_version: 인덱스를 만든 갤러리 버전 (불러올 때 확인)
+    """
+    parent = os.path.dirname(os.path.abspath(directory))
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = os.path.join(parent, f".{os.path.basename(directory)}.{uuid.uuid4().hex[:8]}.tmp")
+    os.makedirs(tmp_dir)
+    ann.save(tmp_dir)
+    with open(os.path.join(tmp_dir, ANN_META_NAME), 'w', encoding='utf-8') as f:
+        json.dump({
+            'format': ANN_FORMAT_VERSION,
+            'backend': ann.name,
+            'count': len(ann),
+            'source_version': source_version,
+            'params': ann.params()
+        }, f)
+    try:
+        os.rename(tmp_dir, directory)
+    except OSError:
+        # 다른 워커가 먼저 저장함 - 그쪽 인덱스를 그대로 씀
+        for name in os.listdir(tmp_dir):
+            os.remove(os.path.join(tmp_dir, name))
+        os.rmdir(tmp_dir)
+
+
+def remove_old_ann(root, backend, keep):
+    """
+    같은 백엔드의 예전 갤러리 버전 ANN 폴더 정리 (keep 폴더만 남김)
+
+    갤러리를 다시 불러올 때마다 새 버전 폴더가 생기므로 지우지 않으면 디스크에 계속 쌓입니다.
+    다른 워커가 아직 열고 있어도 리눅스에서는 안전합니다 (저장 중인 임시 폴더는 '.'으로 시작해서 제외).
+    """
+    for name in os.listdir(root):
+        if name.startswith(backend + '-') and name != keep:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+def load_ann(directory, source_version=None, mmap=True):
+    """
+    저장된 ANN 인덱스 열기
+
+    Returns:
+        ann: 인덱스 (없거나 갤러리 버전/포맷이 다르면 None)
+    """
+    try:
+        with open(os.path.join(directory, ANN_META_NAME), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get('format') != ANN_FORMAT_VERSION:
+        return None
+    if source_version is not None and meta.get('source_version') != source_version:
+        return None
+    return ANN_INDEX_CLASSES[meta['backend']].load(directory, meta.get('params', {}), mmap=mmap)
+
+
+class AnnSimilarityIndex:
+    """
+    ANN 인덱스 + 갤러리 메타데이터 (SimilarityIndex와 같은 질의 API)
+
+    Args:
+        ann: IvfIndex / FaissIvfIndex / HnswIndex
+        metadata: 행별 {'name', 'image', 'description', 'category'}
+        version: 결과 캐시용 식별자
+        digests: 동물별 내용 식별자 (원본 인덱스의 animal_digests())
+    """
+
+    def __init__(self, ann, metadata, version, digests=None):
+        self.ann = ann
+        self.digests = digests or {}
+        self.metadata = np.empty(len(metadata), dtype=object)
+        self.metadata[:] = list(metadata)
+        self.version = version
+        if len(ann) != len(self.metadata):
+            raise ValueError("ANN 인덱스 크기와 메타데이터 수가 다릅니다")
+
+    @classmethod
+    def from_index(cls, index, backend='ivf', directory=None, **params):
+        """
+        SimilarityIndex로 ANN 인덱스 만들기 (directory에 같은 갤러리 인덱스가 있으면 불러옴)
+
+        Args:
+            index: SimilarityIndex (정확 검색용 행렬 + 메타데이터)
+            backend: 'ivf', 'faiss', 'hnswlib'
+            directory: 인덱스 저장 폴더 루트 (없으면 저장하지 않음)
+        """
+        if len(index) == 0:
+            # 빈 갤러리는 만들거나 저장할 것이 없음 (query_batch는 빈 결과)
+            return cls(IvfIndex.empty(), index.metadata, f"{index.version}:{backend}", index.animal_digests())
+        ann = None
+        path = None
+        if directory is not None:
+            path = os.path.join(directory, f"{backend}-{index.version}")
+            ann = load_ann(path, index.version)
+        if ann is None:
+            started = time.perf_counter()
+            ann = build_ann(backend, index.matrix, **params)
+            print(f"ANN 인덱스 생성 ({backend}, {len(ann)}개, {time.perf_counter() - started:.1f}초)")
+            if path is not None:
+                try:
+                    save_ann(ann, path, index.version)
+                except OSError as e:
+                    print(f"ANN 인덱스 저장 오류: {e}")
+        if path is not None and os.path.isdir(path):
+            remove_old_ann(directory, backend, keep=os.path.basename(path))
+        return cls(ann, index.metadata, f"{index.version}:{backend}", index.animal_digests())
+
+    def __len__(self):
+        return len(self.metadata)
+
+    def animal_digests(self):
+        return dict(self.digests)
+
+    def _result(self, row, score):
+        meta = self.metadata[row]
+        return {
+            'name': meta['name'],
+            'similarity': float(score) * 100,
+            'image': meta['image'],
+            'description': meta['description'],
+            'category': meta['category']
+        }
+
+    def query(self, embedding, k=3):
+        """임베딩 하나와 가장 비슷한 상위 k개 (근사)"""
+        return self.query_batch(embedding, k)[0]
+
+    def query_batch(self, embeddings, k=3):
+        """여러 임베딩 질의 (SimilarityIndex.query_batch()와 같은 형식, 근사)"""
+        queries = normalize_rows(np.atleast_2d(embeddings))
+        if len(self) == 0:
+            return [[] for _ in range(queries.shape[0])]
+        scores, ids = self.ann.search(queries, k)
+        return [
+            [self._result(row, score) for row, score in zip(ids[i], scores[i]) if row >= 0]
+            for i in range(queries.shape[0])
+        ]
+
+
+def recall_at_k(ann, vectors, queries, k):
+    """
+    정확 검색 대비 recall@k와 질의당 지연 시간
+
+    Returns:
+        report: {'recall', 'ann_ms', 'exact_ms'}
+    """
+    vectors = normalize_rows(vectors)
+    queries = normalize_rows(queries)
+    started = time.perf_counter()
+    exact = [set(top_k_indices(vectors @ query, k).tolist()) for query in queries]
+    exact_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    found = [ann.search(query[np.newaxis], k)[1][0] for query in queries]
+    ann_time = time.perf_counter() - started
+
+    hits = sum(len(expected & set(ids.tolist())) for expected, ids in zip(exact, found))
+    return {
+        'recall': round(hits / (len(queries) * k), 4),
+        'ann_ms': round(ann_time / len(queries) * 1000, 3),
+        'exact_ms': round(exact_time / len(queries) * 1000, 3)
+    }
+
+
+def synthetic_gallery(size, dim=512, clusters=None, seed=0):
+    """벤치마크용 군집 구조가 있는 임의 임베딩 (CLIP 임베딩처럼 비슷한 것끼리 모여 있음)"""
+    rng = np.random.default_rng(seed)
+    clusters = clusters or max(1, size // 100)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size)
+    return normalize_rows(centers[labels] + 0.6 * rng.normal(size=(size, dim)).astype(np.float32))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='갤러리 ANN 인덱스 생성 / 벤치마크')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    build = sub.add_parser('build', help='현재 갤러리로 ANN 인덱스를 만들어 임베딩 캐시 폴더에 저장')
+    build.add_argument('--backend', choices=ANN_BACKENDS, default='ivf')
+
+    bench = sub.add_parser('benchmark', help='정확 검색 대비 recall@k / 질의 지연 시간')
+    bench.add_argument('--backend', choices=ANN_BACKENDS, default='ivf')
+    bench.add_argument('--size', type=int, nargs='+', default=[10000, 100000], help='갤러리 크기 (임의 임베딩)')
+    bench.add_argument('--dim', type=int, default=512)
+    bench.add_argument('--queries', type=int, default=200)
+    bench.add_argument('--k', type=int, default=3)
+    bench.add_argument('--nprobe', type=int, default=None)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        from models.clip_matcher import get_embedding_store, initialize_animal_embeddings
+        from models.similarity_index import SimilarityIndex
+        index = SimilarityIndex.from_embeddings(initialize_animal_embeddings())
+        directory = os.path.join(get_embedding_store().dir, 'ann')
+        ann_index = AnnSimilarityIndex.from_index(index, args.backend, directory)
+        print(f"{args.backend} 인덱스: {len(ann_index)}개, {ann_index.ann.params()} ({directory})")
+        return
+
+    for size in args.size:
+        vectors = synthetic_gallery(size, args.dim)
+        # 질의는 같은 분포에서 새로 뽑은 벡터 (갤러리에 없는 사용자 사진)
+        queries = synthetic_gallery(size + args.queries, args.dim)[size:]
+        started = time.perf_counter()
+        params = {'nprobe': args.nprobe} if args.backend != 'hnswlib' else {}
+        ann = build_ann(args.backend, vectors, **params)
+        build_time = time.perf_counter() - started
+        report = recall_at_k(ann, vectors, queries.astype(np.float32), args.k)
+        print(f"{args.backend} N={size}: recall@{args.k} {report['recall']}, "
+              f"ANN {report['ann_ms']}ms / 정확 {report['exact_ms']}ms, 생성 {build_time:.1f}초, {ann.params()}")
+
+
+if __name__ == '__main__':
+    main()
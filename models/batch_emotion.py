@@ -0,0 +1,243 @@
+# batch_emotion.py
+# 녹화된 발표 연습 영상을 오프라인으로 한꺼번에 감정 분석 + 리포트 생성
+#   영상마다 OpenCV로 초당 fps장씩 프레임을 뽑아 배치로 감정 분석하고
+#   웹 리포트와 같은 로직(EmotionArrays - generate_feedback, analyze_best_moment와 같은 결과)으로 리포트를 만듭니다.
+#   여러 영상은 프로세스 풀에서 나눠서 처리합니다 (프로세스마다 감정 모델 하나).
+#
+#   python -m models.batch_emotion rehearsals/ --output reports/ --fps 2 --workers 2
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+import numpy as np
+
+from models.face_analyzer import EmotionArrays, predict_emotions, probabilities_to_percent
+from models.inference_pool import limit_threads
+
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.avi', '.mkv', '.webm', '.m4v')
+
+# 분석용 프레임 최대 변 길이 (얼굴 검출도 이 크기 이하에서 함)
+FRAME_MAX_SIDE = 640
+
+
+def iter_video_paths(inputs):
+    """파일/폴더 목록에서 영상 경로 (폴더는 하위 폴더까지 이름순)"""
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, dirs, files in os.walk(item):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith(VIDEO_EXTENSIONS):
+                        yield os.path.join(root, name)
+        else:
+            yield item
+
+
+def video_output_stem(video_path):
+    """
+    영상의 리포트 파일 이름 (확장자 제외)
+
+    폴더를 하위 폴더까지 훑으면 a/clip.mp4, b/clip.mp4처럼 이름이 겹칠 수 있어서
+    파일 이름 뒤에 전체 경로의 짧은 해시를 붙입니다 (예: clip-1a2b3c4d).
+    """
+    stem = os.path.splitext(os.path.basename(video_path))[0]
+    digest = hashlib.sha1(os.path.abspath(video_path).encode('utf-8')).hexdigest()[:8]
+    return f"{stem}-{digest}"
+
+
+def sample_video_frames(video_path, fps=2.0, max_side=FRAME_MAX_SIDE):
+    """
+    영상에서 초당 fps장씩 프레임 뽑기
+
+    건너뛰는 프레임은 grab()만 하고 디코딩 결과를 꺼내지 않습니다.
+
+    Yields:
+        (timestamp_ms, frame): 영상 시작 기준 시간(ms), BGR 프레임
+    """
+    capture = cv2.VideoCapture(video_path)
+    if not capture.isOpened():
+        raise ValueError(f"영상을 열 수 없습니다: {video_path}")
+    try:
+        source_fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+        step = max(source_fps / fps, 1.0)
+        next_pick = 0.0
+        index = 0
+        while capture.grab():
+            if index >= next_pick:
+                ok, frame = capture.retrieve()
+                if not ok:
+                    break
+                height, width = frame.shape[:2]
+                scale = max_side / max(height, width)
+                if scale < 1.0:
+                    frame = cv2.resize(frame, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+                yield int(index * 1000 / source_fps), frame
+                next_pick += step
+            index += 1
+    finally:
+        capture.release()
+
+
+def save_moment_frames(video_path, moments, output_prefix):
+    """베스트 순간 프레임을 JPEG로 저장하고 각 순간의 'frame'에 경로 기록"""
+    capture = cv2.VideoCapture(video_path)
+    try:
+        for rank, moment in enumerate(moments, 1):
+            capture.set(cv2.CAP_PROP_POS_MSEC, moment['timestamp'])
+            ok, frame = capture.read()
+            if ok:
+                path = f"{output_prefix}_best{rank}.jpg"
+                cv2.imwrite(path, frame)
+                moment['frame'] = path
+    finally:
+        capture.release()
+
+
+def analyze_video(video_path, output_dir, fps=2.0, batch_size=32, save_frames=True, chart=True):
+    """
+    영상 하나 감정 분석 + 리포트 저장
+
+    Returns:
+        report: 피드백, 베스트 순간, 타임라인 등 (output_dir/<video_output_stem()>.json에도 저장)
+    """
+    started = time.perf_counter()
+    chunks = []
+    frames, timestamps = [], []
+
+    def flush():
+        # 감정 확률은 (B, 7) 배열 그대로 모아 두고 리포트도 배열로 계산
+        chunks.append(probabilities_to_percent(predict_emotions(frames)))
+        frames.clear()
+
+    for timestamp, frame in sample_video_frames(video_path, fps):
+        frames.append(frame)
+        timestamps.append(timestamp)
+        if len(frames) >= batch_size:
+            flush()
+    if frames:
+        flush()
+
+    emotions = np.concatenate(chunks) if chunks else np.empty((0, 7))
+    arrays = EmotionArrays(emotions, timestamps=np.asarray(timestamps, dtype=np.int64))
+
+    output_prefix = os.path.join(output_dir, video_output_stem(video_path))
+    best_moments = arrays.best_moments(3)
+    if save_frames and best_moments:
+        save_moment_frames(video_path, best_moments, output_prefix)
+
+    timeline = arrays.timeline()
+    report = {
+        'video': video_path,
+        'sample_fps': fps,
+        'frame_count': len(arrays),
+        'duration_ms': timestamps[-1] if timestamps else 0,
+        'feedback': arrays.feedback(),
+        'best_moments': best_moments,
+        'timeline': timeline,
+        'processing_seconds': round(time.perf_counter() - started, 2)
+    }
+    if chart and len(arrays):
+        from models.report_renderer import ReportRenderer
+        report['report_image'] = output_prefix + '_report.png'
+        ReportRenderer().render_file(timeline, report['report_image'])
+
+    with open(output_prefix + '.json', 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return report
+
+
+def _run_one(video_path, output_dir, fps, batch_size, save_frames, chart):
+    """워커에서 영상 하나 처리 (실패해도 다른 영상은 계속)"""
+    try:
+        report = analyze_video(video_path, output_dir, fps, batch_size, save_frames, chart)
+        feedback = report['feedback']
+        return {
+            'video': video_path,
+            'frames': report['frame_count'],
+            'grade': feedback.get('grade'),
+            'avg_confidence': feedback.get('avg_confidence'),
+            'seconds': report['processing_seconds'],
+            'error': None
+        }
+    except Exception as e:
+        return {'video': video_path, 'error': f"{type(e).__name__}: {e}"}
+
+
+def run_batch_emotion(video_paths, output_dir, fps=2.0, batch_size=32, workers=1,
+                      save_frames=True, chart=True, overwrite=False):
+    """
+    여러 영상을 프로세스 풀에서 분석
+
+    Returns:
+        results: 영상별 요약 리스트 (끝난 순서)
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    todo = []
+    for path in video_paths:
+        if not overwrite and os.path.exists(os.path.join(output_dir, video_output_stem(path) + '.json')):
+            print(f"건너뜀 (리포트 있음): {path}")
+            continue
+        todo.append(path)
+    if not todo:
+        return []
+
+    workers = max(1, min(workers, len(todo)))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    started = time.perf_counter()
+    results = []
+    # TensorFlow는 fork 후 사용이 안전하지 않아서 spawn으로 새 프로세스 생성 (프로세스끼리 코어를 나눠 쓰도록 스레드 수 제한)
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=limit_threads, initargs=(threads,)) as pool:
+        futures = [
+            pool.submit(_run_one, path, output_dir, fps, batch_size, save_frames, chart)
+            for path in todo
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            if result['error']:
+                print(f"실패: {result['video']} ({result['error']})")
+            else:
+                print(f"완료: {result['video']} - {result['frames']}프레임, 등급 {result['grade']}, "
+                      f"평균 자신감 {result['avg_confidence']} ({result['seconds']}초)")
+
+    elapsed = time.perf_counter() - started
+    frames = sum(r.get('frames', 0) for r in results if not r['error'])
+    print(f"영상 {len(results)}개, 프레임 {frames}장, {elapsed:.1f}초 "
+          f"({frames / elapsed if elapsed > 0 else 0:.1f} frames/s)")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='발표 연습 영상 일괄 감정 분석')
+    parser.add_argument('inputs', nargs='+', help='영상 파일 또는 폴더')
+    parser.add_argument('--output', required=True, help='리포트 저장 폴더')
+    parser.add_argument('--fps', type=float, default=2.0, help='초당 분석할 프레임 수')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 1) // 2),
+                        help='동시에 처리할 영상 수 (프로세스)')
+    parser.add_argument('--no-frames', action='store_true', help='베스트 순간 이미지 저장 안 함')
+    parser.add_argument('--no-chart', action='store_true', help='그래프 이미지 저장 안 함')
+    parser.add_argument('--overwrite', action='store_true', help='리포트가 있어도 다시 분석')
+    args = parser.parse_args()
+
+    run_batch_emotion(
+        list(iter_video_paths(args.inputs)),
+        args.output,
+        fps=args.fps,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        save_frames=not args.no_frames,
+        chart=not args.no_chart,
+        overwrite=args.overwrite
+    )
+
+
+if __name__ == '__main__':
+    main()
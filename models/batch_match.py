@@ -0,0 +1,360 @@
+# batch_match.py
+# 폴더(또는 목록 파일)의 사진들을 오프라인으로 한꺼번에 닮은꼴 매칭
+#   디코딩/전처리: 스레드 풀이 미리 잡아 둔 배치 버퍼에 바로 씀 (최대 prefetch 배치까지 앞서 준비)
+#   추론: CLIP 배치 추론 한 번 + 갤러리 행렬 곱 한 번 (검색 인덱스 query_batch)
+#   결과: JSONL 또는 Parquet (pyarrow 설치 시), 이미 처리한 사진은 재실행 시 건너뜀 (오류난 사진은 다시 시도)
+#
+#   python -m models.batch_match photos/ --output results.jsonl
+#   python -m models.batch_match --manifest list.txt --output results_parquet --format parquet
+import argparse
+import importlib.util
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from models.clip_matcher import (
+    create_similarity_index,
+    embed_pixel_values,
+    get_image_preprocessor,
+    get_personalities,
+    initialize_animal_embeddings
+)
+from models.face_crop import prepare_face_images
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+# 진행 상황 출력 간격 (초)
+REPORT_INTERVAL = 10
+
+
+def iter_input_paths(input_dir=None, manifest=None):
+    """
+    처리할 이미지 경로 (폴더는 하위 폴더까지 이름순, 목록 파일은 파일 순서)
+
+    목록 파일은 한 줄에 경로 하나, 또는 {"path": ...} JSON 한 줄씩.
+    """
+    if manifest:
+        with open(manifest, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                yield json.loads(line)['path'] if line.startswith('{') else line
+        return
+    for root, dirs, files in os.walk(input_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                yield os.path.join(root, name)
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class JsonlResultWriter:
+    """
+    결과를 JSONL 한 줄씩 추가 (파일 자체가 체크포인트)
+
+    배치마다 flush + fsync 해서 중간에 멈춰도 쓴 줄까지는 남고,
+    마지막 줄이 잘려 있으면 다시 시작할 때 잘라냅니다.
+    오류난 사진은 다시 시도해서 줄을 새로 추가하므로, 같은 경로는 마지막 줄이 최신 결과입니다.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file = None
+
+    def done_paths(self):
+        """이미 결과가 있는 경로 (오류난 사진은 빼서 다시 시도)"""
+        done = set()
+        if not os.path.exists(self.path):
+            return done
+        valid_bytes = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                    path = row['path']
+                except (ValueError, KeyError):
+                    break
+                if row.get('error') is None:
+                    done.add(path)
+                else:
+                    done.discard(path)
+                valid_bytes += len(line)
+        if valid_bytes < os.path.getsize(self.path):
+            with open(self.path, 'r+b') as f:
+                f.truncate(valid_bytes)
+        return done
+
+    def write(self, rows):
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+        for row in rows:
+            self._file.write(json.dumps(row, ensure_ascii=False) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class ParquetResultWriter:
+    """
+    결과를 Parquet 파일 여러 개(part-00000.parquet ...)로 나눠서 저장
+
+    rows_per_part개가 모일 때마다 파트 하나를 임시 파일로 쓴 뒤 이름을 바꾸므로
+    완성된 파트만 남고, 다시 시작하면 기존 파트의 path/error 열로 처리한 사진을 확인합니다.
+    (오류난 사진은 다시 시도해서 뒤 파트에 새 행이 생기므로, 같은 경로는 마지막 행이 최신 결과)
+    """
+
+    def __init__(self, output_dir, rows_per_part=4096):
+        if importlib.util.find_spec('pyarrow') is None:
+            raise RuntimeError("Parquet 출력에는 pyarrow가 필요합니다 (pip install pyarrow)")
+        self.output_dir = output_dir
+        self.rows_per_part = rows_per_part
+        os.makedirs(output_dir, exist_ok=True)
+        self._rows = []
+        self._next_part = len(self._parts())
+
+    def _parts(self):
+        return sorted(
+            name for name in os.listdir(self.output_dir)
+            if name.startswith('part-') and name.endswith('.parquet')
+        )
+
+    def done_paths(self):
+        """이미 결과가 있는 경로 (오류난 사진은 빼서 다시 시도)"""
+        import pyarrow.parquet as pq
+
+        done = set()
+        for name in self._parts():
+            table = pq.read_table(os.path.join(self.output_dir, name), columns=['path', 'error'])
+            for path, error in zip(table.column('path').to_pylist(), table.column('error').to_pylist()):
+                if error is None:
+                    done.add(path)
+                else:
+                    done.discard(path)
+        return done
+
+    def _flush(self):
+        if not self._rows:
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        # 파트마다 타입이 달라지지 않도록 스키마 고정 (예: face_box가 전부 None인 파트)
+        schema = pa.schema([
+            ('path', pa.string()),
+            ('error', pa.string()),
+            ('face_box', pa.list_(pa.int32())),
+            ('names', pa.list_(pa.string())),
+            ('similarities', pa.list_(pa.float64())),
+            ('categories', pa.list_(pa.string())),
+            ('main_trait', pa.string())
+        ])
+        columns = {name: [row[name] for row in self._rows] for name in schema.names}
+        path = os.path.join(self.output_dir, f'part-{self._next_part:05d}.parquet')
+        pq.write_table(pa.table(columns, schema=schema), path + '.tmp')
+        os.replace(path + '.tmp', path)
+        self._next_part += 1
+        self._rows = []
+
+    def write(self, rows):
+        self._rows.extend(rows)
+        if len(self._rows) >= self.rows_per_part:
+            self._flush()
+
+    def close(self):
+        self._flush()
+
+
+def create_writer(output, fmt=None):
+    """출력 형식에 맞는 writer (fmt가 없으면 .jsonl이면 JSONL, 아니면 Parquet 폴더)"""
+    if fmt is None:
+        fmt = 'jsonl' if output.endswith('.jsonl') else 'parquet'
+    if fmt == 'jsonl':
+        return JsonlResultWriter(output)
+    if fmt == 'parquet':
+        return ParquetResultWriter(output)
+    raise ValueError(f"알 수 없는 출력 형식: {fmt}")
+
+
+def run_batch_match(paths, writer, batch_size=32, workers=None, prefetch=4, top_k=3,
+                    face_crop=False, personality=True):
+    """
+    이미지 경로들을 배치로 매칭해서 writer에 기록
+
+    Args:
+        paths: 이미지 경로 iterable
+        writer: JsonlResultWriter / ParquetResultWriter
+        batch_size: CLIP 배치 크기
+        workers: 디코딩/전처리 스레드 수 (기본: CPU 코어 수)
+        prefetch: 추론보다 앞서 준비해 둘 최대 배치 수
+        top_k: 사진마다 저장할 닮은꼴 개수
+        face_crop: 가장 큰 얼굴만 잘라서 매칭
+        personality: 성격 분석 결과도 저장
+
+    Returns:
+        summary: 처리/오류/건너뜀 개수, 걸린 시간, images/sec
+    """
+    preprocessor = get_image_preprocessor()
+    index = create_similarity_index(initialize_animal_embeddings())
+    if len(index) == 0:
+        raise RuntimeError("동물 데이터베이스가 비어있습니다")
+
+    done = writer.done_paths()
+    skipped = 0
+
+    def pending_paths():
+        nonlocal skipped
+        for path in paths:
+            if path in done:
+                skipped += 1
+            else:
+                yield path
+
+    workers = workers or os.cpu_count() or 1
+    prefetch = max(1, prefetch)
+    size = preprocessor.crop_size
+    buffers = [np.empty((batch_size, 3, size, size), dtype=np.float32) for _ in range(prefetch)]
+
+    def load_one(path, out):
+        """이미지 하나를 배치 버퍼의 한 칸에 전처리 (오류는 문자열로 반환)"""
+        try:
+            face_box = None
+            image = path
+            if face_crop:
+                images, faces = prepare_face_images(path, 1, save=False)
+                image = images[0]
+                face_box = faces[0]['box'] if faces else None
+            preprocessor([image], out=out)
+            return face_box, None
+        except Exception as e:
+            return None, f"{type(e).__name__}: {e}"
+
+    stats = {'processed': 0, 'errors': 0}
+    started = time.perf_counter()
+    last_report = started
+
+    def finish(batch_paths, buffer, futures):
+        nonlocal last_report
+        loaded = [future.result() for future in futures]
+        valid = [i for i, (_, error) in enumerate(loaded) if error is None]
+        rows = []
+        if valid:
+            pixel_values = buffer[:len(batch_paths)] if len(valid) == len(batch_paths) else buffer[valid]
+            embeddings = embed_pixel_values(pixel_values)
+            matches = index.query_batch(embeddings, k=top_k)
+            traits = get_personalities(embeddings) if personality else [None] * len(valid)
+            results = dict(zip(valid, zip(matches, traits)))
+        for i, path in enumerate(batch_paths):
+            face_box, error = loaded[i]
+            row = {
+                'path': path,
+                'error': error,
+                'face_box': face_box,
+                'names': [],
+                'similarities': [],
+                'categories': [],
+                'main_trait': None
+            }
+            if error is None:
+                match, trait = results[i]
+                row['names'] = [m['name'] for m in match]
+                row['similarities'] = [round(m['similarity'], 4) for m in match]
+                row['categories'] = [m['category'] for m in match]
+                row['main_trait'] = trait['main_trait'] if trait else None
+            else:
+                stats['errors'] += 1
+            rows.append(row)
+        writer.write(rows)
+        stats['processed'] += len(batch_paths)
+
+        now = time.perf_counter()
+        if now - last_report >= REPORT_INTERVAL:
+            last_report = now
+            print(f"{stats['processed']}장 처리 ({stats['processed'] / (now - started):.1f} images/s, "
+                  f"오류 {stats['errors']})")
+
+    pending = deque()
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='batch-match') as pool:
+            for n, batch_paths in enumerate(_chunks(pending_paths(), batch_size)):
+                # 준비 중인 배치가 prefetch개 차면 가장 오래된 배치부터 추론
+                while len(pending) >= prefetch:
+                    finish(*pending.popleft())
+                buffer = buffers[n % prefetch]
+                futures = [
+                    pool.submit(load_one, path, buffer[i:i + 1])
+                    for i, path in enumerate(batch_paths)
+                ]
+                pending.append((batch_paths, buffer, futures))
+            while pending:
+                finish(*pending.popleft())
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - started
+    return {
+        'processed': stats['processed'],
+        'errors': stats['errors'],
+        'skipped': skipped,
+        'seconds': round(elapsed, 2),
+        'images_per_sec': round(stats['processed'] / elapsed, 2) if elapsed > 0 else 0.0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='사진 폴더 일괄 닮은꼴 매칭')
+    parser.add_argument('input_dir', nargs='?', help='이미지 폴더 (하위 폴더 포함)')
+    parser.add_argument('--manifest', help='이미지 경로 목록 파일 (한 줄에 하나 또는 {"path": ...})')
+    parser.add_argument('--output', required=True, help='.jsonl 파일 또는 Parquet 출력 폴더')
+    parser.add_argument('--format', choices=('jsonl', 'parquet'))
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='디코딩/전처리 스레드 수')
+    parser.add_argument('--prefetch', type=int, default=4, help='미리 준비할 최대 배치 수')
+    parser.add_argument('--top-k', type=int, default=3)
+    parser.add_argument('--face-crop', action='store_true', help='가장 큰 얼굴만 잘라서 매칭')
+    parser.add_argument('--no-personality', action='store_true', help='성격 분석 생략')
+    parser.add_argument('--torch-threads', type=int, help='PyTorch 추론 스레드 수')
+    args = parser.parse_args()
+    if not args.input_dir and not args.manifest:
+        parser.error('input_dir 또는 --manifest가 필요합니다')
+
+    if args.torch_threads:
+        import torch
+        torch.set_num_threads(args.torch_threads)
+
+    summary = run_batch_match(
+        iter_input_paths(args.input_dir, args.manifest),
+        create_writer(args.output, args.format),
+        batch_size=args.batch_size,
+        workers=args.workers,
+        prefetch=args.prefetch,
+        top_k=args.top_k,
+        face_crop=args.face_crop,
+        personality=not args.no_personality
+    )
+    print(f"완료: {summary['processed']}장 처리, 오류 {summary['errors']}, 건너뜀 {summary['skipped']}, "
+          f"{summary['seconds']}초 ({summary['images_per_sec']} images/s)")
+
+
+if __name__ == '__main__':
+    main()
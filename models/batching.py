@@ -0,0 +1,135 @@
+# batching.py
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """
+    마이크로 배치 추론 큐
+
+    여러 요청 스레드가 submit()으로 넣은 입력을 백그라운드 스레드가
+    최대 max_wait_ms 동안 (또는 max_batch_size개가 찰 때까지) 모았다가
+    batch_fn 한 번으로 처리하고, 각 요청의 Future에 결과를 돌려줍니다.
+
+    Args:
+        batch_fn: 입력 리스트 -> 같은 길이의 결과 리스트
+        max_batch_size: 한 번에 처리할 최대 개수
+        max_wait_ms: 첫 입력이 들어온 뒤 더 기다리는 최대 시간
+        name: 스레드/로그 이름
+        concurrency: 동시에 처리할 수 있는 배치 수 (batch_fn이 다른 프로세스에 일을 넘기는 경우,
+                     배치를 모으는 것은 한 번에 한 스레드만 해서 배치 크기는 줄지 않음)
+    """
+
+    def __init__(self, batch_fn, max_batch_size=16, max_wait_ms=10, name='batcher', concurrency=1):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self._queue = queue.Queue()
+        self._threads = None
+        self._start_lock = threading.Lock()
+        self._collect_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'batches': 0,
+            'items': 0,
+            'errors': 0,
+            'max_batch_size': 0,
+            'total_queue_wait': 0.0,
+            'max_queue_wait': 0.0,
+            'total_batch_time': 0.0,
+        }
+
+    def _ensure_started(self):
+        if self._threads is not None:
+            return
+        with self._start_lock:
+            if self._threads is None:
+                names = [self.name] if self.concurrency == 1 else [
+                    f"{self.name}-{i}" for i in range(self.concurrency)
+                ]
+                threads = [threading.Thread(target=self._run, name=name, daemon=True) for name in names]
+                for thread in threads:
+                    thread.start()
+                self._threads = threads
+
+    def submit(self, item):
+        """입력 하나를 큐에 넣고 Future 반환"""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    def run(self, item, timeout=None):
+        """submit() 후 결과를 기다려서 반환"""
+        return self.submit(item).result(timeout=timeout)
+
+    def _collect(self):
+        """첫 입력을 기다린 뒤, 시간 창 안에 들어온 입력을 최대 개수까지 모으기"""
+        batch = [self._queue.get()]
+        deadline = batch[0][2] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            with self._collect_lock:
+                batch = self._collect()
+            started = time.perf_counter()
+            items = [item for item, _, _ in batch]
+            futures = [future for _, future, _ in batch]
+            try:
+                results = self.batch_fn(items)
+                if len(results) != len(items):
+                    raise RuntimeError(f"{self.name}: 배치 결과 개수가 입력과 다릅니다")
+                for future, result in zip(futures, results):
+                    future.set_result(result)
+                failed = False
+            except Exception as e:
+                print(f"{self.name} 배치 처리 오류: {e}")
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+                failed = True
+            self._record(batch, started, failed)
+
+    def _record(self, batch, started, failed):
+        now = time.perf_counter()
+        waits = [started - enqueued for _, _, enqueued in batch]
+        with self._stats_lock:
+            s = self._stats
+            s['batches'] += 1
+            s['items'] += len(batch)
+            s['errors'] += int(failed)
+            s['max_batch_size'] = max(s['max_batch_size'], len(batch))
+            s['total_queue_wait'] += sum(waits)
+            s['max_queue_wait'] = max(s['max_queue_wait'], max(waits))
+            s['total_batch_time'] += now - started
+
+    def stats(self):
+        """배치 크기/대기 시간 통계"""
+        with self._stats_lock:
+            s = dict(self._stats)
+        batches = s['batches'] or 1
+        items = s['items'] or 1
+        return {
+            'batches': s['batches'],
+            'items': s['items'],
+            'errors': s['errors'],
+            'queue_depth': self._queue.qsize(),
+            'avg_batch_size': round(s['items'] / batches, 2),
+            'max_batch_size': s['max_batch_size'],
+            'avg_queue_wait_ms': round(s['total_queue_wait'] / items * 1000, 2),
+            'max_queue_wait_ms': round(s['max_queue_wait'] * 1000, 2),
+            'avg_batch_time_ms': round(s['total_batch_time'] / batches * 1000, 2),
+        }
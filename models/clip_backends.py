@@ -0,0 +1,331 @@
+# clip_backends.py
+# CLIP 추론 백엔드
+#   torch       : transformers CLIPModel (fp32, 기존 방식)
+#   torch-int8  : Linear 레이어를 동적 int8 양자화한 PyTorch 모델
+#   onnx        : 로컬에 export한 ONNX 모델을 ONNX Runtime으로 실행
+# 모든 백엔드는 전처리된 numpy 입력을 받아 정규화 전 임베딩(numpy)을 돌려줍니다.
+#
+#   python -m models.clip_backends export            # ONNX 모델 export
+#   python -m models.clip_backends parity torch-int8 # fp32 대비 코사인 차이 확인
+import argparse
+import contextlib
+import glob
+import os
+import uuid
+
+import numpy as np
+
+DEFAULT_ONNX_DIR = 'cache/onnx'
+DEFAULT_WEIGHTS_DIR = 'cache/weights'
+BACKENDS = ('torch', 'torch-int8', 'onnx')
+
+
+def backend_cache_id(name, model_id):
+    """임베딩 캐시 구분용 id (백엔드마다 임베딩 값이 조금씩 다르므로 따로 저장)"""
+    return model_id if name == 'torch' else f"{model_id}+{name}"
+
+
+def shared_weights_path(model_id, weights_dir=DEFAULT_WEIGHTS_DIR):
+    """모델 id별 공유 가중치 파일 (torch.save 형식)"""
+    safe = ''.join(c if c.isalnum() or c in '-_.' else '_' for c in model_id)
+    return os.path.join(weights_dir, safe + '.pt')
+
+
+def _no_init_weights():
+    """모델 뼈대를 만들 때 가중치 무작위 초기화 생략 (곧 덮어쓰므로)"""
+    try:
+        from transformers.modeling_utils import no_init_weights
+        return no_init_weights()
+    except ImportError:
+        return contextlib.nullcontext()
+
+
+def load_mmap_clip_model(model_id, weights_dir=DEFAULT_WEIGHTS_DIR):
+    """
+    가중치를 메모리 맵 파일에서 바로 쓰는 CLIPModel
+
+    처음 한 번 state_dict를 weights_dir에 저장해 두고, 이후에는 torch.load(mmap=True)로 열어서
+    load_state_dict(assign=True)로 파라미터를 파일 매핑 그대로 연결합니다.
+    추론 중에는 가중치를 쓰지 않으므로 같은 파일을 여는 워커 프로세스들이 OS 페이지 캐시의
+    한 벌을 같이 씁니다 (프로세스마다 가중치 복사본이 생기지 않음).
+    """
+    import torch
+    from transformers import CLIPConfig, CLIPModel
+
+    path = shared_weights_path(model_id, weights_dir)
+    if not os.path.exists(path):
+        os.makedirs(weights_dir, exist_ok=True)
+        state_dict = CLIPModel.from_pretrained(model_id).state_dict()
+        tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        torch.save(state_dict, tmp_path)
+        os.replace(tmp_path, path)
+        del state_dict
+
+    with _no_init_weights():
+        model = CLIPModel(CLIPConfig.from_pretrained(model_id))
+    state_dict = torch.load(path, map_location='cpu', mmap=True, weights_only=True)
+    model.load_state_dict(state_dict, assign=True)
+    return model.eval()
+
+
+class TorchClipBackend:
+    """
+    transformers CLIPModel fp32
+
+    mmap_weights=True면 가중치를 공유 메모리 맵 파일에서 씁니다 (load_mmap_clip_model).
+    """
+
+    name = 'torch'
+
+    def __init__(self, model_id, mmap_weights=False, weights_dir=DEFAULT_WEIGHTS_DIR):
+        import torch
+        from transformers import CLIPModel
+        self.model_id = model_id
+        if mmap_weights:
+            self.model = load_mmap_clip_model(model_id, weights_dir)
+        else:
+            self.model = CLIPModel.from_pretrained(model_id).eval()
+        self._torch = torch
+
+    @property
+    def cache_id(self):
+        return backend_cache_id(self.name, self.model_id)
+
+    def encode_images(self, pixel_values):
+        """(N, 3, 224, 224) float32 -> (N, D) 임베딩"""
+        torch = self._torch
+        with torch.no_grad():
+            features = self.model.get_image_features(pixel_values=torch.from_numpy(pixel_values))
+        return features.cpu().numpy()
+
+    def encode_texts(self, input_ids, attention_mask):
+        """토큰 id/마스크 (N, L) int64 -> (N, D) 임베딩"""
+        torch = self._torch
+        with torch.no_grad():
+            features = self.model.get_text_features(
+                input_ids=torch.from_numpy(input_ids),
+                attention_mask=torch.from_numpy(attention_mask)
+            )
+        return features.cpu().numpy()
+
+
+class QuantizedTorchClipBackend(TorchClipBackend):
+    """
+    Linear 레이어를 동적 int8 양자화한 CLIPModel (CPU 전용)
+
+    양자화된 가중치는 프로세스마다 새로 만들어지므로 메모리 맵 공유는 지원하지 않습니다.
+    """
+
+    name = 'torch-int8'
+
+    def __init__(self, model_id):
+        super().__init__(model_id)
+        torch = self._torch
+        self.model = torch.ao.quantization.quantize_dynamic(
+            self.model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+
+
+class OnnxClipBackend:
+    """export_onnx()로 만든 vision/text ONNX 모델을 ONNX Runtime으로 실행"""
+
+    name = 'onnx'
+
+    def __init__(self, model_id, onnx_dir=DEFAULT_ONNX_DIR):
+        import onnxruntime as ort
+        self.model_id = model_id
+        model_dir = onnx_model_dir(model_id, onnx_dir)
+        vision_path = os.path.join(model_dir, 'vision.onnx')
+        text_path = os.path.join(model_dir, 'text.onnx')
+        if not (os.path.exists(vision_path) and os.path.exists(text_path)):
+            raise FileNotFoundError(
+                f"ONNX 모델이 없습니다: {model_dir} "
+                f"(python -m models.clip_backends export 로 먼저 만들어 주세요)"
+            )
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        providers = ['CPUExecutionProvider']
+        self.vision = ort.InferenceSession(vision_path, options, providers=providers)
+        self.text = ort.InferenceSession(text_path, options, providers=providers)
+
+    @property
+    def cache_id(self):
+        return backend_cache_id(self.name, self.model_id)
+
+    def encode_images(self, pixel_values):
+        """(N, 3, 224, 224) float32 -> (N, D) 임베딩"""
+        return self.vision.run(None, {'pixel_values': pixel_values.astype(np.float32, copy=False)})[0]
+
+    def encode_texts(self, input_ids, attention_mask):
+        """토큰 id/마스크 (N, L) int64 -> (N, D) 임베딩"""
+        return self.text.run(None, {
+            'input_ids': input_ids.astype(np.int64, copy=False),
+            'attention_mask': attention_mask.astype(np.int64, copy=False)
+        })[0]
+
+
+def onnx_model_dir(model_id, onnx_dir=DEFAULT_ONNX_DIR):
+    """모델 id별 ONNX 파일 폴더"""
+    safe = ''.join(c if c.isalnum() or c in '-_.' else '_' for c in model_id)
+    return os.path.join(onnx_dir, safe)
+
+
+def create_backend(name, model_id, onnx_dir=DEFAULT_ONNX_DIR, mmap_weights=False, weights_dir=DEFAULT_WEIGHTS_DIR):
+    """
+    설정 이름으로 백엔드 생성
+
+    Args:
+        name: 'torch', 'torch-int8', 'onnx'
+        model_id: transformers 모델 id 또는 로컬 경로
+        onnx_dir: ONNX 모델 폴더 (onnx 백엔드만 사용)
+        mmap_weights: 가중치를 메모리 맵 파일로 워커끼리 공유 (torch 백엔드만 사용)
+        weights_dir: 공유 가중치 파일 폴더
+    """
+    if name == 'torch':
+        return TorchClipBackend(model_id, mmap_weights=mmap_weights, weights_dir=weights_dir)
+    if name == 'torch-int8':
+        return QuantizedTorchClipBackend(model_id)
+    if name == 'onnx':
+        return OnnxClipBackend(model_id, onnx_dir)
+    raise ValueError(f"알 수 없는 CLIP 백엔드: {name} (가능: {', '.join(BACKENDS)})")
+
+
+def export_onnx(model_id, onnx_dir=DEFAULT_ONNX_DIR, opset=14):
+    """
+    CLIP 이미지/텍스트 인코더를 ONNX로 export
+
+    Returns:
+        model_dir: ONNX 파일이 저장된 폴더
+    """
+    import torch
+    from transformers import CLIPModel
+
+    model = CLIPModel.from_pretrained(model_id).eval()
+
+    class ImageEncoder(torch.nn.Module):
+        def __init__(self, clip):
+            super().__init__()
+            self.clip = clip
+
+        def forward(self, pixel_values):
+            return self.clip.get_image_features(pixel_values=pixel_values)
+
+    class TextEncoder(torch.nn.Module):
+        def __init__(self, clip):
+            super().__init__()
+            self.clip = clip
+
+        def forward(self, input_ids, attention_mask):
+            return self.clip.get_text_features(input_ids=input_ids, attention_mask=attention_mask)
+
+    model_dir = onnx_model_dir(model_id, onnx_dir)
+    os.makedirs(model_dir, exist_ok=True)
+    image_size = model.config.vision_config.image_size
+
+    with torch.no_grad():
+        torch.onnx.export(
+            ImageEncoder(model),
+            (torch.zeros(1, 3, image_size, image_size),),
+            os.path.join(model_dir, 'vision.onnx'),
+            input_names=['pixel_values'],
+            output_names=['embeddings'],
+            dynamic_axes={'pixel_values': {0: 'batch'}, 'embeddings': {0: 'batch'}},
+            opset_version=opset
+        )
+        dummy_ids = torch.ones(1, 8, dtype=torch.int64)
+        torch.onnx.export(
+            TextEncoder(model),
+            (dummy_ids, torch.ones_like(dummy_ids)),
+            os.path.join(model_dir, 'text.onnx'),
+            input_names=['input_ids', 'attention_mask'],
+            output_names=['embeddings'],
+            dynamic_axes={
+                'input_ids': {0: 'batch', 1: 'sequence'},
+                'attention_mask': {0: 'batch', 1: 'sequence'},
+                'embeddings': {0: 'batch'}
+            },
+            opset_version=opset
+        )
+    print(f"ONNX export 완료: {model_dir}")
+    return model_dir
+
+
+def _normalize(matrix):
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+def parity_check(name, model_id, image_dir='static/animals', onnx_dir=DEFAULT_ONNX_DIR,
+                 texts=None, batch_size=16):
+    """
+    fp32 PyTorch 기준 대비 백엔드 임베딩의 코사인 차이 확인
+
+    Args:
+        name: 비교할 백엔드 이름
+        model_id: 모델 id
+        image_dir: 비교에 쓸 이미지 폴더 (기본: 동봉된 동물 이미지)
+        texts: 비교에 쓸 텍스트 리스트 (기본: 성격 키워드)
+
+    Returns:
+        report: 이미지/텍스트별 평균·최소 코사인 유사도와 최대 drift(1 - 최소 코사인)
+    """
+    from PIL import Image
+    from transformers import CLIPProcessor
+
+    processor = CLIPProcessor.from_pretrained(model_id)
+    baseline = TorchClipBackend(model_id)
+    candidate = create_backend(name, model_id, onnx_dir)
+
+    paths = sorted(glob.glob(os.path.join(image_dir, '*.jpg')) + glob.glob(os.path.join(image_dir, '*.png')))
+    image_cos = []
+    for start in range(0, len(paths), batch_size):
+        images = [Image.open(p).convert('RGB') for p in paths[start:start + batch_size]]
+        pixel_values = processor(images=images, return_tensors='np')['pixel_values'].astype(np.float32)
+        a = _normalize(baseline.encode_images(pixel_values))
+        b = _normalize(candidate.encode_images(pixel_values))
+        image_cos.extend(np.sum(a * b, axis=1).tolist())
+
+    if texts is None:
+        from models.clip_matcher import PERSONALITY_KEYWORDS
+        texts = PERSONALITY_KEYWORDS
+    tokens = processor(text=list(texts), return_tensors='np', padding=True)
+    a = _normalize(baseline.encode_texts(tokens['input_ids'], tokens['attention_mask']))
+    b = _normalize(candidate.encode_texts(tokens['input_ids'], tokens['attention_mask']))
+    text_cos = np.sum(a * b, axis=1).tolist()
+
+    def summary(values):
+        if not values:
+            return {'count': 0}
+        return {
+            'count': len(values),
+            'mean_cosine': round(float(np.mean(values)), 6),
+            'min_cosine': round(float(np.min(values)), 6),
+            'max_drift': round(float(1 - np.min(values)), 6)
+        }
+
+    return {'backend': name, 'images': summary(image_cos), 'texts': summary(text_cos)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='CLIP 백엔드 도구')
+    parser.add_argument('--model-id', default='openai/clip-vit-base-patch32')
+    parser.add_argument('--onnx-dir', default=DEFAULT_ONNX_DIR)
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('export', help='ONNX 모델 export')
+    parity = sub.add_parser('parity', help='fp32 대비 임베딩 차이 확인')
+    parity.add_argument('backend', choices=BACKENDS)
+    parity.add_argument('--image-dir', default='static/animals')
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        export_onnx(args.model_id, args.onnx_dir)
+    else:
+        report = parity_check(args.backend, args.model_id, args.image_dir, args.onnx_dir)
+        for kind in ('images', 'texts'):
+            r = report[kind]
+            if r['count']:
+                print(f"[{args.backend}] {kind}: {r['count']}개, 평균 코사인 {r['mean_cosine']:.6f}, "
+                      f"최소 {r['min_cosine']:.6f}, 최대 drift {r['max_drift']:.6f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,403 +1,642 @@
 # clip_matcher.py
-import torch
+# torch/transformers는 무거워서 실제로 모델이 필요할 때 import 합니다
 from PIL import Image
-from transformers import CLIPProcessor, CLIPModel
 import numpy as np
-from scipy.spatial.distance import cosine
+import hashlib
+import json
 import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from models.batching import MicroBatcher
+from models.clip_backends import backend_cache_id, create_backend
+from models.embedding_store import EmbeddingStore, image_key, text_key
+from models.gallery import GALLERY_MANIFEST, file_signature, gallery_image_paths, load_gallery_manifest
+from models.ann_index import AnnSimilarityIndex
+from models.image_preprocess import ClipImagePreprocessor
+from models.similarity_index import (
+    PrototypeIndex,
+    SimilarityIndex,
+    load_index_snapshot,
+    save_index_snapshot
+)
+
+CLIP_MODEL_ID = "openai/clip-vit-base-patch32"
+
+# CLIP 추론 백엔드: 'torch'(fp32), 'torch-int8'(동적 양자화), 'onnx'(ONNX Runtime)
+CLIP_BACKEND = os.environ.get('IMAGO_CLIP_BACKEND', 'torch')
+CLIP_ONNX_DIR = 'cache/onnx'
+
+# torch 백엔드 가중치를 메모리 맵 파일에서 읽어서 워커 프로세스끼리 한 벌만 쓰기 (IMAGO_CLIP_MMAP=0이면 끔)
+CLIP_MMAP_WEIGHTS = os.environ.get('IMAGO_CLIP_MMAP', '1') != '0'
+CLIP_WEIGHTS_DIR = 'cache/weights'
+
+# True면 CLIPProcessor 대신 빠른 전처리(축소 디코딩 + numpy 정규화) 사용
+FAST_PREPROCESS = True
+
+# 임베딩 디스크 캐시 위치 (모델 id별 하위 폴더에 저장)
+EMBEDDING_STORE_DIR = 'cache/embeddings'
+
+# 갤러리 검색 인덱스: 'mean'(동물별 평균 임베딩), 'prototype'(참고 이미지마다 한 행, 동물별 집계),
+#                    'ann'(평균 임베딩 + 근사 최근접 이웃 인덱스, 큰 갤러리용)
+GALLERY_INDEX_MODE = os.environ.get('IMAGO_GALLERY_INDEX', 'mean')
+# prototype 모드 집계: 'max', 'softmax', 'topm'
+PROTOTYPE_AGGREGATION = os.environ.get('IMAGO_PROTOTYPE_AGGREGATION', 'max')
+PROTOTYPE_TEMPERATURE = 0.05
+PROTOTYPE_TOP_M = 2
+# ann 모드 백엔드: 'ivf'(numpy), 'faiss', 'hnswlib' - 인덱스는 임베딩 캐시 폴더의 ann/ 아래에 저장
+ANN_BACKEND = os.environ.get('IMAGO_ANN_BACKEND', 'ivf')
+
+# 마이크로 배치 설정: 동시에 들어온 업로드를 잠깐 모아서 한 번에 추론
+IMAGE_BATCH_ENABLED = True
+IMAGE_BATCH_MAX_SIZE = 16
+IMAGE_BATCH_WINDOW_MS = 10
+IMAGE_BATCH_TIMEOUT = 30  # 초
 
 # CLIP 모델 로드
 model = None
 processor = None
+image_preprocessor = None
+embedding_store = None
+personality_embeddings_cache = None
+image_batcher = None
+_model_lock = threading.Lock()
+
+
+def get_clip_processor():
+    """
+    CLIPProcessor + 빠른 전처리기 싱글톤
+
+    모델 가중치는 로드하지 않으므로, 추론 풀을 쓰는 웹 프로세스는 전처리만 하고 모델은 워커에만 둡니다.
+    """
+    global processor, image_preprocessor
+    if processor is None:
+        with _model_lock:
+            if processor is None:
+                import torch  # noqa: F401  (transformers보다 먼저, 한 스레드에서만 import)
+                from transformers import CLIPProcessor
+                loaded = CLIPProcessor.from_pretrained(CLIP_MODEL_ID)
+                image_preprocessor = ClipImagePreprocessor.from_processor(loaded)
+                processor = loaded
+    return processor
+
 
 # ver1
 def get_clip_model():
-    """CLIP 모델 싱글톤"""
-    global model, processor
+    """CLIP 모델(추론 백엔드) + 전처리기 싱글톤"""
+    global model
     if model is None:
-        print("CLIP 모델 로딩 중...")
-        model = CLIPModel.from_pretrained("openai/clip-vit-base-patch32")
-        processor = CLIPProcessor.from_pretrained("openai/clip-vit-base-patch32")
-        print("CLIP 모델 로드 완료!")
+        get_clip_processor()
+        with _model_lock:
+            if model is None:
+                print(f"CLIP 모델 로딩 중... (백엔드: {CLIP_BACKEND})")
+                model = create_backend(
+                    CLIP_BACKEND, CLIP_MODEL_ID, onnx_dir=CLIP_ONNX_DIR,
+                    mmap_weights=CLIP_MMAP_WEIGHTS, weights_dir=CLIP_WEIGHTS_DIR
+                )
+                print("CLIP 모델 로드 완료!")
     return model, processor
 
 
+def get_embedding_version():
+    """임베딩을 만드는 모델/백엔드 식별자"""
+    return backend_cache_id(CLIP_BACKEND, CLIP_MODEL_ID)
+
+
+def get_embedding_store():
+    """임베딩 디스크 캐시 싱글톤 (모델/백엔드별로 따로 저장)"""
+    global embedding_store
+    if embedding_store is None:
+        with _model_lock:
+            if embedding_store is None:
+                embedding_store = EmbeddingStore(EMBEDDING_STORE_DIR, get_embedding_version())
+    return embedding_store
+
+
+def _load_image(image):
+    """경로 또는 PIL 이미지를 RGB PIL 이미지로"""
+    if isinstance(image, Image.Image):
+        return image.convert('RGB')
+    return Image.open(image).convert('RGB')
+
+
+def preprocess_images(images):
+    """
+    이미지들을 CLIP 입력 텐서로 변환
+
+    Args:
+        images: 이미지 경로 또는 PIL 이미지 리스트
+
+    Returns:
+        pixel_values: (N, 3, 224, 224) float32 배열
+    """
+    processor = get_clip_processor()
+    if FAST_PREPROCESS:
+        return image_preprocessor(images)
+    inputs = processor(images=[_load_image(image) for image in images], return_tensors="np")
+    return inputs['pixel_values'].astype(np.float32, copy=False)
+
+
+def get_image_preprocessor():
+    """CLIP 입력 전처리기 (모델의 전처리 설정 사용)"""
+    get_clip_processor()
+    return image_preprocessor
+
+
+def embed_pixel_values(pixel_values):
+    """전처리된 입력을 한 번의 forward로 정규화된 임베딩 행렬로 변환"""
+    model, _ = get_clip_model()
+    embeddings = model.encode_images(pixel_values)
+    embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings
+
+
+def get_image_embeddings(images):
+    """
+    여러 이미지를 한 번의 CLIP 호출로 임베딩
+
+    Args:
+        images: 이미지 경로 또는 PIL 이미지 리스트
+
+    Returns:
+        embeddings: (N, D) 정규화된 임베딩 행렬
+    """
+    return embed_pixel_values(preprocess_images(images))
+
+
+def _run_image_batch(pixel_batches):
+    """마이크로 배치 큐의 처리 함수: 요청별 입력을 합쳐서 한 번에 추론"""
+    embeddings = embed_pixel_values(np.concatenate(pixel_batches, axis=0))
+    results, offset = [], 0
+    for pixel_values in pixel_batches:
+        count = pixel_values.shape[0]
+        results.append(embeddings[offset:offset + count])
+        offset += count
+    return results
+
+
+def get_image_batcher():
+    """CLIP 이미지 임베딩 마이크로 배치 큐 싱글톤"""
+    global image_batcher
+    if image_batcher is None:
+        with _model_lock:
+            if image_batcher is None:
+                image_batcher = MicroBatcher(
+                    _run_image_batch,
+                    max_batch_size=IMAGE_BATCH_MAX_SIZE,
+                    max_wait_ms=IMAGE_BATCH_WINDOW_MS,
+                    name='clip-image-batcher'
+                )
+    return image_batcher
+
+
+def embed_images_batched(images):
+    """
+    한 요청의 이미지들을 임베딩 (여러 장이어도 한 번의 배치 추론)
+
+    전처리는 요청 스레드에서 하고, 모델 추론은 마이크로 배치 큐에서
+    다른 요청들과 묶어서 실행합니다.
+
+    Args:
+        images: 이미지 경로 또는 PIL 이미지 리스트
+
+    Returns:
+        embeddings: (N, D) 정규화된 임베딩 행렬
+    """
+    pixel_values = preprocess_images(images)
+    if IMAGE_BATCH_ENABLED:
+        return get_image_batcher().run(pixel_values, timeout=IMAGE_BATCH_TIMEOUT)
+    return embed_pixel_values(pixel_values)
+
+
 def get_image_embedding(image_path):
     """
     이미지를 CLIP 임베딩으로 변환
     """
-    model, processor = get_clip_model()
-    image = Image.open(image_path).convert('RGB')
-    inputs = processor(images=image, return_tensors="pt")
-    with torch.no_grad():
-        image_features = model.get_image_features(**inputs)
-    embedding = image_features.cpu().numpy()[0]
-    embedding = embedding / np.linalg.norm(embedding)
-    return embedding
+    return embed_images_batched([image_path])[0]
 
 
+def warm_up():
+    """
+    CLIP 모델 로드 + 더미 이미지로 한 번 추론 (첫 요청 지연 방지)
+    """
+    get_clip_model()
+    get_image_embeddings([Image.new('RGB', (224, 224))])
+
+
+def get_inference_stats():
+    """CLIP 추론 큐 통계 (배치 크기, 대기 시간)"""
+    return {
+        'clip_backend': CLIP_BACKEND,
+        'clip_image_batcher': image_batcher.stats() if image_batcher is not None else None
+    }
+
+
+
+def get_text_embeddings(texts):
+    """
+    여러 텍스트를 한 번의 CLIP 텍스트 인코더 호출로 임베딩
+
+    Args:
+        texts: 텍스트 리스트
+
+    Returns:
+        embeddings: (N, D) 정규화된 임베딩 행렬
+    """
+    model, processor = get_clip_model()
+    inputs = processor(text=list(texts), return_tensors="np", padding=True)
+    embeddings = model.encode_texts(
+        inputs['input_ids'].astype(np.int64), inputs['attention_mask'].astype(np.int64)
+    )
+    embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings
+
 
 def get_text_embedding(text):
     """
     텍스트를 CLIP 임베딩으로 변환
     """
-    model, processor = get_clip_model()
-    inputs = processor(text=[text], return_tensors="pt", padding=True)
-    with torch.no_grad():
-        text_features = model.get_text_features(**inputs)
-    embedding = text_features.cpu().numpy()[0]
-    embedding = embedding / np.linalg.norm(embedding)
-    return embedding
+    return get_text_embeddings([text])[0]
 
 
 
 # 동물 데이터베이스 - 강아지, 고양이, 귀여운 동물들!
-# static/animals/ 폴더에 이미지를 저장하고 사용
-ANIMAL_DATABASE = {
-    'dogs': [
-        {   
-            'name': '골든 리트리버', 
-            'images': [
-                'static/animals/goldenRetriever_001.jpg',
-                'static/animals/goldenRetriever_002.jpg',
-                'static/animals/goldenRetriever_003.jpg'
-            ], 
-            'main_image': 'static/animals/goldenRetriever_001.jpg', # 대표 이미지
-            'description': 'friendly and warm, always smiling'
-        },
-        {
-            'name': '진돗개', 
-            'images': [
-                'static/animals/jindo_001.jpg',
-                'static/animals/jindo_002.jpg',
-                'static/animals/jindo_003.jpg'
-            ], 
-            'main_image': 'static/animals/jindo_001.jpg',
-            'description': 'loyal and brave'
-        },
-        {   
-            'name': '포메라니안', # pomeranian(끝)
-            'images': [
-                'static/animals/pomeranian_001.jpg',
-                'static/animals/pomeranian_002.jpg',
-                'static/animals/pomeranian_003.jpg'
-            ], 
-            'main_image': 'static/animals/pomeranian_001.jpg',
-            'description': '귀여워요'
-        },
-        {
-            'name': '웰시코기', # corgi(끝)
-            'images': [
-                'static/animals/corgi_001.jpg',
-                'static/animals/corgi_002.jpg',
-                'static/animals/corgi_003.jpg'
-            ], 
-            'main_image': 'static/animals/corgi_001.jpg',
-            'description': 'short legs and cheerful'
-        },
-        {
-            'name': '사모예드', # samoyed(끝)
-            'images': [
-                'static/animals/samoyed_001.jpg',
-                'static/animals/samoyed_002.jpg',
-                'static/animals/samoyed_003.jpg'
-            ], 
-            'main_image': 'static/animals/samoyed_001.jpg',
-            'description': 'fluffy cloud, always happy'
-        },
-        {
-            'name': '푸들', # poodle(끝)
-            'images': [
-                'static/animals/poodle_001.jpg',
-                'static/animals/poodle_002.jpg',
-                'static/animals/poodle_003.jpg'
-            ], 
-            'main_image': 'static/animals/poodle_001.jpg',
-            'description': 'elegant and smart'
-        },
-        {
-            'name': '비글', # beagle(끝)
-            'images': [
-                'static/animals/beagle_001.jpg',
-                'static/animals/beagle_002.jpg',
-                'static/animals/beagle_003.jpg'
-            ], 
-            'main_image': 'static/animals/beagle_001.jpg',
-            'description': 'curious and energetic'
-        },
-        
-    ],
-    # 고양이
-    'cats': [
-        {
-            'name': '러시안블루', # russianBlue(끝)
-            'images': [
-                'static/animals/russianBlue_001.jpg',
-                'static/animals/russianBlue_002.jpg',
-                'static/animals/russianBlue_003.jpg'
-            ], 
-            'main_image': 'static/animals/russianBlue_001.jpg',
-            'description': 'elegant and mysterious gray'
-        },
-        {
-            'name': '스코티시폴드', # scottishFold(끝)
-            'images': [
-                'static/animals/scottishFold_001.jpg',
-                'static/animals/scottishFold_002.jpg',
-                'static/animals/scottishFold_003.jpg'
-            ], 
-            'main_image': 'static/animals/scottishFold_001.jpg',
-            'description': 'round face and gentle'
-        },
-        {
-            'name': '페르시안', # persian(끝)
-            'images': [
-                'static/animals/persian_001.jpg',
-                'static/animals/persian_002.jpg',
-                'static/animals/persian_003.jpg'
-            ], 
-            'main_image': 'static/animals/persian_001.jpg',
-            'description': 'fluffy and sophisticated'
-        },
-        {
-            'name': '샴', # siamese(끝)
-            'images': [
-                'static/animals/siamese_001.jpg',
-                'static/animals/siamese_002.jpg',
-                'static/animals/siamese_003.jpg'
-            ], 
-            'main_image': 'static/animals/siamese_001.jpg',
-            'description': 'sleek and vocal'
-        },
-        {
-            'name': '코숏', # koreanShorthair(끝)
-            'images': [
-                'static/animals/koreanShorthair_001.jpg',
-                'static/animals/koreanShorthair_002.jpg',
-                'static/animals/koreanShorthair_003.jpg'
-            ], 
-            'main_image': 'static/animals/koreanShorthair_001.jpg',
-            'description': 'typical cute kitty'
-        },
-        {
-            'name': '브리티시숏헤어', # britishShorthair(끝)
-            'images': [
-                'static/animals/britishShorthair_001.jpg',
-                'static/animals/britishShorthair_002.jpg',
-                'static/animals/britishShorthair_003.jpg'
-            ], 
-            'main_image': 'static/animals/britishShorthair_001.jpg',
-            'description': 'round and chubby'
-        },
-        {
-            'name': '뱅갈', # bengal(끝)
-            'images': [
-                'static/animals/bengal_001.jpg',
-                'static/animals/bengal_002.jpg',
-                'static/animals/bengal_003.jpg'
-            ], 
-            'main_image': 'static/animals/bengal_001.jpg',
-            'description': 'wild and energetic'
-        },
-    ],
-    'cute_animals': [
-        {
-            'name': '팬더', # panda(끝)
-            'images': [
-                'static/animals/panda_001.jpg',
-                'static/animals/panda_002.jpg',
-                'static/animals/panda_003.jpg'
-            ], 
-            'main_image': 'static/animals/panda_001.jpg',
-            'description': 'chubby and adorable'
-        },
-        {
-            'name': '토끼', # rabbit(끝)
-            'images': [
-                'static/animals/rabbit_001.jpg',
-                'static/animals/rabbit_002.jpg',
-                'static/animals/rabbit_003.jpg'
-            ], 
-            'main_image': 'static/animals/rabbit_001.jpg',
-            'description': 'soft and gentle'
-        },
-        {
-            'name': '햄스터', # hamster(끝)
-            'images': [
-                'static/animals/hamster_001.jpg',
-                'static/animals/hamster_002.jpg',
-                'static/animals/hamster_003.jpg'
-            ], 
-            'main_image': 'static/animals/hamster_001.jpg',
-            'description': 'tiny and cute'
-        },
-        {
-            'name': '페넥여우', # fennecFox(끝)
-            'images': [
-                'static/animals/fennecFox_001.jpg',
-                'static/animals/fennecFox_002.jpg',
-                'static/animals/fennecFox_003.jpg'
-            ], 
-            'main_image': 'static/animals/fennecFox_001.jpg',
-            'description': 'big ears and playful'
-        },
-        {
-            'name': '알파카', # alpaca(끝)
-            'images': [
-                'static/animals/alpaca_001.jpg',
-                'static/animals/alpaca_002.jpg',
-                'static/animals/alpaca_003.jpg'
-            ], 
-            'main_image': 'static/animals/alpaca_001.jpg',
-            'description': 'fluffy and calm'
-        },
-        {
-            'name': '물범', #seal(끝)
-            'images': [
-                'static/animals/seal_001.jpg',
-                'static/animals/seal_002.jpg',
-                'static/animals/seal_003.jpg'
-            ], 
-            'main_image': 'static/animals/seal_001.jpg',
-            'description': 'round and squishy'
-        },
-    ]
-}
-
-
-def initialize_animal_embeddings():
+# static/animals/ 폴더에 이미지를 저장하고 gallery.json 매니페스트에 등록해서 사용
+def load_animal_database(path=GALLERY_MANIFEST):
+    """갤러리 매니페스트 읽기 (없거나 잘못되었으면 빈 갤러리)"""
+    try:
+        return load_gallery_manifest(path)
+    except (OSError, ValueError) as e:
+        print(f"경고: 갤러리 매니페스트를 읽을 수 없습니다 ({path}): {e}")
+        return {}
+
+
+ANIMAL_DATABASE = load_animal_database()
+
+# 갤러리 이미지 디코드/전처리에 쓸 스레드 수 (PIL 디코딩은 GIL을 풀어서 병렬로 빨라짐)
+GALLERY_DECODE_WORKERS = min(8, os.cpu_count() or 1)
+
+# 경로 -> (수정 시간, 크기, 캐시 키): 바뀌지 않은 파일은 다시 해시하지 않음
+_image_key_cache = {}
+_image_key_lock = threading.Lock()
+
+
+def cached_image_key(path):
+    """이미지 파일의 캐시 키 (수정 시간/크기가 같으면 이전에 계산한 해시 재사용)"""
+    stat = os.stat(path)
+    with _image_key_lock:
+        cached = _image_key_cache.get(path)
+    if cached is not None and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+        return cached[2]
+    key = image_key(path)
+    with _image_key_lock:
+        _image_key_cache[path] = (stat.st_mtime_ns, stat.st_size, key)
+    return key
+
+
+def _preprocess_gallery_images(paths, pool):
+    """
+    갤러리 이미지들을 스레드 풀에서 병렬로 디코드/전처리
+
+    Returns:
+        pixel_values: 성공한 이미지들의 (M, 3, 224, 224) 배열
+        ok: 성공한 이미지의 paths 내 인덱스 리스트
+    """
+    get_clip_model()
+
+    def one(img_path):
+        try:
+            return preprocess_images([img_path])[0]
+        except Exception as e:
+            print(f"이미지 '{img_path}' 처리 중 오류: {e}")
+            return None
+
+    arrays = list(pool.map(one, paths))
+    ok = [i for i, array in enumerate(arrays) if array is not None]
+    if not ok:
+        return None, ok
+    return np.stack([arrays[i] for i in ok]), ok
+
+
+def initialize_animal_embeddings(database=None):
     """
     동물 이미지 데이터베이스의 임베딩을 미리 계산합니다.
     여러 장의 이미지가 있는 경우, 임베딩의 평균을 계산하여 대표값으로 사용합니다.
+
+    이미지 임베딩은 내용 해시 기준으로 디스크에 캐시되므로,
+    새로 추가되었거나 내용이 바뀐 이미지만 CLIP으로 다시 계산합니다. (배치 단위)
+    파일 해시와 디코드/전처리는 스레드 풀에서 병렬로 합니다.
+
+    Args:
+        database: {카테고리: [동물, ...]} (없으면 갤러리 매니페스트를 새로 읽음)
     """
     embeddings = {}
     
-    database_to_use = ANIMAL_DATABASE
+    database_to_use = load_animal_database() if database is None else database
+    store = get_embedding_store()
     
-    for category, animals in database_to_use.items():
-        for animal in animals:
-            animal_name = animal['name']
-            
-            # 'images' 리스트가 있는지 확인
-            image_paths = animal.get('images') 
-            
-            # 'images' 리스트가 없으면, 기존처럼 'image' 단일 경로를 사용 (둘 다 호환되도록 함)
-            if not image_paths and 'image' in animal:
-                image_paths = [animal['image']]
+    with ThreadPoolExecutor(max_workers=GALLERY_DECODE_WORKERS, thread_name_prefix='gallery') as pool:
+        # 1) 동물별 유효한 이미지와 캐시 키 모으기 (파일 해시는 병렬로)
+        animals_with_paths = []
+        all_paths = []
+        for category, animals in database_to_use.items():
+            for animal in animals:
+                animal_name = animal['name']
+                
+                # 'images' 리스트가 있는지 확인
+                image_paths = animal.get('images') 
+                
+                # 'images' 리스트가 없으면, 기존처럼 'image' 단일 경로를 사용 (둘 다 호환되도록 함)
+                if not image_paths and 'image' in animal:
+                    image_paths = [animal['image']]
+
+                if not image_paths:
+                    print(f"경고: '{animal_name}'에 대한 이미지가 없습니다.")
+                    continue
 
-            if not image_paths:
-                print(f"경고: '{animal_name}'에 대한 이미지가 없습니다.")
+                existing = []
+                for img_path in image_paths:
+                    if os.path.exists(img_path):
+                        existing.append(img_path)
+                    else:
+                        print(f"경고: '{img_path}' 파일을 찾을 수 없습니다.")
+                animals_with_paths.append((category, animal, image_paths, existing))
+                all_paths.extend(existing)
+
+        def key_of(img_path):
+            try:
+                return img_path, cached_image_key(img_path)
+            except Exception as e:
+                print(f"이미지 '{img_path}' 처리 중 오류: {e}")
+                return img_path, None
+
+        path_keys = dict(pool.map(key_of, list(dict.fromkeys(all_paths))))
+        entries = [
+            (category, animal, image_paths,
+             [(path_keys[path], path) for path in existing if path_keys.get(path) is not None])
+            for category, animal, image_paths, existing in animals_with_paths
+        ]
+
+        # 2) 캐시에 없는 이미지만 병렬 디코드 + 배치로 임베딩 계산
+        missing = {}
+        for _, _, _, keyed_paths in entries:
+            for key, img_path in keyed_paths:
+                if key not in store:
+                    missing.setdefault(key, img_path)
+        missing_items = list(missing.items())
+        for start in range(0, len(missing_items), IMAGE_BATCH_MAX_SIZE):
+            chunk = missing_items[start:start + IMAGE_BATCH_MAX_SIZE]
+            pixel_values, ok = _preprocess_gallery_images([img_path for _, img_path in chunk], pool)
+            if not ok:
                 continue
+            try:
+                chunk_embeddings = embed_pixel_values(pixel_values)
+            except Exception as e:
+                print(f"이미지 배치 임베딩 오류: {e}")
+                continue
+            for i, embedding in zip(ok, chunk_embeddings):
+                key, img_path = chunk[i]
+                store.put(key, embedding, meta={'path': img_path})
 
-            all_embeddings = []
-            valid_image_found = False
-            # ✨ 여기가 핵심! 리스트의 각 경로를 하나씩 꺼내서 확인합니다.
-            for img_path in image_paths:
-                if os.path.exists(img_path):
-                    try:
-                        # 각 이미지의 임베딩을 계산해서 리스트에 추가
-                        embedding = get_image_embedding(img_path)
-                        all_embeddings.append(embedding)
-                        valid_image_found = True
-                    except Exception as e:
-                        print(f"'{animal_name}'의 이미지 '{img_path}' 처리 중 오류: {e}")
-                else:
-                    print(f"경고: '{img_path}' 파일을 찾을 수 없습니다.")
-
-            # 유효한 이미지가 하나라도 있으면, 모든 임베딩의 '평균'을 계산
-            if valid_image_found:
-                avg_embedding = np.mean(np.array(all_embeddings), axis=0)
-                
-                embeddings[animal_name] = {
-                    'embedding': avg_embedding,
-                    # 결과 화면에 보여줄 대표 이미지를 지정
-                    'image': animal.get('main_image') or image_paths[0],
-                    'description': animal['description'],
-                    'category': category
-                }
+    # 3) 동물별 평균 임베딩 (이미지별 임베딩도 함께 보관 - prototype 인덱스용)
+    for category, animal, image_paths, keyed_paths in entries:
+        all_embeddings, embedded_paths = [], []
+        for key, img_path in keyed_paths:
+            embedding = store.get(key)
+            if embedding is not None:
+                all_embeddings.append(embedding)
+                embedded_paths.append(img_path)
+
+        # 유효한 이미지가 하나라도 있으면, 모든 임베딩의 '평균'을 계산
+        if all_embeddings:
+            avg_embedding = np.mean(np.array(all_embeddings), axis=0)
+            
+            embeddings[animal['name']] = {
+                'embedding': avg_embedding,
+                'image_embeddings': np.array(all_embeddings),
+                'image_paths': embedded_paths,
+                # 결과 화면에 보여줄 대표 이미지를 지정
+                'image': animal.get('main_image') or image_paths[0],
+                'description': animal['description'],
+                'category': category
+            }
+
+    if missing_items:
+        print(f"새 이미지 {len(missing_items)}장 임베딩 계산, 캐시에 저장합니다.")
+        try:
+            store.save()
+        except Exception as e:
+            print(f"임베딩 캐시 저장 오류: {e}")
 
     return embeddings
 
 
-def find_similar_faces(user_image_path, animal_embeddings, top_k=3):
+def create_similarity_index(animal_embeddings, mode=None):
+    """
+    initialize_animal_embeddings() 결과로 검색 인덱스 만들기
+
+    Args:
+        animal_embeddings: 동물별 임베딩 dict
+        mode: 'mean', 'prototype', 'ann' (없으면 GALLERY_INDEX_MODE)
+
+    Returns:
+        SimilarityIndex / PrototypeIndex / AnnSimilarityIndex (query/query_batch 형식 동일)
+    """
+    mode = mode or GALLERY_INDEX_MODE
+    if mode == 'mean':
+        return SimilarityIndex.from_embeddings(animal_embeddings)
+    if mode == 'prototype':
+        return PrototypeIndex.from_embeddings(
+            animal_embeddings,
+            aggregation=PROTOTYPE_AGGREGATION,
+            temperature=PROTOTYPE_TEMPERATURE,
+            top_m=PROTOTYPE_TOP_M
+        )
+    if mode == 'ann':
+        # 같은 갤러리로 만든 인덱스가 저장되어 있으면 메모리 맵으로 열고, 없으면 만들어서 저장
+        return AnnSimilarityIndex.from_index(
+            SimilarityIndex.from_embeddings(animal_embeddings),
+            ANN_BACKEND,
+            os.path.join(get_embedding_store().dir, 'ann')
+        )
+    raise ValueError(f"알 수 없는 갤러리 인덱스 모드: {mode}")
+
+
+def _index_settings(mode):
+    """스냅샷 키에 들어갈 인덱스 설정"""
+    if mode == 'prototype':
+        return [mode, PROTOTYPE_AGGREGATION, PROTOTYPE_TEMPERATURE, PROTOTYPE_TOP_M]
+    return [mode]
+
+
+def gallery_snapshot_key(database, mode):
+    """
+    갤러리 인덱스 스냅샷 식별자
+
+    매니페스트 내용, 이미지 파일의 수정 시간/크기, 임베딩 모델, 인덱스 설정이 같으면 같은 값이라
+    임베딩을 다시 계산하지 않고도 저장된 스냅샷을 찾을 수 있습니다.
+    """
+    h = hashlib.sha1(json.dumps(
+        [database, file_signature(gallery_image_paths(database)), get_embedding_version(), _index_settings(mode)],
+        ensure_ascii=False, sort_keys=True
+    ).encode('utf-8'))
+    return h.hexdigest()[:16]
+
+
+def _remove_old_snapshots(root, mode, keep):
+    """같은 모드의 예전 스냅샷 폴더 정리 (다른 워커가 아직 열고 있어도 리눅스에서는 안전)"""
+    for name in os.listdir(root):
+        if name.startswith(mode + '-') and name != keep:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+def load_similarity_index(database=None, mode=None):
+    """
+    갤러리 검색 인덱스를 공유 스냅샷에서 열기 (없으면 만들어서 저장)
+
+    인덱스 행렬과 메타데이터를 임베딩 캐시 폴더의 gallery/ 아래에 저장하고 읽기 전용 메모리 맵으로 열어서,
+    같은 서버의 워커 프로세스들이 행렬 한 벌을 같이 쓰게 합니다.
+    스냅샷이 있으면 동물별 임베딩 dict도 만들지 않습니다.
+
+    Args:
+        database: {카테고리: [동물, ...]} (없으면 갤러리 매니페스트를 새로 읽음)
+        mode: 'mean', 'prototype', 'ann' (없으면 GALLERY_INDEX_MODE)
+    """
+    database = load_animal_database() if database is None else database
+    mode = mode or GALLERY_INDEX_MODE
+    # ann 모드는 평균 임베딩 인덱스 위에 만들고, ANN 구조는 ann/ 아래에 따로 저장됨
+    base_mode = 'mean' if mode == 'ann' else mode
+    root = os.path.join(get_embedding_store().dir, 'gallery')
+    name = f"{base_mode}-{gallery_snapshot_key(database, base_mode)}"
+    index = load_index_snapshot(os.path.join(root, name))
+    if index is None:
+        index = create_similarity_index(initialize_animal_embeddings(database), base_mode)
+        try:
+            save_index_snapshot(index, os.path.join(root, name))
+            _remove_old_snapshots(root, base_mode, keep=name)
+            index = load_index_snapshot(os.path.join(root, name)) or index
+        except OSError as e:
+            print(f"인덱스 스냅샷 저장 오류: {e}")
+    if mode == 'ann':
+        return AnnSimilarityIndex.from_index(index, ANN_BACKEND, os.path.join(get_embedding_store().dir, 'ann'))
+    return index
+
+
+def find_similar_faces(user_image_path, animal_embeddings, top_k=3, user_embedding=None):
     """
     사용자 얼굴과 가장 닮은 동물 찾기
     
     Args:
         user_image_path: 사용자 이미지 경로
-        animal_embeddings: 미리 계산된 동물 임베딩
+        animal_embeddings: 검색 인덱스 (SimilarityIndex/PrototypeIndex/AnnSimilarityIndex) 또는 미리 계산된 동물 임베딩(dict)
         top_k: 상위 k개 결과
+        user_embedding: 미리 계산한 사용자 임베딩 (있으면 이미지를 다시 임베딩하지 않음)
         
     Returns:
         results: 닮은꼴 리스트
     """
     # 사용자 이미지 임베딩
-    user_embedding = get_image_embedding(user_image_path)
+    if user_embedding is None:
+        user_embedding = get_image_embedding(user_image_path)
     
-    # 유사도 계산
-    similarities = []
+    # dict로 받은 경우에는 인덱스를 만들어서 사용 (매 요청마다 만들지 않도록 app에서 캐시)
+    index = animal_embeddings
+    if isinstance(index, dict):
+        index = create_similarity_index(animal_embeddings)
     
-    for name, data in animal_embeddings.items():
-        animal_embedding = data['embedding']
-        
-        # 코사인 유사도 (1 - 코사인 거리)
-        similarity = 1 - cosine(user_embedding, animal_embedding)
-        similarity_percent = similarity * 100
-        
-        similarities.append({
-            'name': name,
-            'similarity': similarity_percent,
-            'image': data['image'],
-            'description': data['description'],
-            'category': data['category']
+    # 코사인 유사도 상위 k개 (행렬-벡터 곱 한 번)
+    return index.query(user_embedding, k=top_k)
+
+
+# 다양한 성격 키워드
+PERSONALITY_KEYWORDS = [
+    "cute and adorable face",
+    "charismatic and confident face",
+    "gentle and kind face",
+    "cool and sophisticated face",
+    "energetic and bright face",
+    "calm and peaceful face",
+    "mysterious and elegant face",
+    "friendly and warm face"
+]
+
+
+def get_personality_embeddings():
+    """
+    성격 키워드 텍스트 임베딩 (최초 1회만 계산)
+
+    키워드는 고정이라 메모리와 디스크 캐시에 두고,
+    캐시에 없는 키워드만 한 번의 배치 호출로 계산합니다.
+
+    Returns:
+        embeddings: (키워드 수, D) 행렬, PERSONALITY_KEYWORDS 순서
+    """
+    global personality_embeddings_cache
+    if personality_embeddings_cache is None:
+        store = get_embedding_store()
+        keys = [text_key(keyword) for keyword in PERSONALITY_KEYWORDS]
+        cached = store.get_many(keys)
+        missing = [kw for kw, key in zip(PERSONALITY_KEYWORDS, keys) if key not in cached]
+        if missing:
+            for keyword, embedding in zip(missing, get_text_embeddings(missing)):
+                key = text_key(keyword)
+                store.put(key, embedding, meta={'text': keyword})
+                cached[key] = embedding
+            try:
+                store.save()
+            except Exception as e:
+                print(f"임베딩 캐시 저장 오류: {e}")
+        personality_embeddings_cache = np.stack([cached[key] for key in keys]).astype(np.float32)
+    return personality_embeddings_cache
+
+
+def get_personalities(user_embeddings):
+    """
+    여러 사용자 임베딩의 성격 분석을 한 번의 행렬 곱으로
+
+    Args:
+        user_embeddings: (B, D) 사용자 임베딩 행렬
+
+    Returns:
+        personalities: get_personality_by_text()와 같은 형식의 리스트
+    """
+    user_embeddings = np.atleast_2d(user_embeddings)
+    user_embeddings = user_embeddings / np.linalg.norm(user_embeddings, axis=1, keepdims=True)
+    similarities = user_embeddings @ get_personality_embeddings().T
+    personalities = []
+    for row in similarities:
+        scores = {
+            keyword: float(similarity) * 100
+            for keyword, similarity in zip(PERSONALITY_KEYWORDS, row)
+        }
+        # 가장 높은 점수
+        top_personality = max(scores.items(), key=lambda x: x[1])
+        personalities.append({
+            'main_trait': top_personality[0],
+            'score': top_personality[1],
+            'all_scores': scores
         })
-    
-    # 상위 k개 정렬
-    similarities.sort(key=lambda x: x['similarity'], reverse=True)
-    
-    return similarities[:top_k]
+    return personalities
 
 
-def get_personality_by_text(user_image_path):
+def get_personality_by_text(user_image_path=None, user_embedding=None):
     """
     텍스트 기반으로 성격 분석
     CLIP의 텍스트-이미지 매칭 활용
     
     Args:
         user_image_path: 사용자 이미지 경로
+        user_embedding: 미리 계산한 사용자 임베딩 (있으면 이미지를 다시 임베딩하지 않음)
         
     Returns:
         personality: 성격 분석 결과
     """
-    user_embedding = get_image_embedding(user_image_path)
-    
-    # 다양한 성격 키워드
-    personality_keywords = [
-        "cute and adorable face",
-        "charismatic and confident face",
-        "gentle and kind face",
-        "cool and sophisticated face",
-        "energetic and bright face",
-        "calm and peaceful face",
-        "mysterious and elegant face",
-        "friendly and warm face"
-    ]
+    if user_embedding is None:
+        user_embedding = get_image_embedding(user_image_path)
     
-    # 각 키워드와 유사도 계산
-    scores = {}
-    for keyword in personality_keywords:
-        text_embedding = get_text_embedding(keyword)
-        similarity = 1 - cosine(user_embedding, text_embedding)
-        scores[keyword] = similarity * 100
-    
-    # 가장 높은 점수
-    top_personality = max(scores.items(), key=lambda x: x[1])
-    
-    return {
-        'main_trait': top_personality[0],
-        'score': top_personality[1],
-        'all_scores': scores
-    }
+    # 모든 키워드와의 코사인 유사도를 한 번에 계산
+    return get_personalities(user_embedding)[0]
 
 
 def generate_comment(similarity_score):
@@ -0,0 +1,245 @@
+# embedding_store.py
+import hashlib
+import json
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: 프로세스 간 잠금 없이 저장 (개발용 단일 프로세스 실행)
+    fcntl = None
+
+# 저장 포맷 버전 (포맷이 바뀌면 올려서 기존 캐시를 무효화)
+STORE_VERSION = 1
+MANIFEST_NAME = 'manifest.json'
+
+# 저장(다시 읽기 -> 합치기 -> 쓰기 -> 정리)을 한 프로세스씩만 하도록 잡는 잠금 파일
+LOCK_NAME = '.lock'
+
+
+def _safe_name(model_id):
+    """모델 id를 디렉토리 이름으로 쓸 수 있게 변환"""
+    return ''.join(c if c.isalnum() or c in '-_.' else '_' for c in model_id)
+
+
+def hash_bytes(data):
+    """바이트 내용의 sha256 해시"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(path, chunk_size=1 << 20):
+    """파일 내용의 sha256 해시 (경로가 아니라 내용 기준)"""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def image_key(path):
+    """이미지 파일의 캐시 키"""
+    return 'image:' + hash_file(path)
+
+
+def text_key(text):
+    """텍스트 프롬프트의 캐시 키"""
+    return 'text:' + hash_bytes(text.encode('utf-8'))
+
+
+class EmbeddingStore:
+    """
+    CLIP 임베딩 디스크 캐시
+
+    모델 id별 디렉토리에 임베딩 행렬(.npy)과 JSON 매니페스트를 저장합니다.
+    키는 이미지 내용 해시라서, 파일이 바뀌거나 새로 추가된 경우에만 다시 계산하면 됩니다.
+    매니페스트를 마지막에 교체하므로 여러 워커가 동시에 읽어도 항상 온전한 파일 쌍을 봅니다.
+    저장은 디렉토리의 잠금 파일로 프로세스끼리 순서대로 합니다.
+    """
+
+    def __init__(self, root_dir, model_id):
+        self.model_id = model_id
+        self.dir = os.path.join(root_dir, _safe_name(model_id))
+        self._lock = threading.Lock()
+        self._rows = {}      # key -> 행 번호
+        self._meta = {}      # key -> 부가 정보 (원본 경로 등)
+        self._matrix = None  # (N, D) float32
+        self._pending = {}   # 아직 디스크에 쓰지 않은 key -> embedding
+        self.load()
+
+    def __len__(self):
+        return len(self._rows) + len(self._pending)
+
+    def __contains__(self, key):
+        return key in self._pending or key in self._rows
+
+    def _read_disk(self):
+        """디스크의 매니페스트와 행렬 읽기. 없거나 호환되지 않으면 None"""
+        manifest_path = os.path.join(self.dir, MANIFEST_NAME)
+        # 다른 워커가 저장하면서 예전 행렬을 지운 직후라면 한 번 더 시도
+        for _ in range(2):
+            if not os.path.exists(manifest_path):
+                return None
+            try:
+                with open(manifest_path, 'r', encoding='utf-8') as f:
+                    manifest = json.load(f)
+                if manifest.get('version') != STORE_VERSION or manifest.get('model_id') != self.model_id:
+                    print(f"임베딩 캐시 버전/모델 불일치, 무시합니다: {manifest_path}")
+                    return None
+                matrix = np.load(os.path.join(self.dir, manifest['matrix']))
+                if matrix.shape[0] != len(manifest['keys']):
+                    print(f"임베딩 캐시가 손상되었습니다, 무시합니다: {manifest_path}")
+                    return None
+                return manifest, matrix
+            except FileNotFoundError:
+                continue
+            except Exception as e:
+                print(f"임베딩 캐시 읽기 오류: {e}")
+                return None
+        return None
+
+    def load(self):
+        """디스크에서 캐시 로드"""
+        disk = self._read_disk()
+        with self._lock:
+            if disk is None:
+                self._rows, self._meta, self._matrix = {}, {}, None
+                return
+            manifest, matrix = disk
+            self._rows = {key: i for i, key in enumerate(manifest['keys'])}
+            self._meta = manifest.get('meta', {})
+            self._matrix = matrix.astype(np.float32, copy=False)
+
+    def get(self, key):
+        """키에 해당하는 임베딩 (없으면 None)"""
+        with self._lock:
+            if key in self._pending:
+                return self._pending[key]
+            row = self._rows.get(key)
+            if row is None:
+                return None
+            return self._matrix[row]
+
+    def get_many(self, keys):
+        """여러 키 조회 -> {key: embedding} (없는 키는 빠짐)"""
+        found = {}
+        for key in keys:
+            embedding = self.get(key)
+            if embedding is not None:
+                found[key] = embedding
+        return found
+
+    def put(self, key, embedding, meta=None):
+        """임베딩 추가 (save() 호출 전까지는 메모리에만 있음)"""
+        with self._lock:
+            self._pending[key] = np.asarray(embedding, dtype=np.float32)
+            if meta:
+                self._meta[key] = meta
+
+    @contextmanager
+    def _disk_lock(self):
+        """저장 디렉토리의 프로세스 간 배타 잠금 (fcntl이 없으면 잠그지 않음)"""
+        os.makedirs(self.dir, exist_ok=True)
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.dir, LOCK_NAME), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def save(self):
+        """
+        새로 추가된 임베딩을 디스크에 반영
+
+        다른 워커가 그 사이에 저장한 내용도 합쳐서 씁니다.
+        """
+        with self._lock:
+            if not self._pending:
+                return
+            pending = dict(self._pending)
+            meta = dict(self._meta)
+
+        # 다른 프로세스가 같은 매니페스트를 읽고 각자 써서 서로의 키를 덮어쓰지 않도록 끝까지 잠금
+        with self._disk_lock():
+            keys, meta, merged = self._write_merged(pending, meta)
+            self._cleanup()
+
+        with self._lock:
+            self._rows = {key: i for i, key in enumerate(keys)}
+            self._meta = meta
+            self._matrix = merged
+            for key in pending:
+                self._pending.pop(key, None)
+
+    def _write_merged(self, pending, meta):
+        """
+        디스크 내용 + pending을 새 행렬로 쓰고 매니페스트 교체 (잠금 안에서 호출)
+
+        Returns:
+            keys: 행 순서대로의 키 리스트
+            meta: 저장한 부가 정보
+            merged: (N, D) 저장한 행렬
+        """
+        keys, rows = [], []
+        disk = self._read_disk()
+        if disk is not None:
+            manifest, matrix = disk
+            meta = {**manifest.get('meta', {}), **meta}
+            for i, key in enumerate(manifest['keys']):
+                if key not in pending:
+                    keys.append(key)
+                    rows.append(matrix[i])
+        elif self._matrix is not None:
+            for key, i in self._rows.items():
+                if key not in pending:
+                    keys.append(key)
+                    rows.append(self._matrix[i])
+        for key, embedding in pending.items():
+            keys.append(key)
+            rows.append(embedding)
+
+        merged = np.ascontiguousarray(np.stack(rows), dtype=np.float32)
+        key_set = set(keys)
+
+        # 행렬을 새 이름으로 먼저 쓰고, 매니페스트를 원자적으로 교체
+        matrix_name = f"embeddings_{uuid.uuid4().hex[:12]}.npy"
+        tmp_matrix = os.path.join(self.dir, matrix_name + '.tmp')
+        with open(tmp_matrix, 'wb') as f:
+            np.save(f, merged)
+        os.replace(tmp_matrix, os.path.join(self.dir, matrix_name))
+
+        manifest = {
+            'version': STORE_VERSION,
+            'model_id': self.model_id,
+            'dim': int(merged.shape[1]),
+            'matrix': matrix_name,
+            'keys': keys,
+            'meta': {k: v for k, v in meta.items() if k in key_set},
+        }
+        tmp_manifest = os.path.join(self.dir, MANIFEST_NAME + f".{uuid.uuid4().hex[:8]}.tmp")
+        with open(tmp_manifest, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp_manifest, os.path.join(self.dir, MANIFEST_NAME))
+        return keys, manifest['meta'], merged
+
+    def _cleanup(self):
+        """지금 매니페스트가 가리키지 않는 예전 행렬 파일 삭제 (잠금 안에서 호출)"""
+        try:
+            with open(os.path.join(self.dir, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+                keep = json.load(f).get('matrix')
+        except (OSError, ValueError):
+            # 매니페스트를 읽을 수 없으면 어떤 행렬이 쓰이는지 모르므로 지우지 않음
+            return
+        for name in os.listdir(self.dir):
+            if name.startswith('embeddings_') and name.endswith('.npy') and name != keep:
+                try:
+                    os.remove(os.path.join(self.dir, name))
+                except OSError:
+                    pass
@@ -0,0 +1,204 @@
+# emotion_tracker.py
+# 실시간(웹캠) 감정 분석용 세션별 추적기
+#   1. 직전에 분석한 프레임과 거의 같으면 (작은 흑백 썸네일 평균 밝기 차이) 모델 추론을 건너뛰고 직전 결과 재사용
+#   2. 움직임이 작으면 직전 얼굴 박스를 그대로 써서 얼굴 검출을 건너뜀
+#   3. 돌려주는 emotions / confidence_score는 지수 이동 평균(EMA)으로 부드럽게
+# 건너뛰기가 너무 오래 이어지지 않도록 일정 프레임마다 강제로 다시 분석/검출합니다.
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from models.face_analyzer import EMOTION_LABELS, calculate_confidence
+
+# 프레임 차이 비교용 썸네일 크기 (width, height)
+THUMBNAIL_SIZE = (64, 48)
+
+# 직전 분석 프레임과의 평균 밝기 차이(0~255)가 이 값보다 작으면 추론 생략
+FRAME_SKIP_DIFF = 2.0
+
+# 직전 검출 프레임과의 차이가 이 값보다 작으면 얼굴 박스 재사용
+BOX_REUSE_DIFF = 6.0
+
+# 연속으로 추론을 건너뛸 수 있는 최대 프레임 수 (넘으면 강제 분석)
+MAX_SKIPPED_FRAMES = 5
+
+# 같은 얼굴 박스를 재사용할 수 있는 최대 분석 횟수 (넘으면 다시 검출)
+MAX_BOX_REUSE = 10
+
+# EMA 가중치 (새 결과 비중, 1이면 스무딩 없음)
+SMOOTHING_ALPHA = 0.4
+
+
+def frame_thumbnail(frame):
+    """프레임 차이 비교용 작은 흑백 이미지 (int16)"""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    return cv2.resize(gray, THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA).astype(np.int16)
+
+
+def frame_difference(a, b):
+    """두 썸네일의 평균 절대 밝기 차이 (0~255)"""
+    return float(np.abs(a - b).mean())
+
+
+class EmotionTracker:
+    """
+    연습 세션 하나의 실시간 감정 추적 상태
+
+    Args:
+        analyze_fn: (frame, box) -> 감정 분석 결과 딕셔너리 ('face_box' 포함)
+                    box가 None이면 analyze_fn이 얼굴을 검출해야 함
+        alpha: EMA 가중치
+    """
+
+    def __init__(self, analyze_fn, alpha=SMOOTHING_ALPHA):
+        self.analyze_fn = analyze_fn
+        self.alpha = alpha
+        self.last_used = time.time()
+        self._lock = threading.Lock()
+        self._analyzed_thumb = None   # 마지막으로 추론한 프레임
+        self._detected_thumb = None   # 마지막으로 얼굴을 검출한 프레임
+        self._raw = None              # 마지막 추론 결과의 감정 벡터
+        self._smoothed = None
+        self._box = None
+        self._skipped = 0
+        self._box_uses = 0
+        self._stats = {'frames': 0, 'inferences': 0, 'detections': 0, 'skipped': 0, 'box_reused': 0}
+
+    def _plan(self, thumb):
+        """
+        이번 프레임 처리 방법 정하기 (lock 안에서 호출)
+
+        Returns:
+            (infer, box): 추론 여부, 추론할 때 재사용할 얼굴 박스 (None이면 검출)
+        """
+        if self._analyzed_thumb is None or self._analyzed_thumb.shape != thumb.shape:
+            return True, None
+        if self._skipped < MAX_SKIPPED_FRAMES and frame_difference(thumb, self._analyzed_thumb) < FRAME_SKIP_DIFF:
+            return False, None
+        if (
+            self._box is not None
+            and self._box_uses < MAX_BOX_REUSE
+            and frame_difference(thumb, self._detected_thumb) < BOX_REUSE_DIFF
+        ):
+            return True, self._box
+        return True, None
+
+    def process(self, frame):
+        """
+        프레임 하나 분석 (필요할 때만 추론) 후 스무딩된 결과 반환
+
+        Returns:
+            result: analyze_face_emotion()과 같은 형식 + 'face_box'
+            tracking: {'inferred': 추론 여부, 'box_reused': 얼굴 박스 재사용 여부}
+        """
+        thumb = frame_thumbnail(frame)
+        with self._lock:
+            self.last_used = time.time()
+            self._stats['frames'] += 1
+            infer, box = self._plan(thumb)
+
+        if infer:
+            # 추론은 lock 밖에서 (같은 세션의 다른 프레임 요청을 막지 않음)
+            result = self.analyze_fn(frame, box)
+            raw = np.array([result['emotions'].get(label, 0) for label in EMOTION_LABELS], dtype=np.float64)
+            face_box = result.get('face_box')
+
+        with self._lock:
+            if infer:
+                self._stats['inferences'] += 1
+                self._raw = raw
+                self._analyzed_thumb = thumb
+                self._skipped = 0
+                if box is not None:
+                    self._stats['box_reused'] += 1
+                    self._box_uses += 1
+                else:
+                    self._stats['detections'] += 1
+                    self._box = face_box
+                    self._box_uses = 0
+                    self._detected_thumb = thumb
+            else:
+                self._stats['skipped'] += 1
+                self._skipped += 1
+
+            if self._smoothed is None:
+                self._smoothed = self._raw.copy()
+            else:
+                self._smoothed = self.alpha * self._raw + (1 - self.alpha) * self._smoothed
+            smoothed = self._smoothed
+            current_box = self._box
+
+        emotions = dict(zip(EMOTION_LABELS, smoothed.tolist()))
+        result = {
+            'emotions': emotions,
+            'dominant_emotion': max(emotions, key=emotions.get),
+            'age': 0,  # 사용 안 함
+            'gender': 'Unknown',  # 사용 안 함
+            'confidence_score': calculate_confidence(emotions),
+            'face_box': current_box
+        }
+        return result, {'inferred': infer, 'box_reused': infer and box is not None}
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+
+class EmotionTrackerRegistry:
+    """
+    세션 id별 EmotionTracker 보관 (LRU + TTL)
+
+    추적 상태는 프로세스 메모리에만 있어서, 다른 워커로 간 프레임은 그 워커에서 새로 추적을 시작합니다.
+    """
+
+    def __init__(self, analyze_fn, max_sessions=1000, ttl=60 * 10):
+        self.analyze_fn = analyze_fn
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._trackers = OrderedDict()
+        self._lock = threading.Lock()
+        # 정리된 추적기의 통계도 합계에 남김
+        self._retired = {'frames': 0, 'inferences': 0, 'detections': 0, 'skipped': 0, 'box_reused': 0}
+
+    def _retire(self, tracker):
+        for key, value in tracker.stats().items():
+            self._retired[key] += value
+
+    def get(self, session_id):
+        """세션의 추적기 (없으면 새로 생성)"""
+        now = time.time()
+        with self._lock:
+            tracker = self._trackers.get(session_id)
+            if tracker is None:
+                tracker = self._trackers[session_id] = EmotionTracker(self.analyze_fn)
+            self._trackers.move_to_end(session_id)
+            while len(self._trackers) > self.max_sessions:
+                self._retire(self._trackers.popitem(last=False)[1])
+            # 오래 안 쓴 추적기 정리 (가장 오래된 것부터)
+            while self._trackers:
+                oldest_id, oldest = next(iter(self._trackers.items()))
+                if oldest is tracker or now - oldest.last_used <= self.ttl:
+                    break
+                self._retire(self._trackers.pop(oldest_id))
+            return tracker
+
+    def discard(self, session_id):
+        with self._lock:
+            tracker = self._trackers.pop(session_id, None)
+            if tracker is not None:
+                self._retire(tracker)
+
+    def stats(self):
+        """전체 프레임 / 추론 / 건너뛴 횟수"""
+        with self._lock:
+            totals = dict(self._retired)
+            trackers = list(self._trackers.values())
+        for tracker in trackers:
+            for key, value in tracker.stats().items():
+                totals[key] += value
+        totals['sessions'] = len(trackers)
+        totals['inference_ratio'] = round(totals['inferences'] / totals['frames'], 4) if totals['frames'] else 0.0
+        return totals
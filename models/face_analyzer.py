@@ -1,21 +1,261 @@
-from deepface import DeepFace
+# deepface(TensorFlow)는 무거워서 실제로 모델이 필요할 때 import 합니다
 import cv2
 import numpy as np
+import heapq
+import operator
+import threading
+from array import array
 
-def analyze_face_emotion(image_path):
+from models.batching import MicroBatcher
+from models.face_detector import detect_faces
+
+# DeepFace 감정 모델의 출력 순서
+EMOTION_LABELS = ['angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral']
+
+# 마이크로 배치 설정: 여러 세션의 웹캠 프레임을 모아서 한 번에 추론
+EMOTION_BATCH_ENABLED = True
+EMOTION_BATCH_MAX_SIZE = 16
+EMOTION_BATCH_WINDOW_MS = 20
+EMOTION_BATCH_TIMEOUT = 10  # 초
+
+emotion_model = None
+emotion_batcher = None
+_emotion_lock = threading.Lock()
+
+
+def get_emotion_model():
+    """DeepFace 감정 모델 싱글톤"""
+    global emotion_model
+    if emotion_model is None:
+        with _emotion_lock:
+            if emotion_model is None:
+                print("감정 모델 로딩 중...")
+                from deepface import DeepFace
+                emotion_model = DeepFace.build_model('Emotion')
+                print("감정 모델 로드 완료!")
+    return emotion_model
+
+
+def warm_up():
     """
-    얼굴 감정 분석 (면접/발표 연습용)
+    감정 모델 로드 + 빈 입력으로 한 번 추론 (첫 요청 지연 방지)
+    """
+    get_emotion_model().predict(np.zeros((1, 48, 48, 1), dtype=np.float32), verbose=0)
+
+
+def _default_emotion_result():
+    """분석 실패 시 돌려줄 기본값"""
+    return {
+        'emotions': {
+            'happy': 0,
+            'sad': 0,
+            'angry': 0,
+            'surprise': 0,
+            'fear': 0,
+            'disgust': 0,
+            'neutral': 100
+        },
+        'dominant_emotion': 'neutral',
+        'age': 0,
+        'gender': 'Unknown',
+        'confidence_score': 50
+    }
+
+
+def _emotion_input(frame, box=None):
+    """
+    감정 모델 입력 만들기 (48x48 흑백, 0~1)
+
+    DeepFace처럼 얼굴 영역(없으면 전체 프레임)을 정사각형으로 패딩한 뒤 줄입니다.
+    """
+    if box is not None:
+        x, y, w, h = box
+        frame = frame[y:y + h, x:x + w]
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    height, width = gray.shape
+    side = max(height, width)
+    if height != width:
+        padded = np.zeros((side, side), dtype=gray.dtype)
+        top, left = (side - height) // 2, (side - width) // 2
+        padded[top:top + height, left:left + width] = gray
+        gray = padded
+    gray = cv2.resize(gray, (48, 48))
+    return gray.astype(np.float32) / 255.0
+
+
+def _emotion_results(probabilities):
+    """
+    (B, 7) 감정 확률을 analyze_face_emotion()과 같은 형식의 딕셔너리 리스트로
+
+    퍼센트 변환과 자신감 점수는 배치 전체를 한 번에 계산합니다.
+    """
+    emotions = probabilities_to_percent(probabilities)
+    confidences = confidence_scores(emotions)
+    results = []
+    for row, confidence in zip(emotions.tolist(), confidences.tolist()):
+        emotion_dict = dict(zip(EMOTION_LABELS, row))
+        results.append({
+            'emotions': emotion_dict,
+            'dominant_emotion': max(emotion_dict, key=emotion_dict.get),
+            'age': 0,  # 사용 안 함
+            'gender': 'Unknown',  # 사용 안 함
+            'confidence_score': confidence
+        })
+    return results
+
+
+def _emotion_result(probabilities):
+    """감정 확률 벡터 하나를 analyze_face_emotion()과 같은 형식으로"""
+    return _emotion_results(np.asarray(probabilities)[np.newaxis])[0]
+
+
+def probabilities_to_percent(probabilities):
+    """(B, 7) 감정 확률을 행마다 합이 100인 퍼센트로 (float64)"""
+    probabilities = np.asarray(probabilities, dtype=np.float64)
+    totals = probabilities.sum(axis=1, keepdims=True)
+    totals[totals == 0] = 1.0
+    return 100 * probabilities / totals
+
+
+def _locate_emotion_inputs(frames, boxes=None):
+    """
+    프레임마다 감정 모델 입력과 사용한 얼굴 박스 만들기
+
+    boxes에 박스가 주어진 프레임은 얼굴 검출을 건너뛰고 그 박스를 씁니다
+    (None이면 OpenCV로 가장 큰 얼굴을 찾고, 없으면 전체 프레임 사용).
+
+    Returns:
+        inputs: (B, 48, 48, 1) 모델 입력
+        used_boxes: 프레임별 (x, y, w, h) 또는 None
+    """
+    if boxes is None:
+        boxes = [None] * len(frames)
+    inputs, used_boxes = [], []
+    for frame, box in zip(frames, boxes):
+        if box is None:
+            detected = detect_faces(frame)
+            box = detected[0] if detected else None
+        inputs.append(_emotion_input(frame, box))
+        used_boxes.append(box)
+    return np.stack(inputs)[..., np.newaxis], used_boxes
+
+
+def predict_emotions(frames, boxes=None):
+    """
+    여러 프레임의 감정을 한 번의 모델 호출로 예측
+
+    프레임마다 OpenCV로 가장 큰 얼굴을 찾고 (없으면 전체 프레임 사용),
+    얼굴 입력을 쌓아서 감정 모델을 한 번만 실행합니다.
+
+    Args:
+        frames: BGR 이미지(numpy 배열) 리스트
+        boxes: 프레임별 얼굴 박스 (이미 아는 경우, None인 프레임은 검출)
+
+    Returns:
+        probabilities: (B, 7) 감정 확률 (EMOTION_LABELS 순서)
+    """
+    batch, _ = _locate_emotion_inputs(frames, boxes)
+    return get_emotion_model().predict(batch, verbose=0)
+
+
+def analyze_face_emotions_batch(frames, boxes=None):
+    """
+    여러 프레임의 감정을 한 번의 모델 호출로 분석
+
+    Args:
+        frames: BGR 이미지(numpy 배열) 리스트
+        boxes: 프레임별 얼굴 박스 (이미 아는 경우, None인 프레임은 검출)
+
+    Returns:
+        results: 프레임마다 analyze_face_emotion()과 같은 형식의 딕셔너리
+                 + 'face_box' (사용한 얼굴 박스, 얼굴이 없으면 None)
+    """
+    batch, used_boxes = _locate_emotion_inputs(frames, boxes)
+    results = _emotion_results(get_emotion_model().predict(batch, verbose=0))
+    for result, box in zip(results, used_boxes):
+        result['face_box'] = [int(v) for v in box] if box is not None else None
+    return results
+
+
+def _analyze_batch_items(items):
+    """마이크로 배치 큐의 (frame, box) 입력 처리"""
+    frames, boxes = zip(*items)
+    return analyze_face_emotions_batch(list(frames), list(boxes))
+
+
+def get_emotion_batcher():
+    """감정 분석 마이크로 배치 큐 싱글톤"""
+    global emotion_batcher
+    if emotion_batcher is None:
+        with _emotion_lock:
+            if emotion_batcher is None:
+                emotion_batcher = MicroBatcher(
+                    _analyze_batch_items,
+                    max_batch_size=EMOTION_BATCH_MAX_SIZE,
+                    max_wait_ms=EMOTION_BATCH_WINDOW_MS,
+                    name='emotion-batcher'
+                )
+    return emotion_batcher
+
+
+def analyze_frame_emotion_batched(frame, box=None):
+    """
+    웹캠 프레임 하나를 감정 분석 큐에 넣고 결과 기다리기
+
+    Args:
+        frame: BGR 이미지(numpy 배열) 또는 인코딩된 이미지 바이트
+        box: 이미 아는 얼굴 박스 (x, y, w, h) - 주면 얼굴 검출을 건너뜀
+
+    Returns:
+        분석 결과 딕셔너리 (실패하면 기본값)
+    """
+    try:
+        if isinstance(frame, (bytes, bytearray, memoryview)):
+            frame = decode_image(frame)
+        return get_emotion_batcher().run((frame, box), timeout=EMOTION_BATCH_TIMEOUT)
+    except Exception as e:
+        print(f"감정 분석 오류: {e}")
+        return _default_emotion_result()
+
+
+def get_emotion_stats():
+    """감정 분석 큐 통계"""
+    return emotion_batcher.stats() if emotion_batcher is not None else None
+
+
+def decode_image(image_bytes):
+    """
+    인코딩된 이미지 바이트(JPEG/PNG)를 BGR 배열로 디코드
+
+    Raises:
+        ValueError: 이미지로 디코드할 수 없을 때
+    """
+    nparr = np.frombuffer(image_bytes, np.uint8)
+    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError('이미지를 디코드할 수 없습니다')
+    return img
+
+
+def analyze_frame_emotion(frame):
+    """
+    메모리에 있는 프레임의 얼굴 감정 분석 (디스크를 거치지 않음)
     
     Args:
-        image_path: 이미지 경로
+        frame: BGR 이미지(numpy 배열) 또는 인코딩된 이미지 바이트
         
     Returns:
         분석 결과 딕셔너리
     """
     try:
+        if isinstance(frame, (bytes, bytearray, memoryview)):
+            frame = decode_image(frame)
+        
+        from deepface import DeepFace
+        
         # 감정만 분석 (빠르게!)
         result = DeepFace.analyze(
-            img_path=image_path,
+            img_path=frame,
             actions=['emotion'],  # age, gender 제거!
             enforce_detection=False,
             detector_backend='opencv'  # 더 빠른 백엔드
@@ -25,30 +265,36 @@ def analyze_face_emotion(image_path):
         if isinstance(result, list):
             result = result[0]
         
+        emotions = {key: float(value) for key, value in result['emotion'].items()}
         return {
-            'emotions': result['emotion'],
+            'emotions': emotions,
             'dominant_emotion': result['dominant_emotion'],
             'age': 0,  # 사용 안 함
             'gender': 'Unknown',  # 사용 안 함
-            'confidence_score': calculate_confidence(result['emotion'])
+            'confidence_score': calculate_confidence(emotions)
         }
     except Exception as e:
         print(f"감정 분석 오류: {e}")
-        return {
-            'emotions': {
-                'happy': 0,
-                'sad': 0,
-                'angry': 0,
-                'surprise': 0,
-                'fear': 0,
-                'disgust': 0,
-                'neutral': 100
-            },
-            'dominant_emotion': 'neutral',
-            'age': 0,
-            'gender': 'Unknown',
-            'confidence_score': 50
-        }
+        return _default_emotion_result()
+
+
+def analyze_face_emotion(image_path):
+    """
+    얼굴 감정 분석 (면접/발표 연습용)
+    
+    Args:
+        image_path: 이미지 경로 (BGR 배열이나 이미지 바이트도 가능)
+        
+    Returns:
+        분석 결과 딕셔너리
+    """
+    if isinstance(image_path, str):
+        frame = cv2.imread(image_path)
+        if frame is None:
+            print(f"감정 분석 오류: '{image_path}' 파일을 읽을 수 없습니다.")
+            return _default_emotion_result()
+        return analyze_frame_emotion(frame)
+    return analyze_frame_emotion(image_path)
 
 
 def calculate_confidence(emotions):
@@ -61,17 +307,37 @@ def calculate_confidence(emotions):
     Returns:
         confidence_score: 0-100 점수
     """
+    scores = confidence_scores([[emotions.get(label, 0) for label in EMOTION_LABELS]])
+    return float(scores[0])
+
+
+# 감정 배열의 열 인덱스
+EMOTION_INDEX = {label: i for i, label in enumerate(EMOTION_LABELS)}
+_emotion_values = operator.itemgetter(*EMOTION_LABELS)
+
+
+def confidence_scores(emotions):
+    """
+    여러 프레임의 자신감 점수를 한 번에 계산 (calculate_confidence()와 같은 결과)
+
+    Args:
+        emotions: (N, 7) 감정 배열 (EMOTION_LABELS 순서, %)
+
+    Returns:
+        scores: (N,) 30-100 점수 (소수 첫째 자리까지)
+    """
+    emotions = np.asarray(emotions, dtype=np.float64).reshape(-1, len(EMOTION_LABELS))
+    happy = emotions[:, EMOTION_INDEX['happy']]
+    surprise = emotions[:, EMOTION_INDEX['surprise']]
+    neutral = emotions[:, EMOTION_INDEX['neutral']]
+    fear = emotions[:, EMOTION_INDEX['fear']]
+    sad = emotions[:, EMOTION_INDEX['sad']]
+    angry = emotions[:, EMOTION_INDEX['angry']]
+
     # 긍정적 감정: happy, surprise
     # 부정적 감정: fear, sad, angry
     # 중립: neutral
     
-    happy = emotions.get('happy', 0)
-    surprise = emotions.get('surprise', 0)
-    neutral = emotions.get('neutral', 0)
-    fear = emotions.get('fear', 0)
-    sad = emotions.get('sad', 0)
-    angry = emotions.get('angry', 0)
-    
     # 새로운 계산 방식 - 더 후하게!
     positive_score = happy * 1.0 + surprise * 0.7
     neutral_score = neutral * 0.5
@@ -83,9 +349,146 @@ def calculate_confidence(emotions):
     confidence = base_score + positive_score - negative_score + neutral_score * 0.3
     
     # 최소 30, 최대 100
-    confidence = max(30, min(100, confidence))
-    
-    return round(confidence, 1)
+    return np.round(np.clip(confidence, 30, 100), 1)
+
+
+def _top_k_stable(scores, k):
+    """
+    점수 상위 k개 인덱스 (점수가 같으면 앞선 순번 우선)
+
+    argpartition으로 k번째 점수를 찾은 뒤 그 점수 이상인 후보만 정렬합니다.
+    """
+    n = len(scores)
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < n:
+        kth = np.partition(scores, n - k)[n - k]
+        above = np.flatnonzero(scores > kth)
+        tied = np.flatnonzero(scores == kth)[:k - len(above)]
+        candidates = np.concatenate([above, tied])
+    else:
+        candidates = np.arange(n)
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+
+def _average_emotions(labels, sums, count):
+    """감정별 합계를 평균 딕셔너리로 (EmotionArrays / SessionAggregator 공통)"""
+    if not count:
+        return {}
+    return {label: total / count for label, total in zip(labels, sums)}
+
+
+def _moment(index, timestamp, score, emotion, frame):
+    """analyze_best_moment() 형식의 순간 하나"""
+    return {
+        'index': index,
+        'timestamp': timestamp,
+        'score': score,
+        'emotion': emotion,
+        'frame': frame
+    }
+
+
+def _timeline_data(count, happy, neutral, fear, confidence):
+    """get_emotion_timeline() 형식의 그래프 데이터 (값은 리스트)"""
+    return {
+        'timestamps': list(range(count)),
+        'happy': happy,
+        'neutral': neutral,
+        'fear': fear,
+        'confidence': confidence
+    }
+
+
+class EmotionArrays:
+    """
+    감정 기록을 배열로 들고 있는 형태 (긴 세션/일괄 분석용)
+
+    emotions: (N, 7) float64 감정 배열 (EMOTION_LABELS 순서, %)
+    confidence: (N,) 자신감 점수
+    dominant: (N,) 지배 감정 인덱스
+    timestamps: (N,) 기록 시간 (없으면 순번)
+    frames: 기록별 프레임 리스트 (하나도 없으면 None)
+
+    리포트 계산(평균, 지배 감정, 베스트 순간, 타임라인)은 모두 배열 연산이고
+    결과 형식은 generate_feedback(), analyze_best_moment(), get_emotion_timeline()과 같습니다.
+    """
+
+    __slots__ = ('emotions', 'confidence', 'dominant', 'timestamps', 'frames')
+
+    def __init__(self, emotions, confidence=None, dominant=None, timestamps=None, frames=None):
+        self.emotions = np.asarray(emotions, dtype=np.float64).reshape(-1, len(EMOTION_LABELS))
+        if confidence is None:
+            confidence = confidence_scores(self.emotions)
+        count = len(self.emotions)
+        if dominant is None:
+            dominant = self.emotions.argmax(axis=1)
+        self.confidence = np.asarray(confidence, dtype=np.float64)
+        self.dominant = np.asarray(dominant, dtype=np.int8)
+        self.timestamps = np.arange(count) if timestamps is None else np.asarray(timestamps)
+        self.frames = frames
+
+    @classmethod
+    def from_history(cls, emotion_history):
+        """감정 기록(딕셔너리) 리스트를 배열로"""
+        neutral = EMOTION_INDEX['neutral']
+        frames = [record.get('frame') for record in emotion_history]
+        try:
+            emotions = [_emotion_values(record['emotions']) for record in emotion_history]
+        except KeyError:
+            emotions = [[record['emotions'].get(label, 0) for label in EMOTION_LABELS] for record in emotion_history]
+        return cls(
+            emotions,
+            confidence=[record.get('confidence_score', 0) for record in emotion_history],
+            dominant=[EMOTION_INDEX.get(record.get('dominant_emotion'), neutral) for record in emotion_history],
+            timestamps=[record.get('timestamp', idx) for idx, record in enumerate(emotion_history)],
+            frames=frames if any(frame is not None for frame in frames) else None
+        )
+
+    def __len__(self):
+        return len(self.emotions)
+
+    def avg_emotions(self):
+        """감정별 평균"""
+        return _average_emotions(EMOTION_LABELS, self.emotions.sum(axis=0).tolist(), len(self))
+
+    def avg_confidence(self):
+        """평균 자신감"""
+        return float(self.confidence.mean()) if len(self) else 0
+
+    def dominant_emotions(self):
+        """기록별 지배 감정 이름"""
+        return [EMOTION_LABELS[i] for i in self.dominant.tolist()]
+
+    def feedback(self):
+        """generate_feedback()과 같은 피드백"""
+        if not len(self):
+            return _empty_feedback()
+        return build_feedback(self.avg_emotions(), self.avg_confidence())
+
+    def best_moments(self, k=3):
+        """analyze_best_moment()와 같은 상위 순간 리스트"""
+        return [
+            _moment(
+                idx,
+                self.timestamps[idx].item(),
+                self.confidence[idx].item(),
+                EMOTION_LABELS[self.dominant[idx]],
+                self.frames[idx] if self.frames is not None else None
+            )
+            for idx in _top_k_stable(self.confidence, k).tolist()
+        ]
+
+    def timeline(self):
+        """get_emotion_timeline()과 같은 그래프 데이터"""
+        return _timeline_data(
+            len(self),
+            self.emotions[:, EMOTION_INDEX['happy']].tolist(),
+            self.emotions[:, EMOTION_INDEX['neutral']].tolist(),
+            self.emotions[:, EMOTION_INDEX['fear']].tolist(),
+            self.confidence.tolist()
+        )
 
 
 def analyze_best_moment(emotion_history):
@@ -98,22 +501,7 @@ def analyze_best_moment(emotion_history):
     Returns:
         best_moments: 상위 3개 순간
     """
-    scored_moments = []
-    
-    for idx, record in enumerate(emotion_history):
-        score = record.get('confidence_score', 0)
-        scored_moments.append({
-            'index': idx,
-            'timestamp': record.get('timestamp', idx),
-            'score': score,
-            'emotion': record.get('dominant_emotion', 'neutral'),
-            'frame': record.get('frame', None)
-        })
-    
-    # 점수 순으로 정렬
-    scored_moments.sort(key=lambda x: x['score'], reverse=True)
-    
-    return scored_moments[:3]
+    return EmotionArrays.from_history(emotion_history).best_moments(3)
 
 
 def generate_feedback(emotion_history):
@@ -127,22 +515,32 @@ def generate_feedback(emotion_history):
         feedback: 피드백 딕셔너리
     """
     if not emotion_history:
-        return {
-            'title': '데이터 없음',
-            'message': '연습 데이터가 충분하지 않습니다.',
-            'tips': ['먼저 연습을 시작해주세요!']
-        }
-    
-    # 평균 감정 계산
-    avg_emotions = {}
-    emotion_keys = emotion_history[0]['emotions'].keys()
+        return _empty_feedback()
     
-    for key in emotion_keys:
-        avg_emotions[key] = sum(e['emotions'][key] for e in emotion_history) / len(emotion_history)
-    
-    # 평균 자신감
-    avg_confidence = sum(e.get('confidence_score', 0) for e in emotion_history) / len(emotion_history)
+    # 평균 감정 / 평균 자신감은 배열로 한 번에 계산
+    return EmotionArrays.from_history(emotion_history).feedback()
+
+
+def _empty_feedback():
+    """기록이 없을 때의 피드백"""
+    return {
+        'title': '데이터 없음',
+        'message': '연습 데이터가 충분하지 않습니다.',
+        'tips': ['먼저 연습을 시작해주세요!']
+    }
+
+
+def build_feedback(avg_emotions, avg_confidence):
+    """
+    평균 감정/자신감으로 피드백 만들기
     
+    Args:
+        avg_emotions: 감정별 평균 딕셔너리
+        avg_confidence: 평균 자신감 점수
+        
+    Returns:
+        feedback: 피드백 딕셔너리
+    """
     # 지배적 감정
     dominant_emotion = max(avg_emotions, key=avg_emotions.get)
     
@@ -223,19 +621,124 @@ def get_emotion_timeline(emotion_history):
     Returns:
         timeline_data: 그래프 데이터
     """
-    timeline = {
-        'timestamps': [],
-        'happy': [],
-        'neutral': [],
-        'fear': [],
-        'confidence': []
-    }
-    
-    for idx, record in enumerate(emotion_history):
-        timeline['timestamps'].append(idx)
-        timeline['happy'].append(record['emotions'].get('happy', 0))
-        timeline['neutral'].append(record['emotions'].get('neutral', 0))
-        timeline['fear'].append(record['emotions'].get('fear', 0))
-        timeline['confidence'].append(record.get('confidence_score', 0))
-    
-    return timeline
\ No newline at end of file
+    return EmotionArrays.from_history(emotion_history).timeline()
+
+
+class SessionAggregator:
+    """
+    연습 세션 감정 기록의 누적 집계
+
+    프레임이 들어올 때마다 감정별 합계, 자신감 합계, 상위 k개 베스트 순간(힙),
+    그래프용 타임라인을 갱신해 두므로 리포트나 중간 피드백을 만들 때
+    전체 기록을 다시 훑지 않아도 됩니다.
+    결과는 generate_feedback(), analyze_best_moment(), get_emotion_timeline()과 같습니다.
+    """
+
+    __slots__ = (
+        'top_k', 'count', 'emotion_keys', 'emotion_sums', 'confidence_sum',
+        '_best', '_timeline_happy', '_timeline_neutral', '_timeline_fear',
+        '_timeline_confidence'
+    )
+
+    def __init__(self, top_k=3):
+        self.top_k = top_k
+        self.count = 0
+        self.emotion_keys = None   # 첫 기록의 감정 키 순서
+        self.emotion_sums = None   # emotion_keys 순서의 합계
+        self.confidence_sum = 0.0
+        self._best = []            # (점수, -순번, 순간) 최소 힙
+        self._timeline_happy = array('d')
+        self._timeline_neutral = array('d')
+        self._timeline_fear = array('d')
+        self._timeline_confidence = array('d')
+
+    @classmethod
+    def from_history(cls, emotion_history, top_k=3):
+        """이미 있는 감정 기록 리스트로 집계 만들기"""
+        aggregator = cls(top_k=top_k)
+        for record in emotion_history:
+            aggregator.add(record)
+        return aggregator
+
+    def __len__(self):
+        return self.count
+
+    def copy(self):
+        """현재 집계의 복사본 (이후 add()가 원본을 바꿔도 영향 없음)"""
+        other = SessionAggregator(top_k=self.top_k)
+        other.count = self.count
+        other.emotion_keys = self.emotion_keys
+        other.emotion_sums = array('d', self.emotion_sums) if self.emotion_sums is not None else None
+        other.confidence_sum = self.confidence_sum
+        other._best = list(self._best)  # 순간 딕셔너리는 만든 뒤 바뀌지 않음
+        other._timeline_happy = array('d', self._timeline_happy)
+        other._timeline_neutral = array('d', self._timeline_neutral)
+        other._timeline_fear = array('d', self._timeline_fear)
+        other._timeline_confidence = array('d', self._timeline_confidence)
+        return other
+
+    def add(self, record):
+        """감정 기록 하나 반영"""
+        idx = self.count
+        emotions = record['emotions']
+        if self.emotion_keys is None:
+            self.emotion_keys = tuple(emotions.keys())
+            self.emotion_sums = array('d', [0.0] * len(self.emotion_keys))
+        for i, key in enumerate(self.emotion_keys):
+            self.emotion_sums[i] += emotions.get(key, 0)
+
+        score = record.get('confidence_score', 0)
+        self.confidence_sum += score
+
+        # 상위 k개만 유지 (점수가 같으면 먼저 나온 순간 우선)
+        moment = _moment(
+            idx, record.get('timestamp', idx), score, record.get('dominant_emotion', 'neutral'), record.get('frame', None)
+        )
+        if len(self._best) < self.top_k:
+            heapq.heappush(self._best, (score, -idx, moment))
+        elif (score, -idx) > self._best[0][:2]:
+            heapq.heapreplace(self._best, (score, -idx, moment))
+
+        self._timeline_happy.append(emotions.get('happy', 0))
+        self._timeline_neutral.append(emotions.get('neutral', 0))
+        self._timeline_fear.append(emotions.get('fear', 0))
+        self._timeline_confidence.append(score)
+        self.count += 1
+
+    def avg_emotions(self):
+        """감정별 평균"""
+        return _average_emotions(self.emotion_keys, self.emotion_sums, self.count)
+
+    def avg_confidence(self):
+        """평균 자신감"""
+        return self.confidence_sum / self.count if self.count else 0
+
+    def feedback(self):
+        """generate_feedback()과 같은 피드백"""
+        if not self.count:
+            return _empty_feedback()
+        return build_feedback(self.avg_emotions(), self.avg_confidence())
+
+    def best_moments(self):
+        """analyze_best_moment()와 같은 상위 순간 리스트"""
+        return [dict(moment) for _, _, moment in sorted(self._best, key=lambda x: x[:2], reverse=True)]
+
+    def timeline(self):
+        """get_emotion_timeline()과 같은 그래프 데이터"""
+        return _timeline_data(
+            self.count,
+            self._timeline_happy.tolist(),
+            self._timeline_neutral.tolist(),
+            self._timeline_fear.tolist(),
+            self._timeline_confidence.tolist()
+        )
+
+    def live_feedback(self):
+        """연습 도중 보여줄 중간 피드백"""
+        avg_emotions = self.avg_emotions()
+        return {
+            'frame_count': self.count,
+            'avg_confidence': round(self.avg_confidence(), 1),
+            'dominant_emotion': max(avg_emotions, key=avg_emotions.get) if avg_emotions else None,
+            'best_moments': self.best_moments()
+        }
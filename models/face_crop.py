@@ -0,0 +1,176 @@
+# face_crop.py
+# CLIP 매칭 전에 업로드 사진에서 얼굴만 잘라내기
+# 배경/옷/구도 대신 얼굴이 임베딩을 결정하도록 하고, 모델에 넣을 이미지도 작아집니다.
+# 검출 결과는 업로드 파일 옆 사이드카 JSON(<파일>.face.json)에 저장해서 다시 검출하지 않습니다.
+import json
+import math
+
+import numpy as np
+from PIL import Image
+
+from models.face_detector import detect_eyes, detect_faces
+
+# 검출용으로 디코딩할 최대 변 길이 (JPEG는 draft 모드로 축소 디코딩)
+FACE_CROP_DECODE_SIDE = 1280
+
+# 얼굴 박스 주변으로 더 포함할 비율 (머리/귀까지)
+FACE_CROP_MARGIN = 0.35
+
+# 이 각도보다 많이 기울어진 눈 검출 결과는 오검출로 보고 회전하지 않음
+FACE_ALIGN_MAX_ANGLE = 25
+
+FACE_BOX_SUFFIX = '.face.json'
+
+
+def _decode(image_path, max_side=FACE_CROP_DECODE_SIDE):
+    """
+    이미지를 최대 변 max_side 근처 크기로 디코딩
+
+    Returns:
+        img: RGB PIL 이미지
+        original_size: 원본 (width, height)
+    """
+    img = Image.open(image_path)
+    original_size = img.size
+    width, height = original_size
+    if img.format == 'JPEG' and max(width, height) > max_side:
+        scale = max_side / max(width, height)
+        img.draft('RGB', (math.ceil(width * scale), math.ceil(height * scale)))
+    return img.convert('RGB'), original_size
+
+
+def face_box_path(image_path):
+    return image_path + FACE_BOX_SUFFIX
+
+
+def load_face_box(image_path):
+    """사이드카 JSON에 저장된 검출 결과 (없으면 None)"""
+    try:
+        with open(face_box_path(image_path), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_face_box(image_path, face):
+    with open(face_box_path(image_path), 'w', encoding='utf-8') as f:
+        json.dump(face, f)
+
+
+def locate_faces(img, original_size, max_faces=1):
+    """
+    큰 얼굴부터 최대 max_faces개의 박스와 기울기 찾기
+
+    Args:
+        img: 디코딩된 RGB PIL 이미지
+        original_size: 원본 (width, height) - 박스는 원본 좌표로 저장
+        max_faces: 최대 얼굴 수
+
+    Returns:
+        result: {'image_size': [w, h], 'max_faces': max_faces,
+                 'faces': [{'box': [x, y, w, h], 'angle': 눈 기울기(도)}, ...]}
+    """
+    result = {'image_size': list(original_size), 'max_faces': max_faces, 'faces': []}
+    boxes = detect_faces(np.asarray(img)[:, :, ::-1])[:max_faces]
+    if not boxes:
+        return result
+
+    gray = np.asarray(img.convert('L'))
+    scale = original_size[0] / img.size[0]
+    for x, y, w, h in boxes:
+        angle = 0.0
+        eyes = detect_eyes(gray[y:y + h, x:x + w])
+        if eyes is not None:
+            (lx, ly), (rx, ry) = eyes
+            eye_angle = math.degrees(math.atan2(ry - ly, rx - lx))
+            if abs(eye_angle) <= FACE_ALIGN_MAX_ANGLE:
+                angle = round(eye_angle, 2)
+        result['faces'].append({
+            'box': [int(round(v * scale)) for v in (x, y, w, h)],
+            'angle': angle
+        })
+    return result
+
+
+def _square(cx, cy, side, width, height):
+    """(cx, cy) 중심의 정사각형을 이미지 안으로 옮기기 (이미지보다 크면 줄임)"""
+    side = min(side, width, height)
+    left = min(max(cx - side / 2.0, 0), width - side)
+    top = min(max(cy - side / 2.0, 0), height - side)
+    return int(left), int(top), int(left + side), int(top + side)
+
+
+def crop_face(img, original_size, face, margin=FACE_CROP_MARGIN):
+    """
+    얼굴 영역을 정사각형으로 잘라내고 눈이 수평이 되도록 회전
+
+    Args:
+        img: 디코딩된 RGB PIL 이미지
+        original_size: 원본 (width, height)
+        face: locate_faces() 결과의 얼굴 하나 {'box', 'angle'}
+        margin: 박스 주변 여백 비율
+
+    Returns:
+        crop: RGB PIL 이미지
+    """
+    scale = img.size[0] / original_size[0]
+    x, y, w, h = [v * scale for v in face['box']]
+    cx, cy = x + w / 2.0, y + h / 2.0
+    side = max(w, h) * (1 + 2 * margin)
+    angle = face.get('angle') or 0.0
+
+    if not angle:
+        return img.crop(_square(cx, cy, side, *img.size))
+
+    # 회전해도 모서리가 비지 않도록 넉넉하게 자른 뒤 회전하고 가운데를 다시 자름
+    side = min(side, *img.size)
+    outer = side * math.sqrt(2) / 2.0
+    region = img.crop((int(cx - outer), int(cy - outer), int(cx + outer), int(cy + outer)))
+    region = region.rotate(angle, resample=Image.BICUBIC)
+    center = region.size[0] / 2.0
+    half = side / 2.0
+    return region.crop((int(center - half), int(center - half), int(center + half), int(center + half)))
+
+
+def prepare_face_images(image_path, max_faces=1, margin=FACE_CROP_MARGIN, save=True):
+    """
+    CLIP에 넣을 얼굴 이미지들 준비 (큰 얼굴부터 최대 max_faces개)
+
+    검출 결과는 사이드카 JSON에 캐시해서 같은 파일은 다시 검출하지 않습니다.
+    save=False면 사이드카를 새로 쓰지 않습니다 (읽기 전용 폴더 등).
+
+    Returns:
+        images: 얼굴 crop RGB PIL 이미지 리스트 (얼굴이 없으면 전체 이미지 하나)
+        faces: 얼굴별 {'box', 'angle'} 리스트 (얼굴이 없으면 빈 리스트)
+    """
+    img, original_size = _decode(image_path)
+    cached = load_face_box(image_path)
+    if (
+        cached is None
+        or cached.get('image_size') != list(original_size)
+        # 전보다 많은 얼굴을 요청했고, 그때 개수 제한에 걸렸을 수도 있으면 다시 검출
+        or (cached.get('max_faces', 0) < max_faces and len(cached.get('faces', [])) >= cached.get('max_faces', 0))
+    ):
+        cached = locate_faces(img, original_size, max_faces)
+        if save:
+            try:
+                save_face_box(image_path, cached)
+            except OSError as e:
+                print(f"얼굴 박스 저장 실패: {e}")
+
+    faces = cached['faces'][:max_faces]
+    if not faces:
+        return [img], []
+    return [crop_face(img, original_size, face, margin) for face in faces], faces
+
+
+def prepare_face_image(image_path, margin=FACE_CROP_MARGIN):
+    """
+    CLIP에 넣을 사용자 이미지 준비 (가장 큰 얼굴 crop, 얼굴이 없으면 전체 이미지)
+
+    Returns:
+        image: CLIP 입력용 RGB PIL 이미지
+        face: {'box', 'angle'} (얼굴이 없으면 box가 None)
+    """
+    images, faces = prepare_face_images(image_path, 1, margin)
+    return images[0], (faces[0] if faces else {'box': None, 'angle': 0.0})
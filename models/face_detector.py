@@ -0,0 +1,85 @@
+# face_detector.py
+import threading
+
+import cv2
+
+# DeepFace의 detector_backend='opencv'와 같은 Haar cascade 사용
+CASCADE_FILE = 'haarcascade_frontalface_default.xml'
+EYE_CASCADE_FILE = 'haarcascade_eye.xml'
+
+# 큰 이미지는 이 크기로 줄여서 검출 (박스는 원본 좌표로 되돌림)
+DETECT_MAX_SIDE = 640
+
+# CascadeClassifier는 스레드 간 공유하지 않고 스레드마다 하나씩
+_local = threading.local()
+
+
+def _get_cascade(filename):
+    cascades = getattr(_local, 'cascades', None)
+    if cascades is None:
+        cascades = _local.cascades = {}
+    cascade = cascades.get(filename)
+    if cascade is None:
+        cascade = cascades[filename] = cv2.CascadeClassifier(cv2.data.haarcascades + filename)
+    return cascade
+
+
+def get_face_cascade():
+    """현재 스레드용 얼굴 검출기"""
+    return _get_cascade(CASCADE_FILE)
+
+
+def detect_faces(image_bgr, max_side=DETECT_MAX_SIDE):
+    """
+    얼굴 영역 검출
+
+    Args:
+        image_bgr: BGR 이미지 (numpy 배열)
+        max_side: 검출용으로 줄일 최대 변 길이
+
+    Returns:
+        boxes: [(x, y, w, h), ...] 원본 좌표, 면적이 큰 순서
+    """
+    height, width = image_bgr.shape[:2]
+    scale = min(1.0, max_side / max(height, width))
+    gray = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2GRAY) if image_bgr.ndim == 3 else image_bgr
+    if scale < 1.0:
+        gray = cv2.resize(gray, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+
+    faces = get_face_cascade().detectMultiScale(gray, 1.1, 10)
+    boxes = [
+        (int(x / scale), int(y / scale), int(w / scale), int(h / scale))
+        for (x, y, w, h) in faces
+    ]
+    boxes.sort(key=lambda box: box[2] * box[3], reverse=True)
+    return boxes
+
+
+def largest_face(image_bgr):
+    """가장 큰 얼굴 박스 (없으면 None)"""
+    boxes = detect_faces(image_bgr)
+    return boxes[0] if boxes else None
+
+
+def detect_eyes(face_gray):
+    """
+    얼굴 영역 안에서 두 눈 중심 찾기
+
+    Args:
+        face_gray: 얼굴 박스만 잘라낸 흑백 이미지
+
+    Returns:
+        (left, right): 얼굴 이미지 좌표의 눈 중심 (x, y) 두 개 (못 찾으면 None)
+    """
+    height, width = face_gray.shape[:2]
+    upper = face_gray[:height // 2]
+    min_side = max(1, width // 10)
+    eyes = _get_cascade(EYE_CASCADE_FILE).detectMultiScale(upper, 1.1, 5, minSize=(min_side, min_side))
+    if len(eyes) < 2:
+        return None
+    eyes = sorted(eyes, key=lambda e: e[2] * e[3], reverse=True)[:2]
+    centers = sorted((x + w / 2.0, y + h / 2.0) for (x, y, w, h) in eyes)
+    # 두 눈이 좌우로 충분히 떨어져 있어야 함
+    if centers[1][0] - centers[0][0] < width * 0.2:
+        return None
+    return centers[0], centers[1]
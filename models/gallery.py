@@ -0,0 +1,144 @@
+# gallery.py
+# 동물 갤러리 매니페스트(static/animals/gallery.json) 읽기 + 변경 감시
+#   매니페스트 형식: {"version": 1, "categories": {카테고리: [{name, images, main_image, description}, ...]}}
+#   동물을 추가/수정하려면 이미지를 static/animals/에 넣고 매니페스트만 고치면 됩니다 (코드 수정 불필요).
+import json
+import os
+import threading
+
+GALLERY_MANIFEST = 'static/animals/gallery.json'
+MANIFEST_VERSION = 1
+
+
+def _check_animal(category, animal):
+    """매니페스트 항목 하나 검사 (잘못되면 ValueError)"""
+    where = f"{category}/{animal.get('name', '?') if isinstance(animal, dict) else '?'}"
+    if not isinstance(animal, dict):
+        raise ValueError(f"갤러리 항목은 객체여야 합니다: {where}")
+    if not animal.get('name'):
+        raise ValueError(f"갤러리 항목에 name이 없습니다: {where}")
+    images = animal.get('images')
+    if images is None and 'image' in animal:
+        images = [animal['image']]
+    if not isinstance(images, list) or not all(isinstance(path, str) for path in images):
+        raise ValueError(f"images는 경로 리스트여야 합니다: {where}")
+    return {
+        'name': animal['name'],
+        'images': images,
+        'main_image': animal.get('main_image') or (images[0] if images else None),
+        'description': animal.get('description', '')
+    }
+
+
+def load_gallery_manifest(path=GALLERY_MANIFEST):
+    """
+    갤러리 매니페스트 읽기
+
+    Returns:
+        database: {카테고리: [{'name', 'images', 'main_image', 'description'}, ...]}
+
+    Raises:
+        OSError: 파일을 읽을 수 없을 때
+        ValueError: 형식이 잘못되었을 때 (이름 중복 포함)
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if not isinstance(manifest, dict) or manifest.get('version') != MANIFEST_VERSION:
+        raise ValueError(f"지원하지 않는 갤러리 매니페스트 버전입니다: {path}")
+    categories = manifest.get('categories')
+    if not isinstance(categories, dict):
+        raise ValueError(f"갤러리 매니페스트에 categories가 없습니다: {path}")
+
+    database, names = {}, set()
+    for category, animals in categories.items():
+        database[category] = []
+        for animal in animals:
+            animal = _check_animal(category, animal)
+            if animal['name'] in names:
+                raise ValueError(f"갤러리에 같은 이름이 두 번 있습니다: {animal['name']}")
+            names.add(animal['name'])
+            database[category].append(animal)
+    return database
+
+
+def gallery_image_paths(database):
+    """갤러리의 모든 이미지 경로 (정렬, 중복 제거)"""
+    return sorted({path for animals in database.values() for animal in animals for path in animal['images']})
+
+
+def file_signature(paths):
+    """
+    파일들의 (경로, 수정 시간, 크기) 목록
+
+    내용이 바뀌었는지 싸게 비교하는 용도입니다 (파일 내용은 읽지 않음).
+    """
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            signature.append((path, stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            signature.append((path, None, None))
+    return tuple(signature)
+
+
+def gallery_signature(manifest_path, database):
+    """매니페스트와 이미지 파일들의 file_signature()"""
+    return file_signature([manifest_path] + gallery_image_paths(database))
+
+
+class GalleryWatcher:
+    """
+    갤러리 매니페스트/이미지 변경 감시 (폴링)
+
+    interval초마다 파일 수정 시간과 크기를 확인하고, 바뀌었으면 on_change()를 호출합니다.
+    워커 프로세스마다 각자 감시하므로 모든 워커의 인덱스가 따라서 갱신됩니다.
+
+    Args:
+        manifest_path: 매니페스트 경로
+        on_change: 인자 없는 콜백 (예외가 나도 감시는 계속)
+        interval: 확인 간격 (초)
+    """
+
+    def __init__(self, manifest_path, on_change, interval=10.0):
+        self.manifest_path = manifest_path
+        self.on_change = on_change
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._signature = None
+
+    def _current_signature(self):
+        try:
+            database = load_gallery_manifest(self.manifest_path)
+        except (OSError, ValueError):
+            # 편집 중이라 깨진 매니페스트는 파일 정보만으로 비교
+            database = {}
+        return gallery_signature(self.manifest_path, database)
+
+    def check(self):
+        """한 번 확인해서 바뀌었으면 콜백 호출 (바뀌었는지 여부 반환)"""
+        signature = self._current_signature()
+        if self._signature is None or signature == self._signature:
+            self._signature = signature
+            return False
+        self._signature = signature
+        try:
+            self.on_change()
+        except Exception as e:
+            print(f"갤러리 다시 불러오기 실패: {e}")
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._signature = self._current_signature()
+        self._thread = threading.Thread(target=self._run, name='gallery-watcher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
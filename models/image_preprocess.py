@@ -0,0 +1,154 @@
+# image_preprocess.py
+# CLIPProcessor 대신 쓰는 빠른 이미지 전처리
+#   1. JPEG는 draft 모드로 축소 디코딩 (12MP 사진을 원본 크기로 풀지 않음)
+#   2. 짧은 변을 224로 bicubic 리사이즈 (PIL, CLIPProcessor와 같은 방식)
+#   3. 가운데 224x224 crop + 정규화를 numpy로 한 번에 계산해 미리 잡아 둔 float32 배열에 씀
+# 결과는 CLIPProcessor 출력과 오차 범위 안에서 같습니다 (compare_with_processor로 확인).
+import io
+import math
+
+import numpy as np
+from PIL import Image
+
+# openai/clip-vit-base-patch32 전처리 설정
+CLIP_IMAGE_SIZE = 224
+CLIP_MEAN = (0.48145466, 0.4578275, 0.40821073)
+CLIP_STD = (0.26862954, 0.26130258, 0.27577711)
+
+# draft 디코딩 후에도 짧은 변이 (리사이즈 크기 x 이 값) 이상이 되도록 유지
+# (작을수록 빠르지만 CLIPProcessor 결과와 차이가 커짐, 2에서는 일부 사진에서 눈에 띄는 차이)
+DRAFT_MIN_SCALE = 3
+
+
+class ClipImagePreprocessor:
+    """
+    CLIP 이미지 입력 전처리기
+
+    Args:
+        size: 리사이즈할 짧은 변 길이
+        crop_size: 가운데 crop 크기
+        mean, std: 채널별 정규화 값
+        draft: JPEG draft 모드 축소 디코딩 사용 여부
+    """
+
+    def __init__(self, size=CLIP_IMAGE_SIZE, crop_size=CLIP_IMAGE_SIZE,
+                 mean=CLIP_MEAN, std=CLIP_STD, draft=True):
+        self.size = int(size)
+        self.crop_size = int(crop_size)
+        self.draft = draft
+        std = np.asarray(std, dtype=np.float32)
+        # (x / 255 - mean) / std 를 x * scale + offset 한 번으로 계산
+        self._scale = (1.0 / (255.0 * std)).reshape(3, 1, 1).astype(np.float32)
+        self._offset = (-np.asarray(mean, dtype=np.float32) / std).reshape(3, 1, 1).astype(np.float32)
+
+    @classmethod
+    def from_processor(cls, processor, draft=True):
+        """CLIPProcessor 설정값으로 생성"""
+        image_processor = getattr(processor, 'image_processor', processor)
+        return cls(
+            size=image_processor.size['shortest_edge'],
+            crop_size=image_processor.crop_size['height'],
+            mean=image_processor.image_mean,
+            std=image_processor.image_std,
+            draft=draft
+        )
+
+    def load(self, image):
+        """
+        경로 / 바이트 / PIL 이미지를 RGB PIL 이미지로 (JPEG는 축소 디코딩)
+
+        Returns:
+            img: RGB PIL 이미지
+            original_size: 축소 디코딩 전 (width, height)
+        """
+        if isinstance(image, Image.Image):
+            return image.convert('RGB'), image.size
+        if isinstance(image, (bytes, bytearray)):
+            image = io.BytesIO(image)
+        img = Image.open(image)
+        original_size = img.size
+        if self.draft and img.format == 'JPEG':
+            width, height = original_size
+            target = self.size * DRAFT_MIN_SCALE
+            short = min(width, height)
+            if short > target:
+                img.draft('RGB', (math.ceil(width * target / short), math.ceil(height * target / short)))
+        return img.convert('RGB'), original_size
+
+    def _resized(self, img, original_size):
+        """
+        짧은 변을 size로 bicubic 리사이즈
+
+        출력 크기는 원본 크기 기준으로 계산해야 CLIPProcessor와 crop 위치가 같아집니다
+        (축소 디코딩된 크기로 계산하면 반올림 때문에 1픽셀씩 어긋날 수 있음).
+        """
+        width, height = original_size
+        if width <= height:
+            new_size = (self.size, int(self.size * height / width))
+        else:
+            new_size = (int(self.size * width / height), self.size)
+        if new_size != img.size:
+            img = img.resize(new_size, Image.BICUBIC)
+        return img
+
+    def _crop(self, array):
+        """가운데 crop (이미지가 crop보다 작으면 0으로 채움)"""
+        height, width = array.shape[:2]
+        crop = self.crop_size
+        if height < crop or width < crop:
+            padded = np.zeros((max(height, crop), max(width, crop), 3), dtype=array.dtype)
+            top, left = (padded.shape[0] - height) // 2, (padded.shape[1] - width) // 2
+            padded[top:top + height, left:left + width] = array
+            array, height, width = padded, padded.shape[0], padded.shape[1]
+        top, left = (height - crop) // 2, (width - crop) // 2
+        return array[top:top + crop, left:left + crop]
+
+    def __call__(self, images, out=None):
+        """
+        여러 이미지를 CLIP 입력 배열로 변환
+
+        Args:
+            images: 이미지 경로 / 바이트 / PIL 이미지 리스트
+            out: 결과를 쓸 (N, 3, crop, crop) float32 배열 (없으면 새로 할당)
+
+        Returns:
+            pixel_values: (N, 3, crop, crop) float32 배열
+        """
+        count = len(images)
+        shape = (count, 3, self.crop_size, self.crop_size)
+        if out is None:
+            out = np.empty(shape, dtype=np.float32)
+        elif out.shape != shape or out.dtype != np.float32:
+            raise ValueError(f"out 배열 형태가 맞지 않습니다: {out.shape} {out.dtype} (필요: {shape} float32)")
+
+        for i, image in enumerate(images):
+            array = self._crop(np.asarray(self._resized(*self.load(image))))
+            np.multiply(array.transpose(2, 0, 1), self._scale, out=out[i], casting='unsafe')
+            out[i] += self._offset
+        return out
+
+
+def compare_with_processor(processor, images, preprocessor=None):
+    """
+    CLIPProcessor 출력과의 차이 확인
+
+    Args:
+        processor: transformers CLIPProcessor
+        images: 이미지 경로 리스트
+        preprocessor: 비교할 전처리기 (없으면 processor 설정으로 생성)
+
+    Returns:
+        report: 최대/평균 절대 오차
+    """
+    if preprocessor is None:
+        preprocessor = ClipImagePreprocessor.from_processor(processor)
+    expected = processor(
+        images=[Image.open(image).convert('RGB') for image in images], return_tensors='np'
+    )['pixel_values'].astype(np.float32)
+    actual = preprocessor(images)
+    diff = np.abs(actual - expected)
+    return {
+        'count': len(images),
+        'max_abs_diff': float(diff.max()) if diff.size else 0.0,
+        'mean_abs_diff': float(diff.mean()) if diff.size else 0.0
+    }
@@ -0,0 +1,546 @@
+# inference_pool.py
+# 모델 추론 전용 프로세스 풀 (Flask 요청 스레드와 분리)
+#   - spawn으로 만든 워커 프로세스에서 CLIP/감정 모델 실행 (CLIP 가중치와 갤러리 행렬은 메모리 맵이라 워커끼리 공유)
+#   - 워커마다 연산 스레드 수를 (코어 수 / 워커 수)로 제한해서 코어를 과다 구독하지 않음
+#   - 입력 이미지 배열은 미리 만들어 둔 공유 메모리 슬롯에 써서 넘기고 (pickle 복사 없음), 작은 결과만 파이프로 받음
+#   - 빈 슬롯이 없으면 잠깐 기다렸다가 InferenceBusy (백프레셔), 결과가 늦으면 InferenceTimeout
+#   - 웹캠 감정 분석은 요청들을 마이크로 배치로 묶어서 보냄 (배치마다 모델 호출 한 번)
+#     프레임은 흑백 + 얼굴 검출 크기로 줄여서 보내므로 배치 하나가 보통 슬롯 하나에 들어감
+# 웹 프로세스는 모델을 로드하지 않고 디코드/전처리, 닮은꼴용 얼굴 자르기, 갤러리 검색(행렬 곱)만 합니다.
+# 웹캠 감정 분석의 얼굴 검출은 워커에서 합니다.
+import atexit
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import resource_tracker, shared_memory
+
+import cv2
+import numpy as np
+
+from models.batching import MicroBatcher
+from models.face_detector import DETECT_MAX_SIDE
+
+# 공유 메모리 슬롯 하나의 크기 (1080p BGR 프레임, 얼굴 8개의 CLIP 입력이 들어가는 크기)
+SLOT_BYTES = 8 * 1024 * 1024
+
+# 슬롯 안에서 배열 시작 위치 정렬 (바이트)
+SLOT_ALIGN = 64
+
+# 작업 결과 기본 대기 시간 (초)
+DEFAULT_TIMEOUT = 30
+
+# 빈 슬롯을 기다리는 최대 시간 (초, 넘으면 InferenceBusy)
+DEFAULT_QUEUE_WAIT = 0.5
+
+# 갤러리 인덱스 스냅샷 생성 대기 시간 (처음에는 갤러리 전체를 임베딩하므로 길게)
+GALLERY_BUILD_TIMEOUT = 30 * 60
+
+
+class InferenceBusy(RuntimeError):
+    """처리 중인 작업이 너무 많아서 새 작업을 받을 수 없음 (잠시 후 다시 시도)"""
+
+
+class InferenceTimeout(TimeoutError):
+    """작업 결과를 제한 시간 안에 받지 못함"""
+
+
+def limit_threads(threads):
+    """
+    프로세스의 연산 스레드 수 제한
+
+    환경 변수는 아직 로드되지 않은 라이브러리에만 적용되므로 (spawn 워커는 초기화 함수보다 먼저
+    메인 모듈을 다시 import 해서 numpy 등이 이미 로드되어 있음), 이미 로드된 라이브러리는
+    설정 함수를 직접 호출합니다. 모델을 로드한 뒤에 다시 호출해도 됩니다.
+    """
+    for name in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS',
+                 'TF_NUM_INTRAOP_THREADS', 'TF_NUM_INTEROP_THREADS'):
+        os.environ[name] = str(threads)
+    cv2.setNumThreads(1)
+    # numpy BLAS/OpenMP 스레드 풀 (threadpoolctl이 설치된 경우, 선택)
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(threads)
+    except ImportError:
+        pass
+    torch = sys.modules.get('torch')
+    if torch is not None:
+        torch.set_num_threads(threads)
+        try:
+            torch.set_num_interop_threads(threads)
+        except RuntimeError:
+            # 이미 병렬 작업을 실행한 뒤에는 바꿀 수 없음
+            pass
+    tf = sys.modules.get('tensorflow')
+    if tf is not None:
+        try:
+            tf.config.threading.set_intra_op_parallelism_threads(threads)
+            tf.config.threading.set_inter_op_parallelism_threads(threads)
+        except RuntimeError:
+            # 런타임이 이미 초기화되었으면 바꿀 수 없음 (import 전에 설정한 환경 변수가 적용된 상태)
+            pass
+
+
+def shrink_emotion_frame(frame, box=None, max_side=DETECT_MAX_SIDE):
+    """
+    감정 분석용으로 프레임을 흑백 + 얼굴 검출 크기로 줄이기 (공유 메모리에 덜 복사하도록)
+
+    얼굴 검출도 이 크기의 흑백 이미지에서 하고 감정 모델 입력은 48x48이라 결과는 거의 같습니다.
+
+    Returns:
+        frame: 줄인 흑백 프레임
+        box: 줄인 프레임 좌표의 얼굴 박스 (없으면 None)
+        scale: 줄인 비율 (결과 박스를 원본 좌표로 되돌릴 때 사용)
+    """
+    height, width = frame.shape[:2]
+    scale = min(1.0, max_side / max(height, width))
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    if scale < 1.0:
+        gray = cv2.resize(gray, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+        if box is not None:
+            x, y, w, h = box
+            box = (int(x * scale), int(y * scale), max(1, int(w * scale)), max(1, int(h * scale)))
+    return gray, box, scale
+
+
+# ---- 워커 프로세스 쪽 ----
+
+# 슬롯 이름 -> SharedMemory (워커마다 처음 쓸 때 한 번만 연결)
+_worker_slots = {}
+
+
+def _attach_slot(name):
+    """
+    웹 프로세스가 만든 슬롯에 연결
+
+    슬롯의 주인은 웹 프로세스라서 워커는 resource_tracker에 등록하지 않습니다.
+    (3.13 미만은 연결만 해도 등록되어, 워커가 종료될 때 tracker가 슬롯을 unlink 하거나 누수 경고를 냄)
+    연결 뒤 unregister 하면 spawn 워커는 웹 프로세스와 같은 tracker를 쓰기 때문에 웹 프로세스의 등록까지 지워지므로,
+    3.13 미만에서는 연결하는 동안만 등록을 건너뜁니다 (워커는 작업을 하나씩 실행해서 다른 스레드와 겹치지 않음).
+    """
+    shm = _worker_slots.get(name)
+    if shm is None:
+        if sys.version_info >= (3, 13):
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            register = resource_tracker.register
+            resource_tracker.register = lambda *args: None
+            try:
+                shm = shared_memory.SharedMemory(name=name)
+            finally:
+                resource_tracker.register = register
+        _worker_slots[name] = shm
+    return shm
+
+
+def _task_ping():
+    return {'pid': os.getpid()}
+
+
+def _task_clip_faces(pixel_values):
+    from models.clip_matcher import embed_pixel_values, get_personalities
+    embeddings = embed_pixel_values(pixel_values)
+    return embeddings, get_personalities(embeddings)
+
+
+def _task_emotion(*frames, boxes=None):
+    from models.face_analyzer import analyze_face_emotions_batch
+    return analyze_face_emotions_batch(list(frames), boxes)
+
+
+def _task_gallery_index(database=None):
+    from models.clip_matcher import load_similarity_index
+    index = load_similarity_index(database)
+    return {'animals': len(index), 'version': index.version}
+
+
+# 작업 이름 -> 워커에서 실행할 함수 (입력 배열은 위치 인자, 나머지는 키워드 인자)
+TASKS = {
+    'ping': _task_ping,
+    'clip_faces': _task_clip_faces,
+    'emotion': _task_emotion,
+    'gallery_index': _task_gallery_index
+}
+
+
+def _init_worker(threads, warm_up):
+    """워커 프로세스 초기화: 스레드 수 제한 + 모델 미리 로드 (실패해도 워커는 계속)"""
+    limit_threads(threads)
+    if not warm_up:
+        return
+    from models.clip_matcher import get_personality_embeddings, warm_up as warm_up_clip
+    from models.face_analyzer import warm_up as warm_up_emotion
+    for name, loader in (('clip', warm_up_clip), ('personality', get_personality_embeddings),
+                         ('emotion', warm_up_emotion)):
+        try:
+            loader()
+        except Exception as e:
+            print(f"추론 워커 {os.getpid()} {name} 워밍업 실패: {e}")
+    # 워밍업에서 처음 로드된 torch/TensorFlow에도 적용
+    limit_threads(threads)
+
+
+def _run_task(task, slot_name, specs, inline, kwargs):
+    """
+    워커에서 작업 하나 실행
+
+    Returns:
+        (result, seconds): 작업 결과, 워커 안에서 걸린 시간
+    """
+    if slot_name is not None:
+        buffer = _attach_slot(slot_name).buf
+        arrays = [
+            np.ndarray(shape, dtype=np.dtype(dtype), buffer=buffer, offset=offset)
+            for offset, shape, dtype in specs
+        ]
+    else:
+        arrays = inline
+    started = time.perf_counter()
+    result = TASKS[task](*arrays, **kwargs)
+    return result, time.perf_counter() - started
+
+
+# ---- 웹 프로세스 쪽 ----
+
+class InferencePool:
+    """
+    추론 워커 프로세스 풀 + 요청 스레드용 클라이언트
+
+    슬롯 하나가 처리 중인 작업 하나라서, 슬롯 수(max_pending)가 동시에 받을 수 있는 작업 수의 상한입니다.
+    슬롯은 워커가 작업을 끝내거나 취소된 뒤에만 반납되므로, 시간 초과로 돌아간 요청의 입력을
+    워커가 아직 읽고 있어도 다른 요청이 덮어쓰지 않습니다.
+
+    Args:
+        workers: 워커 프로세스 수
+        threads: 워커마다 연산 스레드 수 (없으면 코어 수 / 워커 수)
+        max_pending: 동시에 처리/대기할 수 있는 최대 작업 수 (없으면 워커 수 x 4)
+        slot_bytes: 슬롯 하나의 크기 (입력이 더 크면 pickle로 전달)
+        timeout: 결과 기본 대기 시간 (초)
+        queue_wait: 빈 슬롯을 기다리는 최대 시간 (초)
+        warm_up: 워커 시작 시 모델 미리 로드
+        emotion_batch_size: analyze_emotion_batched()가 한 배치로 묶는 최대 프레임 수
+        emotion_batch_window_ms: 배치를 모으는 최대 시간
+    """
+
+    def __init__(self, workers=2, threads=None, max_pending=None, slot_bytes=SLOT_BYTES,
+                 timeout=DEFAULT_TIMEOUT, queue_wait=DEFAULT_QUEUE_WAIT, warm_up=True,
+                 emotion_batch_size=16, emotion_batch_window_ms=20):
+        self.workers = max(1, workers)
+        self.threads = threads or max(1, (os.cpu_count() or 1) // self.workers)
+        self.max_pending = max_pending or self.workers * 4
+        self.slot_bytes = slot_bytes
+        self.timeout = timeout
+        self.queue_wait = queue_wait
+        self.warm_up = warm_up
+        self.emotion_batch_size = emotion_batch_size
+        self.emotion_batch_window_ms = emotion_batch_window_ms
+        self._emotion_batcher = None
+        self._executor = None
+        self._slots = []
+        self._free = queue.Queue()
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'submitted': 0,
+            'completed': 0,
+            'errors': 0,
+            'cancelled': 0,
+            'rejected': 0,
+            'timeouts': 0,
+            'inline': 0,
+            'restarts': 0,
+            'total_task_time': 0.0,
+            'total_latency': 0.0
+        }
+
+    def _new_executor(self):
+        # TensorFlow/torch는 fork 후 사용이 안전하지 않아서 spawn으로 새 프로세스 생성
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(self.threads, self.warm_up)
+        )
+
+    def start(self):
+        """
+        공유 메모리 슬롯과 워커 프로세스를 만들고 워커가 모델을 로드할 때까지 대기
+
+        이미 시작했으면 아무것도 하지 않습니다.
+        """
+        with self._lock:
+            if self._executor is not None:
+                return
+            print(f"추론 풀 시작 중... (워커 {self.workers}개, 워커당 스레드 {self.threads}개)")
+            for _ in range(self.max_pending):
+                shm = shared_memory.SharedMemory(create=True, size=self.slot_bytes)
+                self._slots.append(shm)
+                self._free.put(shm)
+            self._executor = self._new_executor()
+            atexit.register(self.shutdown)
+            # 워커 수만큼 동시에 보내서 프로세스를 모두 띄움 (워밍업이 끝난 워커부터 작업을 가져감)
+            pings = [self._executor.submit(_run_task, 'ping', None, (), (), {}) for _ in range(self.workers)]
+        for future in pings:
+            future.result()
+        print("추론 풀 준비 완료!")
+
+    def shutdown(self):
+        """워커 종료 + 공유 메모리 해제"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+            slots, self._slots = self._slots, []
+            self._free = queue.Queue()
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+        for shm in slots:
+            shm.close()
+            shm.unlink()
+
+    def _count(self, key):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def _pack(self, shm, arrays):
+        """배열들을 슬롯에 이어서 복사 (슬롯보다 크면 None)"""
+        specs, offset = [], 0
+        for array in arrays:
+            offset = -(-offset // SLOT_ALIGN) * SLOT_ALIGN
+            specs.append((offset, array.shape, array.dtype.str))
+            offset += array.nbytes
+        if offset > self.slot_bytes:
+            return None
+        for (start, shape, dtype), array in zip(specs, arrays):
+            np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=start)[...] = array
+        return specs
+
+    def _executor_submit(self, *args):
+        """워커가 비정상 종료되어 풀이 깨졌으면 새 풀을 만들어서 다시 제출"""
+        executor = self._executor
+        try:
+            return executor.submit(*args)
+        except BrokenProcessPool:
+            with self._lock:
+                if self._executor is executor:
+                    print("추론 워커가 비정상 종료되어 풀을 다시 만듭니다")
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    self._executor = self._new_executor()
+                    self._count('restarts')
+                executor = self._executor
+            return executor.submit(*args)
+
+    def _finish(self, future, free, shm, submitted):
+        """작업이 끝나면 (성공/실패/취소) 슬롯 반납 + 통계"""
+        free.put(shm)
+        latency = time.perf_counter() - submitted
+        with self._stats_lock:
+            s = self._stats
+            if future.cancelled():
+                s['cancelled'] += 1
+            elif future.exception() is not None:
+                s['errors'] += 1
+            else:
+                s['completed'] += 1
+                s['total_task_time'] += future.result()[1]
+                s['total_latency'] += latency
+
+    def submit(self, task, arrays=(), **kwargs):
+        """
+        작업 하나를 워커에 보내기
+
+        Args:
+            task: TASKS의 작업 이름
+            arrays: 공유 메모리로 넘길 입력 배열 리스트
+            kwargs: 작업 함수의 키워드 인자 (pickle로 전달)
+
+        Returns:
+            future: 결과는 (작업 결과, 워커 처리 시간)
+
+        Raises:
+            InferenceBusy: queue_wait 동안 빈 슬롯이 나지 않을 때
+        """
+        self.start()
+        arrays = [np.ascontiguousarray(array) for array in arrays]
+        free = self._free
+        try:
+            shm = free.get(timeout=self.queue_wait)
+        except queue.Empty:
+            self._count('rejected')
+            raise InferenceBusy(f"추론 요청이 너무 많습니다 (동시 {self.max_pending}개), 잠시 후 다시 시도해주세요")
+        try:
+            specs = self._pack(shm, arrays)
+            if specs is None:
+                self._count('inline')
+                future = self._executor_submit(_run_task, task, None, None, arrays, kwargs)
+            else:
+                future = self._executor_submit(_run_task, task, shm.name, specs, (), kwargs)
+        except Exception:
+            free.put(shm)
+            raise
+        self._count('submitted')
+        submitted = time.perf_counter()
+        future.add_done_callback(lambda f: self._finish(f, free, shm, submitted))
+        return future
+
+    def run(self, task, arrays=(), timeout=None, **kwargs):
+        """
+        submit() 후 결과 기다리기
+
+        Raises:
+            InferenceBusy: 빈 슬롯이 없을 때
+            InferenceTimeout: timeout(없으면 기본값)초 안에 결과가 없을 때
+        """
+        timeout = self.timeout if timeout is None else timeout
+        return self._wait(self.submit(task, arrays, **kwargs), task, timeout)
+
+    def _wait(self, future, task, timeout):
+        """submit()한 작업의 결과 기다리기 (시간 초과면 InferenceTimeout)"""
+        try:
+            result, _ = future.result(timeout=timeout)
+        except FutureTimeoutError:
+            # 아직 워커가 가져가지 않았으면 취소 (슬롯은 작업이 끝나거나 취소된 뒤 반납)
+            future.cancel()
+            self._count('timeouts')
+            raise InferenceTimeout(f"추론 작업 '{task}' 결과를 {timeout:g}초 안에 받지 못했습니다")
+        return result
+
+    def _chunks(self, arrays):
+        """슬롯 하나에 들어가는 만큼씩 배열 인덱스 묶기 (슬롯보다 큰 배열은 혼자 한 묶음)"""
+        chunks, chunk, size = [], [], 0
+        for i, array in enumerate(arrays):
+            start = -(-size // SLOT_ALIGN) * SLOT_ALIGN
+            if chunk and start + array.nbytes > self.slot_bytes:
+                chunks.append(chunk)
+                chunk, start = [], 0
+            chunk.append(i)
+            size = start + array.nbytes
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+    def embed_faces(self, pixel_values, timeout=None):
+        """
+        전처리된 얼굴 이미지들의 CLIP 임베딩 + 성격 분석
+
+        Args:
+            pixel_values: (N, 3, 224, 224) float32 CLIP 입력
+
+        Returns:
+            embeddings: (N, D) 정규화된 임베딩 행렬
+            personalities: get_personalities()와 같은 형식의 리스트
+        """
+        return self.run('clip_faces', [pixel_values], timeout)
+
+    def analyze_emotion(self, frame, box=None, timeout=None):
+        """
+        BGR 프레임 하나 감정 분석
+
+        Returns:
+            analyze_face_emotions_batch() 결과 하나 ('face_box' 포함)
+        """
+        return self.analyze_emotions([frame], [box], timeout)[0]
+
+    def analyze_emotions(self, frames, boxes=None, timeout=None):
+        """
+        여러 BGR 프레임 감정 분석
+
+        프레임을 shrink_emotion_frame()으로 줄인 뒤, 슬롯 하나에 들어가는 만큼씩 나눠서
+        워커들에 동시에 보내고 (묶음마다 모델 호출 한 번) 결과를 입력 순서대로 합칩니다.
+
+        Returns:
+            analyze_face_emotions_batch() 결과 리스트 ('face_box'는 원본 프레임 좌표)
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.perf_counter() + timeout
+        boxes = list(boxes) if boxes is not None else [None] * len(frames)
+        frames, boxes, scales = zip(*(shrink_emotion_frame(frame, box) for frame, box in zip(frames, boxes)))
+        futures = []
+        try:
+            for chunk in self._chunks(frames):
+                futures.append(self.submit('emotion', [frames[i] for i in chunk], boxes=[boxes[i] for i in chunk]))
+            results = []
+            for future in futures:
+                results.extend(self._wait(future, 'emotion', max(0.0, deadline - time.perf_counter())))
+        except (InferenceBusy, InferenceTimeout):
+            # 이미 보낸 나머지 묶음은 결과를 쓸 곳이 없으므로 취소
+            for future in futures:
+                future.cancel()
+            raise
+        for result, scale in zip(results, scales):
+            if result.get('face_box') is not None and scale < 1.0:
+                result['face_box'] = [int(round(v / scale)) for v in result['face_box']]
+        return results
+
+    def _analyze_emotion_items(self, items):
+        """마이크로 배치 큐의 (frame, box) 입력 처리"""
+        frames, boxes = zip(*items)
+        return self.analyze_emotions(list(frames), list(boxes))
+
+    def _get_emotion_batcher(self):
+        """감정 분석 마이크로 배치 큐 (워커 수만큼 배치를 동시에 처리)"""
+        if self._emotion_batcher is None:
+            with self._lock:
+                if self._emotion_batcher is None:
+                    self._emotion_batcher = MicroBatcher(
+                        self._analyze_emotion_items,
+                        max_batch_size=self.emotion_batch_size,
+                        max_wait_ms=self.emotion_batch_window_ms,
+                        name='inference-emotion-batcher',
+                        concurrency=self.workers
+                    )
+        return self._emotion_batcher
+
+    def analyze_emotion_batched(self, frame, box=None):
+        """
+        BGR 프레임 하나를 다른 요청의 프레임과 묶어서 감정 분석
+
+        Returns:
+            analyze_emotion()과 같은 결과
+
+        Raises:
+            InferenceBusy / InferenceTimeout: 배치 작업이 거절되거나 시간 초과일 때 (배치 전체에 전달)
+        """
+        # 배치 작업 자체의 시간 초과(self.timeout)가 먼저 나도록 배치를 모으는 시간만큼 여유를 둠
+        timeout = self.timeout + self.queue_wait + self.emotion_batch_window_ms / 1000.0
+        try:
+            return self._get_emotion_batcher().run((frame, box), timeout=timeout)
+        except (InferenceBusy, InferenceTimeout):
+            # 배치 작업에서 난 예외는 그대로 (InferenceTimeout도 TimeoutError라서 아래에서 다시 감싸지 않도록)
+            raise
+        except FutureTimeoutError:
+            self._count('timeouts')
+            raise InferenceTimeout(f"감정 분석 배치 결과를 {timeout:g}초 안에 받지 못했습니다")
+
+    def build_gallery_index(self, database=None, timeout=GALLERY_BUILD_TIMEOUT):
+        """
+        워커에서 갤러리 인덱스 스냅샷 만들기 (이미 있으면 바로 끝남)
+
+        웹 프로세스는 그다음 load_similarity_index()로 스냅샷을 메모리 맵으로 열기만 합니다.
+        """
+        return self.run('gallery_index', (), timeout, database=database)
+
+    def stats(self):
+        """작업 수, 거절/시간 초과 수, 평균 처리 시간"""
+        with self._stats_lock:
+            s = dict(self._stats)
+        completed = s['completed'] or 1
+        return {
+            'workers': self.workers,
+            'threads_per_worker': self.threads,
+            'max_pending': self.max_pending,
+            'in_flight': len(self._slots) - self._free.qsize(),
+            'submitted': s['submitted'],
+            'completed': s['completed'],
+            'errors': s['errors'],
+            'cancelled': s['cancelled'],
+            'rejected': s['rejected'],
+            'timeouts': s['timeouts'],
+            'inline': s['inline'],
+            'restarts': s['restarts'],
+            'avg_task_ms': round(s['total_task_time'] / completed * 1000, 2),
+            'avg_latency_ms': round(s['total_latency'] / completed * 1000, 2),
+            'emotion_batcher': self._emotion_batcher.stats() if self._emotion_batcher is not None else None
+        }
@@ -0,0 +1,151 @@
+# report_renderer.py
+import base64
+import io
+import threading
+
+import numpy as np
+
+# matplotlib은 리포트를 처음 그릴 때 import 합니다
+
+# 그래프에 그릴 최대 점 개수 (긴 세션은 이 개수로 줄여서 그림)
+REPORT_MAX_POINTS = 300
+
+# 이 개수보다 점이 많으면 마커 없이 선만 그림
+REPORT_MARKER_LIMIT = 60
+
+REPORT_DPI = 100
+
+# (타임라인 키, 범례, 마커, 색, 선 모양)
+REPORT_SERIES = [
+    ('happy', 'Happy 😊', 'o', '#4CAF50', '-'),
+    ('neutral', 'Neutral 😐', 's', '#2196F3', '-'),
+    ('fear', 'Fear 😰', '^', '#FF9800', '-'),
+    ('confidence', 'Confidence 💪', 'D', '#9C27B0', '--'),
+]
+
+_RC = {'axes.unicode_minus': False}
+
+
+def decimate_timeline(timeline, max_points=REPORT_MAX_POINTS):
+    """
+    타임라인을 최대 max_points개로 줄이기 (처음과 끝은 항상 포함)
+
+    Args:
+        timeline: get_emotion_timeline() 형식의 딕셔너리
+        max_points: 최대 점 개수
+
+    Returns:
+        같은 형식의 딕셔너리
+    """
+    count = len(timeline['timestamps'])
+    if count <= max_points:
+        return timeline
+    picks = np.unique(np.linspace(0, count - 1, max_points).round().astype(np.int64))
+    return {
+        key: np.asarray(values)[picks].tolist()
+        for key, values in timeline.items()
+    }
+
+
+class ReportRenderer:
+    """
+    연습 리포트 감정 그래프 렌더러
+
+    pyplot 전역 상태를 쓰지 않고 Figure/FigureCanvasAgg를 직접 사용합니다.
+    스타일을 입혀 둔 Figure를 스레드마다 하나씩 만들어 두고 데이터만 바꿔서 재사용하므로
+    스레드 서버에서도 안전하고, 요청마다 Figure를 새로 꾸미지 않아도 됩니다.
+    """
+
+    def __init__(self, dpi=REPORT_DPI, max_points=REPORT_MAX_POINTS):
+        self.dpi = dpi
+        self.max_points = max_points
+        self._local = threading.local()
+
+    def _template(self):
+        """현재 스레드용 그래프 템플릿 (최초 1회만 생성)"""
+        template = getattr(self._local, 'template', None)
+        if template is not None:
+            return template
+
+        import matplotlib
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+
+        with matplotlib.rc_context(_RC):
+            fig = Figure(figsize=(12, 6))
+            FigureCanvasAgg(fig)
+            ax = fig.add_subplot()
+            lines = {}
+            for key, label, marker, color, linestyle in REPORT_SERIES:
+                lines[key], = ax.plot(
+                    [], [], marker=marker, label=label, linewidth=2,
+                    color=color, linestyle=linestyle
+                )
+            ax.set_xlabel('Time (frames)', fontsize=12)
+            ax.set_ylabel('Score (%)', fontsize=12)
+            ax.set_title('Emotion Timeline During Practice', fontsize=14, fontweight='bold')
+            ax.set_ylim(0, 105)
+            ax.legend(loc='best', fontsize=10)
+            ax.grid(True, alpha=0.3)
+            fig.tight_layout()
+
+        template = (fig, ax, lines)
+        self._local.template = template
+        return template
+
+    def _draw(self, timeline):
+        """템플릿에 데이터 채우기"""
+        timeline = decimate_timeline(timeline, self.max_points)
+        fig, ax, lines = self._template()
+        x = timeline['timestamps']
+        show_markers = len(x) <= REPORT_MARKER_LIMIT
+        for key, _, marker, _, _ in REPORT_SERIES:
+            lines[key].set_data(x, timeline[key])
+            lines[key].set_marker(marker if show_markers else '')
+        if x:
+            ax.set_xlim(x[0] - 0.5, x[-1] + 0.5)
+        return fig
+
+    def _save(self, timeline, target, fmt):
+        import matplotlib
+
+        with matplotlib.rc_context(_RC):
+            fig = self._draw(timeline)
+            fig.savefig(target, format=fmt, dpi=self.dpi)
+
+    def render_png(self, timeline):
+        """PNG 바이트"""
+        buffer = io.BytesIO()
+        self._save(timeline, buffer, 'png')
+        return buffer.getvalue()
+
+    def render_png_data_url(self, timeline):
+        """<img src>에 바로 넣을 수 있는 PNG data URL"""
+        return 'data:image/png;base64,' + base64.b64encode(self.render_png(timeline)).decode('ascii')
+
+    def render_svg(self, timeline):
+        """SVG 문자열"""
+        buffer = io.StringIO()
+        self._save(timeline, buffer, 'svg')
+        return buffer.getvalue()
+
+    def render_file(self, timeline, path):
+        """PNG 파일로 저장"""
+        self._save(timeline, path, 'png')
+
+    def chart_data(self, timeline):
+        """클라이언트에서 직접 그릴 수 있도록 줄인 그래프 데이터"""
+        timeline = decimate_timeline(timeline, self.max_points)
+        return {
+            'timestamps': list(timeline['timestamps']),
+            'series': [
+                {
+                    'key': key,
+                    'label': label,
+                    'color': color,
+                    'dashed': linestyle == '--',
+                    'values': list(timeline[key])
+                }
+                for key, label, _, color, linestyle in REPORT_SERIES
+            ]
+        }
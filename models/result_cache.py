@@ -0,0 +1,116 @@
+# result_cache.py
+import io
+import threading
+import time
+from collections import OrderedDict
+
+from PIL import Image
+
+
+def dhash(image_bytes, hash_size=8):
+    """
+    이미지 difference hash (64비트 정수)
+
+    흑백으로 (hash_size+1) x hash_size 크기로 줄인 뒤 옆 픽셀과의 밝기 차이로 비트를 만듭니다.
+    재압축/리사이즈된 같은 사진은 해밍 거리가 작게 나옵니다.
+    """
+    img = Image.open(io.BytesIO(image_bytes))
+    img.draft('L', (hash_size * 8, hash_size * 8))
+    pixels = list(img.convert('L').resize((hash_size + 1, hash_size), Image.BILINEAR).getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+class ResultCache:
+    """
+    업로드 이미지 분석 결과 캐시 (LRU + TTL)
+
+    키는 (버전, 이미지 내용 해시)이고, 버전에는 모델/갤러리 식별자를 넣어서
+    모델이나 갤러리가 바뀌면 예전 결과가 쓰이지 않게 합니다.
+    phash_distance를 지정하면 내용 해시가 달라도 dhash 해밍 거리가 그 이하인
+    같은 버전의 결과를 재사용합니다 (None이면 정확히 같은 파일만).
+    """
+
+    def __init__(self, max_entries=512, ttl=3600, phash_distance=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.phash_distance = phash_distance
+        self._entries = OrderedDict()  # (version, content_hash) -> (expires, phash, value)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._near_hits = 0
+        self._misses = 0
+
+    def _find_near(self, version, phash, now):
+        """같은 버전에서 dhash가 가까운 항목 키 (lock 안에서 호출)"""
+        best_key, best_distance = None, self.phash_distance + 1
+        for key, (expires, entry_phash, _) in self._entries.items():
+            if key[0] != version or entry_phash is None or expires < now:
+                continue
+            distance = hamming_distance(phash, entry_phash)
+            if distance < best_distance:
+                best_key, best_distance = key, distance
+        return best_key
+
+    def get(self, version, content_hash, phash=None):
+        """
+        캐시된 결과 조회
+
+        Returns:
+            value: 캐시된 결과 (없으면 None)
+        """
+        now = time.time()
+        with self._lock:
+            key = (version, content_hash)
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < now:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._hits += 1
+            elif phash is not None and self.phash_distance is not None:
+                key = self._find_near(version, phash, now)
+                if key is not None:
+                    entry = self._entries[key]
+                    self._near_hits += 1
+            if entry is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            return entry[2]
+
+    def put(self, version, content_hash, value, phash=None):
+        """결과 저장 (가득 차면 가장 오래 안 쓴 항목부터 버림)"""
+        with self._lock:
+            key = (version, content_hash)
+            self._entries[key] = (time.time() + self.ttl, phash, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """적중/실패 횟수"""
+        with self._lock:
+            lookups = self._hits + self._near_hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'hits': self._hits,
+                'near_hits': self._near_hits,
+                'misses': self._misses,
+                'hit_rate': round((self._hits + self._near_hits) / lookups, 4) if lookups else 0.0
+            }
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,266 @@
+# session_store.py
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+
+class SessionNotFound(KeyError):
+    """없거나 만료된 연습 세션"""
+
+
+def _new_session_id():
+    return uuid.uuid4().hex
+
+
+class InMemorySessionStore:
+    """
+    프로세스 메모리에 두는 연습 세션 저장소
+
+    세션마다 감정 기록을 최대 max_records개까지 보관하고 (넘치면 오래된 것부터 버림),
+    마지막 사용 후 ttl초가 지나거나 세션 수가 max_sessions를 넘으면 오래된 세션부터 지웁니다.
+    aggregator_factory가 있으면 세션마다 누적 집계 객체를 두고 기록이 들어올 때마다 갱신합니다.
+    기록이 max_records를 넘어 오래된 기록이 빠지면, 집계도 남은 기록 기준이 되도록
+    다음 get_aggregator()에서 남은 기록으로 다시 만듭니다 (SQLiteSessionStore와 같은 결과).
+    """
+
+    def __init__(self, max_sessions=1000, ttl=3600, max_records=10000, aggregator_factory=None):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_records = max_records
+        self.aggregator_factory = aggregator_factory
+        self._sessions = OrderedDict()  # session_id -> {'created', 'updated', 'records', 'aggregator'}
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        """만료되었거나 개수를 넘은 세션 정리 (lock 안에서 호출)"""
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session['updated'] > self.ttl or len(self._sessions) > self.max_sessions:
+                del self._sessions[session_id]
+            else:
+                break
+
+    def _get(self, session_id, now):
+        session = self._sessions.get(session_id)
+        if session is None or now - session['updated'] > self.ttl:
+            self._sessions.pop(session_id, None)
+            raise SessionNotFound(session_id)
+        return session
+
+    def create(self):
+        """새 세션을 만들고 id 반환"""
+        now = time.time()
+        session_id = _new_session_id()
+        with self._lock:
+            self._sessions[session_id] = {
+                'created': now,
+                'updated': now,
+                'records': deque(maxlen=self.max_records),
+                'aggregator': self.aggregator_factory() if self.aggregator_factory else None
+            }
+            self._evict(now)
+        return session_id
+
+    def exists(self, session_id):
+        with self._lock:
+            try:
+                self._get(session_id, time.time())
+                return True
+            except SessionNotFound:
+                return False
+
+    def append(self, session_id, record):
+        """
+        감정 기록 추가
+
+        record에 'timestamp'가 없으면 세션 시작 후 경과 시간(ms)을 넣습니다.
+
+        Returns:
+            count: 현재 세션의 기록 수
+        """
+        now = time.time()
+        with self._lock:
+            session = self._get(session_id, now)
+            record = dict(record)
+            record.setdefault('timestamp', int((now - session['created']) * 1000))
+            records = session['records']
+            if len(records) == records.maxlen:
+                # 가장 오래된 기록이 빠지므로 집계는 get_aggregator()에서 남은 기록으로 다시 만듦
+                session['aggregator'] = None
+            records.append(record)
+            if session['aggregator'] is not None:
+                session['aggregator'].add(record)
+            session['updated'] = now
+            self._sessions.move_to_end(session_id)
+            return len(session['records'])
+
+    def get_history(self, session_id):
+        """세션의 감정 기록 리스트"""
+        with self._lock:
+            return list(self._get(session_id, time.time())['records'])
+
+    def get_aggregator(self, session_id):
+        """
+        세션의 누적 집계 객체 (보관 중인 기록 전체가 반영된 상태)
+
+        다른 요청이 append()로 원본을 바꾸는 동안에도 리포트를 만들 수 있도록 lock 안에서 만든 복사본을 돌려줍니다.
+        """
+        if self.aggregator_factory is None:
+            return None
+        with self._lock:
+            session = self._get(session_id, time.time())
+            if session['aggregator'] is None:
+                aggregator = self.aggregator_factory()
+                for record in session['records']:
+                    aggregator.add(record)
+                session['aggregator'] = aggregator
+            return session['aggregator'].copy()
+
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+
+class SQLiteSessionStore:
+    """
+    로컬 SQLite 파일에 두는 연습 세션 저장소
+
+    여러 워커 프로세스가 같은 파일을 쓰면 어느 워커로 요청이 가도 세션이 이어집니다.
+    보관 정책은 InMemorySessionStore와 같고,
+    누적 집계는 다른 워커가 쓴 기록도 반영해야 하므로 요청할 때 기록으로 다시 만듭니다.
+    """
+
+    def __init__(self, path, max_sessions=1000, ttl=3600, max_records=10000, aggregator_factory=None):
+        self.path = path
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_records = max_records
+        self.aggregator_factory = aggregator_factory
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        with self._lock, self._conn:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS sessions ('
+                ' id TEXT PRIMARY KEY, created REAL NOT NULL, updated REAL NOT NULL)'
+            )
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS records ('
+                ' session_id TEXT NOT NULL, seq INTEGER NOT NULL, data TEXT NOT NULL,'
+                ' PRIMARY KEY (session_id, seq))'
+            )
+
+    def _evict(self, now):
+        """만료되었거나 개수를 넘은 세션 정리 (lock 안에서 호출)"""
+        expired = self._conn.execute(
+            'SELECT id FROM sessions WHERE updated < ?', (now - self.ttl,)
+        ).fetchall()
+        overflow = self._conn.execute(
+            'SELECT id FROM sessions ORDER BY updated DESC LIMIT -1 OFFSET ?',
+            (self.max_sessions,)
+        ).fetchall()
+        for (session_id,) in set(expired) | set(overflow):
+            self._conn.execute('DELETE FROM records WHERE session_id = ?', (session_id,))
+            self._conn.execute('DELETE FROM sessions WHERE id = ?', (session_id,))
+
+    def _get(self, session_id, now):
+        row = self._conn.execute(
+            'SELECT created, updated FROM sessions WHERE id = ?', (session_id,)
+        ).fetchone()
+        if row is None or now - row[1] > self.ttl:
+            raise SessionNotFound(session_id)
+        return row
+
+    def create(self):
+        """새 세션을 만들고 id 반환"""
+        now = time.time()
+        session_id = _new_session_id()
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT INTO sessions (id, created, updated) VALUES (?, ?, ?)',
+                (session_id, now, now)
+            )
+            self._evict(now)
+        return session_id
+
+    def exists(self, session_id):
+        with self._lock:
+            try:
+                self._get(session_id, time.time())
+                return True
+            except SessionNotFound:
+                return False
+
+    def append(self, session_id, record):
+        """
+        감정 기록 추가
+
+        record에 'timestamp'가 없으면 세션 시작 후 경과 시간(ms)을 넣습니다.
+
+        Returns:
+            count: 현재 세션의 기록 수
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            created, _ = self._get(session_id, now)
+            record = dict(record)
+            record.setdefault('timestamp', int((now - created) * 1000))
+            seq = self._conn.execute(
+                'SELECT COALESCE(MAX(seq), -1) + 1 FROM records WHERE session_id = ?',
+                (session_id,)
+            ).fetchone()[0]
+            self._conn.execute(
+                'INSERT INTO records (session_id, seq, data) VALUES (?, ?, ?)',
+                (session_id, seq, json.dumps(record))
+            )
+            self._conn.execute(
+                'DELETE FROM records WHERE session_id = ? AND seq <= ?',
+                (session_id, seq - self.max_records)
+            )
+            self._conn.execute('UPDATE sessions SET updated = ? WHERE id = ?', (now, session_id))
+            return min(seq + 1, self.max_records)
+
+    def get_history(self, session_id):
+        """세션의 감정 기록 리스트"""
+        with self._lock:
+            self._get(session_id, time.time())
+            rows = self._conn.execute(
+                'SELECT data FROM records WHERE session_id = ? ORDER BY seq', (session_id,)
+            ).fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    def get_aggregator(self, session_id):
+        """세션의 누적 집계 객체 (저장된 기록으로 생성)"""
+        if self.aggregator_factory is None:
+            return None
+        aggregator = self.aggregator_factory()
+        for record in self.get_history(session_id):
+            aggregator.add(record)
+        return aggregator
+
+    def delete(self, session_id):
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM records WHERE session_id = ?', (session_id,))
+            self._conn.execute('DELETE FROM sessions WHERE id = ?', (session_id,))
+
+
+def create_session_store(backend='memory', path=None, **kwargs):
+    """
+    설정에 맞는 세션 저장소 생성
+
+    Args:
+        backend: 'memory' 또는 'sqlite'
+        path: sqlite 파일 경로
+        **kwargs: max_sessions, ttl, max_records, aggregator_factory
+    """
+    if backend == 'memory':
+        return InMemorySessionStore(**kwargs)
+    if backend == 'sqlite':
+        return SQLiteSessionStore(path or 'cache/sessions.db', **kwargs)
+    raise ValueError(f"알 수 없는 세션 저장소: {backend}")
@@ -0,0 +1,400 @@
+# similarity_index.py
+import hashlib
+import json
+import os
+import shutil
+import uuid
+
+import numpy as np
+
+# 인덱스 스냅샷 (save_index_snapshot) 메타데이터 파일 이름
+INDEX_META_NAME = 'index.json'
+
+
+def normalize_rows(matrix):
+    """각 행을 L2 정규화한 float32 행렬 (C-contiguous)"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(matrix / norms)
+
+
+def top_k_indices(scores, k):
+    """
+    점수가 높은 순서대로 상위 k개 인덱스
+
+    전체 정렬 대신 argpartition으로 k개만 골라낸 뒤 그 안에서만 정렬합니다.
+    scores가 2차원이면 행마다 계산합니다.
+    """
+    n = scores.shape[-1]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(scores.shape[:-1] + (0,), dtype=np.int64)
+    if k < n:
+        part = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    else:
+        part = np.broadcast_to(np.arange(n), scores.shape).copy()
+    part_scores = np.take_along_axis(scores, part, axis=-1)
+    order = np.argsort(-part_scores, axis=-1, kind='stable')
+    return np.take_along_axis(part, order, axis=-1)
+
+
+class SimilarityIndex:
+    """
+    동물 갤러리 유사도 검색 인덱스
+
+    갤러리 임베딩을 정규화된 float32 행렬 하나로 들고 있고,
+    같은 순서의 메타데이터 배열을 함께 가집니다.
+    질의는 행렬-벡터 곱 한 번과 argpartition으로 끝나서
+    갤러리가 커져도 파이썬 반복문이 늘어나지 않습니다.
+
+    normalized=True면 이미 정규화된 행렬(예: 스냅샷 메모리 맵)을 복사 없이 그대로 씁니다.
+    """
+
+    kind = 'mean'
+
+    def __init__(self, matrix, metadata, version=None, normalized=False):
+        self.matrix = matrix if normalized else normalize_rows(matrix)
+        self.metadata = np.empty(len(metadata), dtype=object)
+        self.metadata[:] = list(metadata)
+        if self.matrix.shape[0] != len(self.metadata):
+            raise ValueError("임베딩 행 수와 메타데이터 수가 다릅니다")
+        self.version = version or self._fingerprint()
+
+    def _fingerprint(self):
+        """갤러리 내용(임베딩 + 이름) 식별자 (결과 캐시 무효화용)"""
+        h = hashlib.sha1(self.matrix.tobytes())
+        for meta in self.metadata:
+            h.update(str(meta.get('name')).encode('utf-8'))
+        return h.hexdigest()[:16]
+
+    @classmethod
+    def from_embeddings(cls, animal_embeddings):
+        """
+        initialize_animal_embeddings() 결과(dict)로 인덱스 생성
+
+        Args:
+            animal_embeddings: {이름: {'embedding', 'image', 'description', 'category'}}
+        """
+        names = list(animal_embeddings.keys())
+        if not names:
+            return cls(np.zeros((0, 0), dtype=np.float32), [])
+        matrix = np.stack([animal_embeddings[name]['embedding'] for name in names])
+        metadata = [
+            {
+                'name': name,
+                'image': animal_embeddings[name]['image'],
+                'description': animal_embeddings[name]['description'],
+                'category': animal_embeddings[name]['category']
+            }
+            for name in names
+        ]
+        return cls(matrix, metadata)
+
+    def __len__(self):
+        return len(self.metadata)
+
+    def animal_digests(self):
+        """동물별 내용 식별자 {이름: 해시} (갤러리 갱신 시 바뀐 동물 찾기용)"""
+        return {
+            meta['name']: _digest(self.matrix[row], meta)
+            for row, meta in enumerate(self.metadata)
+        }
+
+    def save(self, directory):
+        np.save(os.path.join(directory, 'matrix.npy'), self.matrix)
+        return {'metadata': list(self.metadata)}
+
+    @classmethod
+    def load(cls, directory, meta, mmap=True):
+        matrix = np.load(os.path.join(directory, 'matrix.npy'), mmap_mode='r' if mmap else None)
+        return cls(matrix, meta['metadata'], version=meta['version'], normalized=True)
+
+    def _result(self, row, score):
+        meta = self.metadata[row]
+        return {
+            'name': meta['name'],
+            'similarity': float(score) * 100,
+            'image': meta['image'],
+            'description': meta['description'],
+            'category': meta['category']
+        }
+
+    def query(self, embedding, k=3):
+        """
+        임베딩 하나와 가장 비슷한 상위 k개
+
+        Args:
+            embedding: (D,) 사용자 임베딩
+            k: 상위 k개
+
+        Returns:
+            results: 유사도(%) 내림차순 결과 리스트
+        """
+        if len(self) == 0:
+            return []
+        query = normalize_rows(embedding)
+        scores = self.matrix @ query
+        rows = top_k_indices(scores, k)
+        return [self._result(row, scores[row]) for row in rows]
+
+    def query_batch(self, embeddings, k=3):
+        """
+        여러 임베딩을 한 번의 행렬 곱으로 질의
+
+        Args:
+            embeddings: (B, D) 사용자 임베딩 행렬
+            k: 상위 k개
+
+        Returns:
+            results: 질의마다 query()와 같은 형식의 리스트
+        """
+        queries = normalize_rows(np.atleast_2d(embeddings))
+        if len(self) == 0:
+            return [[] for _ in range(queries.shape[0])]
+        scores = queries @ self.matrix.T
+        rows = top_k_indices(scores, k)
+        return [
+            [self._result(row, scores[i, row]) for row in rows[i]]
+            for i in range(queries.shape[0])
+        ]
+
+
+# PrototypeIndex 집계 방식
+PROTOTYPE_AGGREGATIONS = ('max', 'softmax', 'topm')
+
+
+class PrototypeIndex:
+    """
+    갤러리 이미지마다 한 행씩 두는 다중 프로토타입 검색 인덱스
+
+    동물별 평균 임베딩 대신 참고 이미지 임베딩을 모두 들고 있다가,
+    질의 한 번에 모든 이미지와의 코사인 유사도를 행렬 곱으로 구한 뒤 동물별로 집계합니다.
+    동물마다 이미지 수가 달라서 (동물 수, 최대 이미지 수) 모양으로 패딩해 두고
+    빈 칸은 마스크로 제외하므로 집계도 반복문 없이 배열 연산으로 끝납니다.
+
+    Args:
+        image_matrix: 동물 순서대로 (A, P, D) 패딩된 이미지 임베딩
+        counts: (A,) 동물별 실제 이미지 수
+        image_paths: 동물별 참고 이미지 경로 리스트
+        metadata: 동물별 {'name', 'image', 'description', 'category'}
+        aggregation: 'max' (가장 비슷한 이미지), 'softmax' (유사도 softmax 가중 평균),
+                     'topm' (상위 top_m개 평균)
+        temperature: softmax 온도 (작을수록 max에 가까움)
+        top_m: topm 집계에 쓸 이미지 수
+    """
+
+    kind = 'prototype'
+
+    def __init__(self, image_matrix, counts, image_paths, metadata,
+                 aggregation='max', temperature=0.05, top_m=2, version=None, normalized=False):
+        if aggregation not in PROTOTYPE_AGGREGATIONS:
+            raise ValueError(f"알 수 없는 집계 방식: {aggregation} (가능: {', '.join(PROTOTYPE_AGGREGATIONS)})")
+        self.aggregation = aggregation
+        self.temperature = float(temperature)
+        self.top_m = int(top_m)
+        self.counts = np.asarray(counts, dtype=np.int64)
+        animals, per_animal = self.counts.shape[0], int(self.counts.max()) if len(self.counts) else 0
+        self.image_paths = list(image_paths)
+        self.metadata = np.empty(len(metadata), dtype=object)
+        self.metadata[:] = list(metadata)
+        if animals != len(self.metadata) or animals != len(self.image_paths):
+            raise ValueError("동물 수와 메타데이터 수가 다릅니다")
+        if not normalized:
+            image_matrix = np.asarray(image_matrix, dtype=np.float32)
+        dim = image_matrix.shape[-1] if image_matrix.size else 0
+        self.shape = (animals, per_animal)
+        # 질의는 (A*P, D) 행렬 하나와의 곱 (패딩 행은 0)
+        matrix = image_matrix.reshape(animals * per_animal, dim)
+        self.matrix = matrix if normalized else normalize_rows(matrix)
+        self.mask = np.arange(per_animal) < self.counts[:, np.newaxis]  # (A, P)
+        self.version = version or self._fingerprint()
+
+    def _fingerprint(self):
+        """갤러리 내용 + 집계 설정 식별자 (결과 캐시 무효화용)"""
+        h = hashlib.sha1(self.matrix.tobytes())
+        h.update(f"{self.aggregation}:{self.temperature}:{self.top_m}".encode('utf-8'))
+        for meta in self.metadata:
+            h.update(str(meta.get('name')).encode('utf-8'))
+        return h.hexdigest()[:16]
+
+    @classmethod
+    def from_embeddings(cls, animal_embeddings, **kwargs):
+        """
+        initialize_animal_embeddings() 결과(dict)로 인덱스 생성
+
+        Args:
+            animal_embeddings: {이름: {'image_embeddings', 'image_paths', 'image', 'description', 'category'}}
+            kwargs: aggregation, temperature, top_m
+        """
+        names = list(animal_embeddings.keys())
+        if not names:
+            return cls(np.zeros((0, 0, 0), dtype=np.float32), [], [], [], **kwargs)
+        per_animal = [np.atleast_2d(animal_embeddings[name]['image_embeddings']) for name in names]
+        counts = [len(embeddings) for embeddings in per_animal]
+        image_matrix = np.zeros((len(names), max(counts), per_animal[0].shape[1]), dtype=np.float32)
+        for i, embeddings in enumerate(per_animal):
+            image_matrix[i, :len(embeddings)] = embeddings
+        metadata = [
+            {
+                'name': name,
+                'image': animal_embeddings[name]['image'],
+                'description': animal_embeddings[name]['description'],
+                'category': animal_embeddings[name]['category']
+            }
+            for name in names
+        ]
+        image_paths = [list(animal_embeddings[name]['image_paths']) for name in names]
+        return cls(image_matrix, counts, image_paths, metadata, **kwargs)
+
+    def __len__(self):
+        return len(self.metadata)
+
+    def animal_digests(self):
+        """동물별 내용 식별자 {이름: 해시} (갤러리 갱신 시 바뀐 동물 찾기용)"""
+        per_animal = self.shape[1]
+        return {
+            meta['name']: _digest(self.matrix[row * per_animal:(row + 1) * per_animal], meta, self.image_paths[row])
+            for row, meta in enumerate(self.metadata)
+        }
+
+    def save(self, directory):
+        np.save(os.path.join(directory, 'matrix.npy'), self.matrix)
+        np.save(os.path.join(directory, 'counts.npy'), self.counts)
+        return {
+            'metadata': list(self.metadata),
+            'image_paths': self.image_paths,
+            'aggregation': self.aggregation,
+            'temperature': self.temperature,
+            'top_m': self.top_m
+        }
+
+    @classmethod
+    def load(cls, directory, meta, mmap=True):
+        matrix = np.load(os.path.join(directory, 'matrix.npy'), mmap_mode='r' if mmap else None)
+        counts = np.load(os.path.join(directory, 'counts.npy'))
+        per_animal = int(counts.max()) if len(counts) else 0
+        return cls(
+            matrix.reshape(len(counts), per_animal, matrix.shape[-1]), counts, meta['image_paths'], meta['metadata'],
+            aggregation=meta['aggregation'], temperature=meta['temperature'], top_m=meta['top_m'],
+            version=meta['version'], normalized=True
+        )
+
+    def aggregate(self, scores):
+        """
+        이미지별 유사도를 동물별 점수로 집계
+
+        Args:
+            scores: (B, A*P) 이미지별 코사인 유사도
+
+        Returns:
+            animal_scores: (B, A) 동물별 점수
+            best: (B, A) 동물별 가장 비슷한 이미지 번호
+        """
+        scores = scores.reshape((scores.shape[0],) + self.shape)
+        masked = np.where(self.mask, scores, -np.inf)
+        best = masked.argmax(axis=-1)
+        if self.aggregation == 'max':
+            animal_scores = np.take_along_axis(masked, best[..., np.newaxis], axis=-1)[..., 0]
+        elif self.aggregation == 'softmax':
+            peak = np.take_along_axis(masked, best[..., np.newaxis], axis=-1)
+            weights = np.exp((masked - peak) / self.temperature)  # 패딩은 exp(-inf) = 0
+            animal_scores = (weights * np.where(self.mask, scores, 0)).sum(axis=-1) / weights.sum(axis=-1)
+        else:
+            m = np.minimum(self.top_m, self.counts)  # (A,)
+            ordered = -np.sort(-masked, axis=-1)[..., :self.top_m]
+            used = np.arange(ordered.shape[-1]) < m[:, np.newaxis]
+            animal_scores = np.where(used, ordered, 0).sum(axis=-1) / m
+        return animal_scores, best
+
+    def _result(self, row, score, image):
+        meta = self.metadata[row]
+        return {
+            'name': meta['name'],
+            'similarity': float(score) * 100,
+            'image': meta['image'],
+            'description': meta['description'],
+            'category': meta['category'],
+            'matched_image': self.image_paths[row][image]
+        }
+
+    def query(self, embedding, k=3):
+        """
+        임베딩 하나와 가장 비슷한 상위 k마리 (SimilarityIndex.query()와 같은 형식 + 'matched_image')
+        """
+        return self.query_batch(embedding, k)[0]
+
+    def query_batch(self, embeddings, k=3):
+        """
+        여러 임베딩을 한 번의 행렬 곱으로 질의
+
+        Args:
+            embeddings: (B, D) 사용자 임베딩 행렬
+            k: 상위 k마리
+
+        Returns:
+            results: 질의마다 유사도(%) 내림차순 결과 리스트
+                     ('matched_image': 가장 비슷했던 참고 이미지 경로)
+        """
+        queries = normalize_rows(np.atleast_2d(embeddings))
+        if len(self) == 0:
+            return [[] for _ in range(queries.shape[0])]
+        # (R, D) @ (D, B): 질의가 하나일 때 행렬-벡터 곱(gemv)으로 처리되도록 이 순서로 계산
+        animal_scores, best = self.aggregate((self.matrix @ queries.T).T)
+        rows = top_k_indices(animal_scores, k)
+        return [
+            [self._result(row, animal_scores[i, row], best[i, row]) for row in rows[i]]
+            for i in range(queries.shape[0])
+        ]
+
+
+def _digest(rows, *parts):
+    h = hashlib.sha1(np.ascontiguousarray(rows).tobytes())
+    h.update(json.dumps(parts, ensure_ascii=False, sort_keys=True).encode('utf-8'))
+    return h.hexdigest()[:16]
+
+
+INDEX_CLASSES = {cls.kind: cls for cls in (SimilarityIndex, PrototypeIndex)}
+
+
+def save_index_snapshot(index, directory):
+    """
+    검색 인덱스를 폴더에 저장 (행렬은 .npy, 메타데이터는 JSON)
+
+    임시 폴더에 다 쓴 뒤 이름을 바꾸므로, 다른 워커는 항상 완성된 스냅샷만 봅니다.
+    이미 같은 스냅샷이 있으면 (다른 워커가 먼저 저장) 그대로 둡니다.
+    """
+    parent = os.path.dirname(os.path.abspath(directory))
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = os.path.join(parent, f".{os.path.basename(directory)}.{uuid.uuid4().hex[:8]}.tmp")
+    os.makedirs(tmp_dir)
+    try:
+        meta = index.save(tmp_dir)
+        meta.update({'kind': index.kind, 'version': index.version, 'count': len(index)})
+        with open(os.path.join(tmp_dir, INDEX_META_NAME), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.rename(tmp_dir, directory)
+    except OSError:
+        if not os.path.exists(os.path.join(directory, INDEX_META_NAME)):
+            raise
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def load_index_snapshot(directory, mmap=True):
+    """
+    저장된 검색 인덱스 열기 (행렬은 읽기 전용 메모리 맵)
+
+    같은 스냅샷을 여는 워커 프로세스들은 OS 페이지 캐시의 행렬 한 벌을 같이 씁니다.
+
+    Returns:
+        index: SimilarityIndex / PrototypeIndex (없거나 읽을 수 없으면 None)
+    """
+    try:
+        with open(os.path.join(directory, INDEX_META_NAME), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        return INDEX_CLASSES[meta['kind']].load(directory, meta, mmap=mmap)
+    except (OSError, ValueError, KeyError) as e:
+        if not isinstance(e, FileNotFoundError):
+            print(f"인덱스 스냅샷 읽기 오류 ({directory}): {e}")
+        return None
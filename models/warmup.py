@@ -0,0 +1,102 @@
+# warmup.py
+import threading
+import time
+from collections import OrderedDict
+
+
+class WarmupRegistry:
+    """
+    서버 시작 시 모델을 백그라운드에서 미리 로드하는 관리자
+
+    컴포넌트마다 로더 함수를 등록해 두면 start()에서 각각 별도 스레드로 실행하고,
+    상태(pending/loading/ready/failed, 미리 로드하지 않으면 lazy)와 로드 시간을 기록합니다.
+    /readyz는 required 컴포넌트가 모두 ready(또는 lazy)일 때만 준비 완료로 봅니다.
+    """
+
+    def __init__(self):
+        self._components = OrderedDict()
+        self._lock = threading.Lock()
+        self._started = False
+
+    def register(self, name, loader, required=True, after=None):
+        """
+        컴포넌트 등록
+
+        Args:
+            name: 컴포넌트 이름
+            loader: 인자 없는 로드 함수
+            required: 준비 완료 판단에 포함할지
+            after: 먼저 끝나야 하는 컴포넌트 이름 리스트
+        """
+        with self._lock:
+            self._components[name] = {
+                'loader': loader,
+                'required': required,
+                'after': list(after or []),
+                'state': 'pending',
+                'load_time': None,
+                'error': None,
+                'done': threading.Event()
+            }
+
+    def start(self):
+        """등록된 컴포넌트를 백그라운드 스레드에서 로드 (한 번만)"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            names = list(self._components)
+        for name in names:
+            threading.Thread(target=self._load, args=(name,), name=f"warmup-{name}", daemon=True).start()
+
+    def skip(self):
+        """
+        미리 로드하지 않음 (각 컴포넌트는 첫 요청 때 로드)
+
+        기다려도 pending에서 바뀌지 않으므로 lazy로 표시하고 준비 완료로 봅니다.
+        """
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            for component in self._components.values():
+                component['state'] = 'lazy'
+                component['done'].set()
+
+    def _load(self, name):
+        component = self._components[name]
+        for dependency in component['after']:
+            self._components[dependency]['done'].wait()
+        component['state'] = 'loading'
+        started = time.perf_counter()
+        try:
+            component['loader']()
+            component['state'] = 'ready'
+            print(f"[warmup] {name} 준비 완료 ({time.perf_counter() - started:.1f}초)")
+        except Exception as e:
+            component['state'] = 'failed'
+            component['error'] = str(e)
+            print(f"[warmup] {name} 로드 실패: {e}")
+        finally:
+            component['load_time'] = round(time.perf_counter() - started, 3)
+            component['done'].set()
+
+    def status(self):
+        """컴포넌트별 상태"""
+        return {
+            name: {
+                'state': c['state'],
+                'required': c['required'],
+                'load_time': c['load_time'],
+                'error': c['error']
+            }
+            for name, c in self._components.items()
+        }
+
+    def is_ready(self):
+        """required 컴포넌트가 모두 준비되었는지 (lazy는 요청 때 로드하므로 준비된 것으로 봄)"""
+        return all(
+            c['state'] in ('ready', 'lazy')
+            for c in self._components.values()
+            if c['required']
+        )
@@ -116,6 +116,7 @@ function displayAnimalResults(data) {
 // Mode2(면접 연습)
 if (document.getElementById('webcam')) {
     let webcamStream = null;
+    let sessionId = null;
     let isRecording = false;
     let emotionHistory = [];
     let analysisInterval = null;
@@ -148,6 +149,17 @@ if (document.getElementById('webcam')) {
             return;
         }
 
+        // 서버에 세션 생성 (감정 기록은 서버에 쌓임)
+        try {
+            const response = await fetch('/start-practice-session', { method: 'POST' });
+            const data = await response.json();
+            sessionId = data.session_id;
+        } catch (error) {
+            alert('세션을 시작하지 못했습니다.');
+            console.error('Session error:', error);
+            return;
+        }
+
         isRecording = true;
         emotionHistory = [];
         startTime = Date.now();
@@ -198,14 +210,17 @@ if (document.getElementById('webcam')) {
         canvas.height = webcam.videoHeight;
         ctx.drawImage(webcam, 0, 0);
 
-        // Base64로 변환
-        const imageData = canvas.toDataURL('image/jpeg', 0.8);
+        // 서버로는 JPEG 바이너리 그대로 전송 (base64보다 작고 JSON 파싱 불필요)
+        const imageBlob = await new Promise(resolve => 
+            canvas.toBlob(resolve, 'image/jpeg', 0.8));
+        const timestamp = Date.now() - startTime;
+        const params = new URLSearchParams({ session_id: sessionId, timestamp: timestamp });
 
         try {
-            const response = await fetch('/analyze-emotion-realtime', {
+            const response = await fetch(`/analyze-emotion-realtime?${params}`, {
                 method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ image: imageData })
+                headers: { 'Content-Type': 'image/jpeg' },
+                body: imageBlob
             });
 
             const data = await response.json();
@@ -213,13 +228,11 @@ if (document.getElementById('webcam')) {
             if (data.success) {
                 const emotion = data.emotion;
                 
-                // 기록 저장
+                // 기록 저장 (전체 기록은 서버 세션에 있음, 여기서는 개수 확인용)
                 emotionHistory.push({
-                    timestamp: Date.now() - startTime,
-                    emotions: emotion.emotions,
+                    timestamp: timestamp,
                     dominant_emotion: emotion.dominant_emotion,
-                    confidence_score: emotion.confidence_score,
-                    frame: imageData
+                    confidence_score: emotion.confidence_score
                 });
 
                 // UI 업데이트
@@ -293,7 +306,7 @@ if (document.getElementById('webcam')) {
             const response = await fetch('/generate-practice-report', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ emotion_history: emotionHistory })
+                body: JSON.stringify({ session_id: sessionId, chart_format: 'png' })
             });
 
             const data = await response.json();
@@ -0,0 +1,5 @@
+# wsgi.py
+# 운영용 진입점 (app.run debug 서버 대신 WSGI 서버로 실행)
+#   IMAGO_INFERENCE_WORKERS=4 gunicorn -w 1 --threads 16 -b 0.0.0.0:5000 wsgi:app
+# 추론 풀을 쓰면 모델은 풀 워커 프로세스에만 있으므로, 웹 워커(-w)는 하나에 스레드만 늘리면 됩니다.
+from app import app  # noqa: F401